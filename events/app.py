@@ -21,24 +21,197 @@ Add, edit, and fetch events list.
 import os
 import datetime
 import json
+import logging
+import threading
+import time
 import pymongo
 from bson import json_util, ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
 
-from flask import Flask, request
+from flask import Flask, Response, make_response, request
 from werkzeug.exceptions import BadRequestKeyError
-from eventclass import Event
+from cache import SearchCache
+from eventclass import (Event, event_document_to_dict, parse_fields,
+                        parse_timestamp)
+from indexes import ensure_indexes, TEXT_WEIGHTS
+import metrics
+from replica import EventsReplica
+from suggest import PrefixIndex
+from versions import bump_version, get_etag
 
 app = Flask(__name__)  # pylint: disable=invalid-name
+metrics.init_app(app)
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_OFFSET = 1000
+BULK_INSERT_BATCH_SIZE = 500
+DEFAULT_UPCOMING_LIMIT = 10
+MAX_BATCH_IDS = 100
+DEFAULT_SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 100
+STREAM_CHUNK_SIZE = 64 * 1024  # characters of JSON buffered per yield
+
+# cache of search results, keyed by normalized query and page, and only
+# served at the version of the events collection they were read at
+SEARCH_CACHE = SearchCache(
+    max_size=int(os.environ.get('SEARCH_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('SEARCH_CACHE_TTL', 30)))
+# event names for autocomplete, built at startup, updated on insert, and
+# rebuilt in the background when other processes add events, see
+# refresh_suggest_index
+SUGGEST_INDEX = PrefixIndex()
+SUGGEST_REFRESH_SECONDS = float(
+    os.environ.get('SUGGEST_REFRESH_SECONDS', 5))
+# serve reads from an in-memory copy of the collection, see replica.py
+READ_REPLICA_ENABLED = os.environ.get('EVENTS_READ_REPLICA') == '1'
+REPLICA_POLL_SECONDS = float(os.environ.get('EVENTS_REPLICA_POLL_SECONDS', 5))
+REPLICA_MAX_STALENESS = float(
+    os.environ.get('EVENTS_REPLICA_MAX_STALENESS', 30))
 
 
 @app.route('/v1/', methods=['GET'])
 def get_all_events():
-    """Return a list of all events currently in the DB."""
+    """Return one page of the events currently in the DB.
+
+    Events are returned in `_id` order. Query parameters:
+        limit: max number of events to return (default 100, max 1000).
+        after: `_id` of the last event of the previous page.
+        fields: comma-separated event fields to return besides `_id`, e.g.
+            "name" (default all fields).
+
+    The response's `next` field holds the cursor to pass as `after` to get
+    the following page, or None if this is the last page. `num_events` is the
+    total number of events in the DB, not the size of the page.
+
+    Responses read from the DB have an ETag that changes whenever an event is
+    added, and requests with a matching If-None-Match header get an empty 304
+    response without reading any events. Responses served from the read
+    replica have no ETag, since the replica may lag behind the version.
+    """
     try:
-        events = app.config['COLLECTION'].find({})
-        events_dict = build_events_dict(events)
+        limit = parse_limit(request.args)
+        after = parse_object_id(request.args.get('after'))
+        fields = parse_fields(request.args.get('fields'))
+        coll = app.config['COLLECTION']
+        replica = fresh_replica()
+        etag = read_etag(coll, replica)
+        if etag is not None and request.if_none_match.contains_weak(etag):
+            return not_modified_response(etag)
+        if replica is not None:
+            events = replica.page(limit, after)
+            num_events = len(replica)
+        else:
+            num_events = coll.estimated_document_count()
+            events = find_events_page(coll, limit, after, fields)
+
+        def trailer(count, last_event):
+            next_cursor = (str(last_event['_id']) if count == limit
+                           else None)
+            return {'num_events': num_events, 'next': next_cursor}
+        response = stream_events(events, trailer, fields)
+        if replica is None:
+            response.set_etag(etag)
+        return response
+    except (ValueError, InvalidId) as error:
+        return f'Invalid page parameters: {error}', 400
+    except DBNotConnectedError:
+        return 'Events database was undefined.', 500
+
+
+@app.route('/v1/batch', methods=['GET'])
+def get_events_batch():
+    """Return many events by `_id` with a single query.
+
+    Query parameters:
+        ids: comma-separated `_id`s of up to 100 events.
+        fields: event fields to return, as in GET /v1/.
+
+    `events` has one entry per requested ID, in request order: the event, or
+    None if there is no event with that ID. `missing` lists the IDs that were
+    not found. Supports conditional requests like GET /v1/.
+    """
+    try:
+        event_ids = parse_object_ids(request.args['ids'])
+        fields = parse_fields(request.args.get('fields'))
+        coll = app.config['COLLECTION']
+        replica = fresh_replica()
+        etag = read_etag(coll, replica)
+        if etag is not None and request.if_none_match.contains_weak(etag):
+            return not_modified_response(etag)
+        if replica is not None:
+            found = replica.get_many(set(event_ids))
+        else:
+            found = coll.find({'_id': {'$in': list(set(event_ids))}},
+                              make_projection(fields))
+        events_by_id = {ev['_id']: event_document_to_dict(ev, fields)
+                        for ev in found}
+        events = [events_by_id.get(event_id) for event_id in event_ids]
+        missing = [str(event_id) for event_id in event_ids
+                   if event_id not in events_by_id]
         # handle MongoDB objects (e.g. ObjectID) that aren't JSON serializable
-        return json.loads(json_util.dumps(events_dict))
+        response = make_response(json.loads(json_util.dumps(
+            {'events': events,
+             'num_events': len(event_ids) - len(missing),
+             'missing': missing})))
+        if replica is None:
+            response.set_etag(etag)
+        return response
+    except BadRequestKeyError:
+        return 'Event IDs were entered incorrectly.', 400
+    except (ValueError, InvalidId) as error:
+        return f'Invalid event IDs: {error}', 400
+    except DBNotConnectedError:
+        return 'Events database was undefined.', 500
+
+
+@app.route('/v1/range', methods=['GET'])
+def get_events_in_range():
+    """Return events taking place in a time range, in order of event_time.
+
+    Query parameters:
+        start: start of the range, e.g. "2019-07-30 18:00" (inclusive).
+        end: end of the range (exclusive).
+        limit: max number of events to return (default 100, max 1000).
+        fields: event fields to return, as in GET /v1/.
+    """
+    try:
+        start = parse_timestamp(request.args['start'])
+        end = parse_timestamp(request.args['end'])
+        limit = parse_limit(request.args)
+        fields = parse_fields(request.args.get('fields'))
+        events = find_events_by_time(
+            app.config['COLLECTION'], limit, start=start, end=end,
+            fields=fields)
+        return stream_events(events, fields=fields)
+    except BadRequestKeyError:
+        return 'Time range must have a start and an end.', 400
+    except ValueError as error:
+        return f'Invalid time range: {error}', 400
+    except DBNotConnectedError:
+        return 'Events database was undefined.', 500
+
+
+@app.route('/v1/upcoming', methods=['GET'])
+def get_upcoming_events():
+    """Return the next events to take place, in order of event_time.
+
+    Query parameters:
+        limit: number of events to return (default 10, max 1000).
+        fields: event fields to return, as in GET /v1/.
+    """
+    try:
+        limit = parse_limit(request.args, default=DEFAULT_UPCOMING_LIMIT)
+        fields = parse_fields(request.args.get('fields'))
+        events = find_events_by_time(
+            app.config['COLLECTION'], limit,
+            start=datetime.datetime.utcnow(), fields=fields)
+        return stream_events(events, fields=fields)
+    except ValueError as error:
+        return f'Invalid query parameters: {error}', 400
     except DBNotConnectedError:
         return 'Events database was undefined.', 500
 
@@ -47,41 +220,153 @@ def get_all_events():
 def search_event():
     """Search for the event with the given name in the DB.
 
-    Uses MongoDB text search, which ignores capitalization and stop words, and
-    searches on word stems.
+    Uses MongoDB text search on event names and descriptions, which ignores
+    capitalization and stop words, and searches on word stems. Relies on the
+    text index built by indexes.py.
+
+    Results are sorted by relevance. Query parameters:
+        name: text to search for.
+        limit: max number of events to return (default 20, max 1000).
+        offset: number of best matches to skip (default 0, max 1000).
+        fields: event fields to return, as in GET /v1/.
+
+    Results are cached in SEARCH_CACHE until they expire or an event is added
+    by any process.
+    If the read replica is enabled and fresh, misses are searched in memory
+    with EventsReplica.search instead, which only matches whole words.
     """
     try:
         event_name = request.args['name']
-        # create a text index on name to enable searching
-        app.config['COLLECTION'].create_index([('name', 'text')])
-        events = text_search_event_name(app.config['COLLECTION'], event_name)
-        events_dict = build_events_dict(events)
-        # handles MongoDB objects (e.g. ObjectID) that aren't JSON serializable
-        return json.loads(json_util.dumps(events_dict))
+        limit = parse_limit(request.args, default=DEFAULT_SEARCH_LIMIT)
+        offset = parse_offset(request.args)
+        fields = parse_fields(request.args.get('fields'))
+        cache_key = (normalize_search_query(event_name), limit, offset,
+                     fields)
+        # read before the events, see versions.py
+        version = get_etag(app.config['COLLECTION'])
+        events_dict = SEARCH_CACHE.get(cache_key, version)
+        if events_dict is None:
+            replica = fresh_replica()
+            if replica is not None:
+                events = replica.search(event_name, limit, offset)
+            else:
+                events = text_search_event_name(
+                    app.config['COLLECTION'], event_name,
+                    limit=limit, offset=offset, fields=fields)
+            # handles MongoDB objects (e.g. ObjectID) that aren't JSON
+            # serializable
+            events_dict = json.loads(
+                json_util.dumps(build_events_dict(events, fields=fields)))
+            SEARCH_CACHE.put(cache_key, events_dict, version)
+        return events_dict
     except BadRequestKeyError:      # missing event attributes
         return 'Event name was entered incorrectly.', 400
+    except ValueError as error:
+        return f'Invalid search parameters: {error}', 400
     except DBNotConnectedError:
         return 'Events database was undefined.', 500
 
 
+@app.route('/v1/suggest', methods=['GET'])
+def suggest_events():
+    """Return events with names starting with a prefix, for autocomplete.
+
+    Any word of an event's name can match the prefix, ignoring capitalization.
+    Served from the in-memory SUGGEST_INDEX, without querying the DB. Query
+    parameters:
+        prefix: start of the names to look for.
+        limit: max number of suggestions to return (default 10, max 100).
+
+    Each suggestion has the event's `_id` and `name`.
+    """
+    try:
+        prefix = request.args['prefix']
+        limit = parse_limit(request.args, default=DEFAULT_SUGGEST_LIMIT,
+                            maximum=MAX_SUGGEST_LIMIT)
+        suggestions = [{'_id': event_id, 'name': name} for event_id, name
+                       in SUGGEST_INDEX.suggest(prefix, limit)]
+        # handle MongoDB objects (e.g. ObjectID) that aren't JSON serializable
+        return json.loads(json_util.dumps(
+            {'suggestions': suggestions,
+             'num_suggestions': len(suggestions)}))
+    except BadRequestKeyError:
+        return 'Prefix was entered incorrectly.', 400
+    except ValueError as error:
+        return f'Invalid limit: {error}', 400
+
+
+@app.route('/v1/cache_stats', methods=['GET'])
+def get_cache_stats():
+    """Return the size and hit rate of this process's search cache."""
+    return SEARCH_CACHE.stats()
+
+
+@app.route('/v1/replica_status', methods=['GET'])
+def get_replica_status():
+    """Return whether reads are served from the replica, and its staleness.
+
+    `staleness_seconds` is the time since the replica was last known to be
+    up to date with the DB, or None if it was never loaded.
+    """
+    replica = app.config['REPLICA']
+    if replica is None:
+        return {'enabled': False}
+    return {'enabled': True,
+            'mode': replica.mode,
+            'fresh': replica.is_fresh(),
+            'staleness_seconds': replica.staleness,
+            'max_staleness_seconds': replica.max_staleness,
+            'num_events': len(replica)}
+
+
 @app.route('/v1/add', methods=['POST'])
 def add_event():
     """Adds the posted event into the database."""
     try:
-        info = {
-            'name': request.form['event_name'],
-            'description': request.form['description'],
-            'author': request.form['author_id'],
-            'event_time': request.form['event_time']
-        }
-        current_time = datetime.datetime.utcnow().isoformat(sep=' ',
-                                                            timespec='seconds')
-        info = build_event_info(info, current_time)
-        event = Event(**info)
-        app.config['COLLECTION'].insert_one(event.dict)
+        event = build_event_from_form(request.form, current_timestamp())
+        document = event.dict
+        app.config['COLLECTION'].insert_one(document)
+        on_events_added([document], bump_version(app.config['COLLECTION']))
         return 'Event added.', 201
     except BadRequestKeyError:      # missing event attributes
         return 'Event info was entered incorrectly.', 400
+    except ValueError as error:     # malformatted event_time
+        return f'Event info was entered incorrectly: {error}', 400
+    except DBNotConnectedError:
+        return 'Events database was undefined.', 500
+
+
+@app.route('/v1/bulk_add', methods=['POST'])
+def bulk_add_events():
+    """Adds many posted events into the database.
+
+    The request body is either a JSON array of events (application/json) or
+    one JSON event per line (application/x-ndjson). Each event has the same
+    fields as the form data of /v1/add. NDJSON bodies are read line by line,
+    so schedules of any size can be uploaded in one request.
+
+    Events are validated one at a time and inserted in unordered batches, so
+    invalid events don't stop the others from being added. The response lists
+    the result of each event in request order, with its `index` in the
+    request, a `status` of 'added', 'invalid', or 'failed' (rejected by the
+    DB), and the event's `_id` or an `error`. Responds 201 if every event was
+    added and 207 otherwise.
+    """
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            items = parse_ndjson(request.stream)
+        else:
+            items = request.get_json(force=True, silent=True)
+            if not isinstance(items, list):
+                return 'Request body must be a JSON array of events.', 400
+        results = insert_events_in_batches(
+            app.config['COLLECTION'], items, current_timestamp(),
+            BULK_INSERT_BATCH_SIZE)
+        num_added = sum(result['status'] == 'added' for result in results)
+        response = {'results': results,
+                    'num_added': num_added,
+                    'num_failed': len(results) - num_added}
+        return response, 201 if num_added == len(results) else 207
     except DBNotConnectedError:
         return 'Events database was undefined.', 500
 
@@ -90,8 +375,12 @@ def add_event():
 def get_one_event(event_id):
     """Retrieve one event by event_id."""
     try:
-        events = app.config['COLLECTION'].find({'_id': ObjectId(event_id)})
-        events = [Event(**ev).dict for ev in events]
+        replica = fresh_replica()
+        if replica is not None:
+            event = replica.get(ObjectId(event_id))
+            events = [] if event is None else [event]
+        else:
+            events = app.config['COLLECTION'].find({'_id': ObjectId(event_id)})
         events_dict = build_events_dict(events)
         # handle MongoDB objects (e.g. ObjectID) that aren't JSON serializable
         return json.loads(json_util.dumps(events_dict))
@@ -104,18 +393,357 @@ def build_event_info(info, time):
     return {**info, 'created_at': time}
 
 
-def build_events_dict(events_cursor):
+def build_event_from_form(form, time):
+    """Builds an Event from the fields of a request to add an event.
+
+    Raises a KeyError if any fields are missing, and a ValueError if the
+    event_time is malformatted.
+    """
+    info = {
+        'name': form['event_name'],
+        'description': form['description'],
+        'author': form['author_id'],
+        'event_time': parse_timestamp(form['event_time'])
+    }
+    return Event(**build_event_info(info, time))
+
+
+def current_timestamp():
+    """Returns the current UTC time, truncated to seconds."""
+    return datetime.datetime.utcnow().replace(microsecond=0)
+
+
+def parse_ndjson(stream):
+    """Yields the JSON value on each non-blank line of stream.
+
+    Yields a ValueError instead of a value for lines that aren't valid JSON.
+    """
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield error
+
+
+def insert_events_in_batches(coll, items, time, batch_size):
+    """Validates and inserts events from items into coll.
+
+    Valid events are inserted with unordered insert_many calls of up to
+    batch_size events, so a failed insert doesn't stop the rest of the batch.
+
+    Args:
+        coll: pymongo collection to insert into.
+        items (iterable): event info dicts, in the format of the form data of
+            /v1/add, or exceptions for items that could not be parsed.
+        time (datetime.datetime): created_at time of the events, in UTC.
+        batch_size (int): max number of events per insert_many call.
+
+    Returns:
+        list: one result dict per item, in order.
+    """
+    results = []
+    batch = []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            if not isinstance(item, dict):
+                raise ValueError('Event must be a JSON object.')
+            event = build_event_from_form(item, time)
+        except KeyError as error:
+            results.append({'index': index, 'status': 'invalid',
+                            'error': f'Missing field {error}.'})
+            continue
+        except ValueError as error:
+            results.append({'index': index, 'status': 'invalid',
+                            'error': str(error)})
+            continue
+        results.append({'index': index})
+        batch.append((results[-1], event.dict))
+        if len(batch) >= batch_size:
+            insert_events_batch(coll, batch)
+            batch = []
+    if batch:
+        insert_events_batch(coll, batch)
+    return results
+
+
+def insert_events_batch(coll, batch):
+    """Inserts a batch of events without stopping at failed inserts.
+
+    Args:
+        coll: pymongo collection to insert into.
+        batch (list): (result, event dict) pairs. Each result dict is updated
+            with the outcome of inserting its event.
+    """
+    errors = {}
+    try:
+        coll.insert_many([event for _, event in batch], ordered=False)
+    except BulkWriteError as error:
+        errors = {write_error['index']: write_error['errmsg']
+                  for write_error in error.details['writeErrors']}
+    added = []
+    for i, (result, event) in enumerate(batch):
+        if i in errors:
+            result.update(status='failed', error=errors[i])
+        else:
+            result.update(status='added', _id=str(event['_id']))
+            added.append(event)
+    if added:
+        on_events_added(added, bump_version(coll))
+
+
+def on_events_added(events, versions):
+    """Updates in-process state derived from the events collection.
+
+    Args:
+        events (list): dicts of the events that were inserted, with `_id`s.
+        versions (tuple): ETags of the collection just before and after the
+            insert, as returned by `bump_version`.
+    """
+    replica = app.config['REPLICA']
+    for event in events:
+        SUGGEST_INDEX.add(event['_id'], event['name'])
+        if replica is not None:     # read your own writes before the DB syncs
+            replica.apply_change(
+                {'operationType': 'insert', 'fullDocument': event})
+    SUGGEST_INDEX.advance(*versions)
+
+
+def fresh_replica():
+    """Returns the read replica if it is enabled and fresh, None otherwise."""
+    replica = app.config['REPLICA']
+    if replica is not None and replica.is_fresh():
+        return replica
+    return None
+
+
+def load_suggest_index(coll):
+    """Builds SUGGEST_INDEX from the names of all events in coll."""
+    version = get_etag(coll)    # read before the events, see versions.py
+    SUGGEST_INDEX.rebuild(coll.find({}, {'name': True}), version)
+
+
+def refresh_suggest_index(coll):
+    """Rebuilds SUGGEST_INDEX if other processes added events since.
+
+    Events added by this process are indexed as they are added, and advance
+    the index's version if they were the only change, but those added by
+    other processes only show in the version of coll. The new index is built
+    before it replaces the old one, which serves suggestions meanwhile.
+    """
+    if get_etag(coll) != SUGGEST_INDEX.version:
+        load_suggest_index(coll)
+
+
+def start_suggest_refresher(coll):     # pragma: no cover
+    """Runs refresh_suggest_index every SUGGEST_REFRESH_SECONDS in the
+    background, off the path of suggestion requests."""
+    def run():
+        while True:
+            time.sleep(SUGGEST_REFRESH_SECONDS)
+            try:
+                refresh_suggest_index(coll)
+            except pymongo.errors.PyMongoError as error:
+                LOGGER.warning('Failed to refresh suggest index: %s', error)
+    threading.Thread(
+        target=run, name='events-suggest', daemon=True).start()
+
+
+def read_etag(coll, replica):
+    """Returns the ETag of coll if the request or response needs it.
+
+    Responses read from the DB are tagged with the ETag. Responses served
+    from the replica are not, since it may lag behind the DB's version, so it
+    is only read to check conditional requests.
+    """
+    if replica is None or request.if_none_match:
+        return get_etag(coll)
+    return None
+
+
+def not_modified_response(etag):
+    """Returns an empty 304 response for a request whose ETag matched."""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def build_events_dict(events_cursor, num_events=None, fields=None):
     """Builds a dict in the correct format for returning through a GET request.
 
-    Takes in a mongoDB cursor from querying the DB.
+    Takes in a mongoDB cursor from querying the DB. If num_events is not
+    given, it is the number of events in the cursor. If fields is given, only
+    those fields of each event are returned, see event_document_to_dict.
     """
-    events_list = [Event(**ev).dict for ev in events_cursor]
-    num_events = len(events_list)
+    events_list = [event_document_to_dict(ev, fields) for ev in events_cursor]
+    if num_events is None:
+        num_events = len(events_list)
     return {'events': events_list, 'num_events': num_events}
 
 
-def text_search_event_name(coll, name):
-    return coll.find({'$text': {'$search': name}})
+def make_projection(fields):
+    """Returns the projection reading only fields, or None for all fields."""
+    return None if fields is None else dict.fromkeys(fields, True)
+
+
+def find_events_page(coll, limit, after=None, fields=None):
+    """Returns a cursor over at most `limit` events with `_id` after `after`.
+
+    Uses keyset pagination on the `_id` index, so each page costs the same no
+    matter how deep into the collection it is. Only reads the given fields,
+    or all fields if None.
+    """
+    query = {} if after is None else {'_id': {'$gt': after}}
+    return coll.find(query, make_projection(fields)).sort(
+        '_id', pymongo.ASCENDING).limit(limit)
+
+
+def find_events_by_time(coll, limit, start=None, end=None, fields=None):
+    """Returns a cursor over events in [start, end), ordered by event_time.
+
+    Uses the event_time index. Either bound may be None for an open range.
+    Only reads the given fields, or all fields if None.
+    """
+    time_range = {}
+    if start is not None:
+        time_range['$gte'] = start
+    if end is not None:
+        time_range['$lt'] = end
+    query = {'event_time': time_range} if time_range else {}
+    return coll.find(query, make_projection(fields)).sort(
+        'event_time', pymongo.ASCENDING).limit(limit)
+
+
+def stream_events(events_cursor, trailer=None, fields=None):
+    """Streams the events in a cursor as a JSON HTTP response.
+
+    The response has the same format as build_events_dict. trailer is passed
+    to generate_json_list and defaults to counting the events.
+    """
+    if trailer is None:
+        def trailer(count, _):
+            return {'num_events': count}
+    events = (event_document_to_dict(ev, fields) for ev in events_cursor)
+    return Response(generate_json_list(events, 'events', trailer),
+                    mimetype='application/json')
+
+
+def generate_json_list(documents, list_key, trailer):
+    """Yields the JSON object {list_key: [documents...], ...} in chunks.
+
+    Documents are encoded one at a time as they are read from the cursor,
+    handling MongoDB objects (e.g. ObjectID, datetime) the same way as
+    bson.json_util, so at most one document and one chunk of encoded text are
+    in memory at once.
+
+    Args:
+        documents (iterable): documents to encode, e.g. a pymongo cursor.
+        list_key (str): key to hold the list of documents.
+        trailer (function): called with the number of documents and the last
+            document once all documents are encoded. Returns a dict of the
+            remaining fields of the JSON object.
+    """
+    chunk = ['{%s: [' % json.dumps(list_key)]
+    chunk_size = 0
+    count = 0
+    document = None
+    for document in documents:
+        encoded = json.dumps(document, default=json_util.default)
+        if count:
+            chunk.append(', ')
+        chunk.append(encoded)
+        chunk_size += len(encoded)
+        count += 1
+        if chunk_size >= STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            chunk_size = 0
+    chunk.append(']')
+    for key, value in trailer(count, document).items():
+        chunk.append(', %s: %s' % (
+            json.dumps(key), json.dumps(value, default=json_util.default)))
+    chunk.append('}')
+    yield ''.join(chunk)
+
+
+def parse_limit(args, default=DEFAULT_PAGE_LIMIT, maximum=MAX_PAGE_LIMIT):
+    """Reads the `limit` query parameter, clamped to [1, maximum].
+
+    Raises a ValueError if the limit is not a positive integer.
+    """
+    limit = int(args.get('limit', default))
+    if limit < 1:
+        raise ValueError('limit must be positive.')
+    return min(limit, maximum)
+
+
+def parse_offset(args, maximum=MAX_SEARCH_OFFSET):
+    """Reads the `offset` query parameter.
+
+    Raises a ValueError if the offset is not an integer in [0, maximum].
+    """
+    offset = int(args.get('offset', 0))
+    if not 0 <= offset <= maximum:
+        raise ValueError(f'offset must be between 0 and {maximum}.')
+    return offset
+
+
+def parse_object_id(value):
+    """Converts value to an ObjectId, or returns None if value is None.
+
+    Raises an InvalidId error if value is not a valid ObjectId.
+    """
+    return None if value is None else ObjectId(value)
+
+
+def parse_object_ids(value, maximum=MAX_BATCH_IDS):
+    """Converts a comma-separated list of IDs to a list of ObjectIds.
+
+    Raises a ValueError if there are no IDs or more than maximum, and an
+    InvalidId error if any ID is not a valid ObjectId.
+    """
+    ids = [event_id.strip() for event_id in value.split(',')
+           if event_id.strip()]
+    if not 1 <= len(ids) <= maximum:
+        raise ValueError(f'between 1 and {maximum} IDs are required.')
+    return [ObjectId(event_id) for event_id in ids]
+
+
+def text_search_event_name(coll, name, limit=DEFAULT_SEARCH_LIMIT, offset=0,
+                           fields=None):
+    """Returns the events best matching name, most relevant first.
+
+    Only the requested page of matches is sorted and returned by the DB, so
+    common words that match many events don't cost more than rare ones to
+    return. Only reads the given fields, or all fields if None.
+    """
+    cursor = find_text_matches(coll, name, limit, offset, fields)
+    return (strip_text_score(ev) for ev in cursor)
+
+
+def find_text_matches(coll, name, limit, offset=0, fields=None):
+    """Returns the cursor of text_search_event_name, with text scores."""
+    score = {'$meta': 'textScore'}
+    projection = dict(make_projection(fields) or {}, score=score)
+    cursor = coll.find({'$text': {'$search': name}}, projection)
+    return cursor.sort([('score', score)]).skip(offset).limit(limit)
+
+
+def normalize_search_query(name):
+    """Normalizes capitalization and whitespace of a search query.
+
+    Text search ignores both, so queries that only differ in them have the
+    same results.
+    """
+    return ' '.join(name.lower().split())
+
+
+def strip_text_score(event):
+    """Removes the text search score projected into an event."""
+    event.pop('score', None)
+    return event
 
 
 class DBNotConnectedError(ConnectionError):
@@ -126,6 +754,7 @@ def connect_to_mongodb():   # pragma: no cover
     """Connects to MongoDB Atlas database.
 
     Returns events collection if connection is successful, and None otherwise.
+    Builds the collection's indexes if they don't exist yet.
     """
     class Thrower():  # pylint: disable=too-few-public-methods
         """Used to raise an exception on failed db connect."""
@@ -137,10 +766,32 @@ def connect_to_mongodb():   # pragma: no cover
     mongodb_uri = os.environ.get('MONGODB_URI')
     if mongodb_uri is None:
         return Thrower()  # not able to find db config var
-    return pymongo.MongoClient(mongodb_uri).eventsDB.all_events
+    client = pymongo.MongoClient(
+        mongodb_uri, event_listeners=[metrics.CommandTimer(),
+                                      metrics.SlowCommandLogger()])
+    collection = client.eventsDB.all_events
+    ensure_indexes(collection)
+    return collection
+
+
+def start_replica(coll):     # pragma: no cover
+    """Loads the events into a replica kept in sync in the background."""
+    replica = EventsReplica(coll, TEXT_WEIGHTS,
+                            poll_interval=REPLICA_POLL_SECONDS,
+                            max_staleness=REPLICA_MAX_STALENESS)
+    replica.start()
+    return replica
 
 
 app.config['COLLECTION'] = connect_to_mongodb()  # None if can't connect
+app.config['REPLICA'] = None
+try:
+    load_suggest_index(app.config['COLLECTION'])
+    start_suggest_refresher(app.config['COLLECTION'])
+    if READ_REPLICA_ENABLED:
+        app.config['REPLICA'] = start_replica(app.config['COLLECTION'])
+except DBNotConnectedError:
+    pass    # requests will fail with the same error
 
 
 if __name__ == '__main__':  # pragma: no cover
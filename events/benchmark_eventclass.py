@@ -0,0 +1,89 @@
+"""Microbenchmark of converting event documents from the DB to dicts.
+
+Compares the namedtuple-based Event class this module replaced with the
+current Event class and with event_document_to_dict, which is what the app
+uses when returning events. Run with:
+
+    python3 benchmark_eventclass.py [num_documents]
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import timeit
+import datetime
+from collections import namedtuple
+from bson import ObjectId
+from eventclass import EVENT_ATTRIBUTES, Event, event_document_to_dict
+
+
+class LegacyEvent(namedtuple('EventTuple', EVENT_ATTRIBUTES)):
+    """The namedtuple-based Event class, kept for comparison."""
+
+    def __new__(cls, **info):
+        if 'event_id' not in info:
+            info['event_id'] = None
+        if '_id' in info:
+            info['event_id'] = info['_id']
+            del info['_id']
+        try:
+            return super(LegacyEvent, cls).__new__(cls, **info)
+        except TypeError:
+            raise ValueError('Event info was formatted incorrectly.')
+
+    def get_dict(self):
+        info = self._asdict()
+        if info['event_id']:
+            info['_id'] = info['event_id']
+            del info['event_id']
+        return info
+
+    dict = property(get_dict)
+
+
+def make_documents(num_documents):
+    """Returns num_documents event documents as read from the DB."""
+    now = datetime.datetime(2019, 7, 30, 12)
+    return [{'_id': ObjectId(),
+             'name': f'event {i}',
+             'description': 'A sub-event of a large event.',
+             'author': 'organizer',
+             'created_at': now,
+             'event_time': now}
+            for i in range(num_documents)]
+
+
+def main(num_documents=100000, repeat=5):
+    """Prints the best time of each conversion over num_documents."""
+    documents = make_documents(num_documents)
+    conversions = [
+        ('LegacyEvent(**doc).dict', lambda: [
+            LegacyEvent(**doc).dict for doc in documents]),
+        ('Event(**doc).dict', lambda: [
+            Event(**doc).dict for doc in documents]),
+        ('event_document_to_dict(doc)', lambda: [
+            event_document_to_dict(doc) for doc in documents]),
+    ]
+    print(f'Converting {num_documents} documents, best of {repeat}:')
+    baseline = None
+    for name, convert in conversions:
+        best = min(timeit.repeat(convert, number=1, repeat=repeat))
+        baseline = baseline or best
+        print(f'  {name:<30} {best * 1000:8.1f} ms  '
+              f'{baseline / best:4.1f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,92 @@
+"""In-process cache for event search results."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class SearchCache():
+    """Thread-safe LRU cache whose entries expire after a TTL.
+
+    Writes to the events collection make every cached result stale, so each
+    result is cached with the version of the collection it was read at, see
+    versions.py, and only served while that is still the current version.
+    Readers read the version before querying the DB and pass it to put().
+    The version is shared by all processes, so writes handled by any of them
+    are seen immediately.
+    """
+
+    def __init__(self, max_size, ttl, clock=time.monotonic):
+        """Creates a cache holding at most max_size entries for ttl seconds."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expiry time, version, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """Returns the value cached for key at `version`.
+
+        Returns:
+            The value, or None if missing, expired or read at another version.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] <= self._clock()
+                                      or entry[1] != version):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value, version):
+        """Caches value, read at `version` of the events collection.
+
+        Evicts the least recently used entry if the cache is full.
+        """
+        with self._lock:
+            if self.max_size < 1:
+                return
+            self._entries[key] = (self._clock() + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops all cached values and resets the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns a dict of cache size, hits, misses, and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -15,7 +15,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from collections import namedtuple
+import datetime
+
+# formats accepted for event times, after replacing any 'T' separator
+TIMESTAMP_FORMATS = (
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d')
 
 EVENT_ATTRIBUTES = [
     'event_id',
@@ -25,51 +32,149 @@ EVENT_ATTRIBUTES = [
     'created_at',
     'event_time']
 
+# attributes that must be given when constructing an event, in output order
+DATA_ATTRIBUTES = tuple(att for att in EVENT_ATTRIBUTES if att != 'event_id')
+_REQUIRED_KEYS = frozenset(DATA_ATTRIBUTES)
+
 
-class Event(namedtuple('EventTuple', EVENT_ATTRIBUTES)):
+class Event():
     """Class for representing events.
 
     Used to ensure event info is in the correct format when constructing or
     manipulating event info from user input.
     """
+    __slots__ = EVENT_ATTRIBUTES
 
-    def __new__(cls, **info):
-        """Constructs an event object represented by a EventTuple namedtuple.
+    def __init__(self, **info):
+        """Constructs an event object from the given event info.
 
         Raises a ValueError if any attributes are missing or if extra
         attributes are included.
         """
-        if 'event_id' not in info:
-            info['event_id'] = None
+        event_id = info.pop('event_id', None)
         if '_id' in info:       # found DB-generated ID, override given one
-            info['event_id'] = info['_id']
-            del info['_id']
-        try:
-            return super(Event, cls).__new__(cls, **info)
-        except TypeError:
+            event_id = info.pop('_id')
+        if info.keys() != _REQUIRED_KEYS:
             raise ValueError('Event info was formatted incorrectly.')
+        self.event_id = event_id
+        for att in DATA_ATTRIBUTES:
+            setattr(self, att, info[att])
 
     def __eq__(self, other):
         """Determines if two events have the same info, excluding event_id."""
         if not isinstance(other, Event):
             return False
-        for att in EVENT_ATTRIBUTES:
-            if att == 'event_id':
-                continue
-            elif getattr(self, att) != getattr(other, att):
+        for att in DATA_ATTRIBUTES:
+            if getattr(self, att) != getattr(other, att):
                 return False
         return True
 
+    __hash__ = None     # mutable, and equality ignores event_id
+
+    def __repr__(self):
+        return 'Event({})'.format(', '.join(
+            f'{att}={getattr(self, att)!r}' for att in EVENT_ATTRIBUTES))
+
     def get_dict(self):
         """Returns event info in dict form.
 
         Usually used to insert event info into the dictionary, so this converts
         the field event_id into _id to correspond with the MongoDB _id field.
         """
-        info = self._asdict()
-        if info['event_id']:    # only create _id field if event_id is not None
-            info['_id'] = info['event_id']
-            del info['event_id']
+        info = {att: getattr(self, att) for att in DATA_ATTRIBUTES}
+        if self.event_id:   # only create _id field if event_id is not None
+            info['_id'] = self.event_id
+        else:
+            info['event_id'] = self.event_id
         return info
 
     dict = property(get_dict)
+
+
+def event_document_to_dict(document, fields=None):
+    """Converts an event document from the DB straight to its dict form.
+
+    Equivalent to Event(**document).dict, including raising a ValueError if
+    any attributes are missing or if extra attributes are included, but
+    doesn't build an Event object in between. Used when returning many events
+    from the DB, where the conversion is done for every document.
+
+    If fields is given, the document was read with a projection, and only
+    those of its DATA_ATTRIBUTES are returned along with its ID. A ValueError
+    is raised if any of them are missing, but other attributes are ignored.
+    """
+    if fields is not None:
+        return _partial_document_to_dict(document, fields)
+    num_id_keys = 0
+    event_id = None
+    if 'event_id' in document:
+        num_id_keys += 1
+        event_id = document['event_id']
+    if '_id' in document:   # found DB-generated ID, override given one
+        num_id_keys += 1
+        event_id = document['_id']
+    if len(document) - num_id_keys != len(DATA_ATTRIBUTES):
+        raise ValueError('Event info was formatted incorrectly.')
+    try:
+        info = {att: document[att] for att in DATA_ATTRIBUTES}
+    except KeyError:
+        raise ValueError('Event info was formatted incorrectly.')
+    if event_id:    # only create _id field if event_id is not None
+        info['_id'] = event_id
+    else:
+        info['event_id'] = event_id
+    return info
+
+
+def _partial_document_to_dict(document, fields):
+    """Converts a projected event document to its partial dict form."""
+    try:
+        info = {att: document[att] for att in fields}
+    except KeyError:
+        raise ValueError('Event info was formatted incorrectly.')
+    event_id = document.get('_id', document.get('event_id'))
+    if event_id:
+        info['_id'] = event_id
+    else:
+        info['event_id'] = event_id
+    return info
+
+
+def parse_fields(value):
+    """Parses a comma-separated list of event attributes to project.
+
+    Returns a tuple of the attributes in DATA_ATTRIBUTES order, or None if
+    value is None or lists every attribute. Raises a ValueError if value has
+    no attributes or any unknown ones.
+    """
+    if value is None:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - _REQUIRED_KEYS
+    if unknown or not fields:
+        raise ValueError(
+            f'fields must be some of {", ".join(DATA_ATTRIBUTES)}.')
+    if fields == _REQUIRED_KEYS:
+        return None
+    return tuple(att for att in DATA_ATTRIBUTES if att in fields)
+
+
+def parse_timestamp(value):
+    """Parses a date and time string such as "2019-07-30 18:00" into a datetime.
+
+    Accepts ISO 8601 dates with an optional time, separated by a space or a
+    'T'. Times are taken to be in UTC, which is how MongoDB stores them.
+    Datetimes are returned unchanged.
+
+    Raises a ValueError if value is not in one of the accepted formats.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    normalized = str(value).strip().replace('T', ' ')
+    for time_format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.datetime.strptime(normalized, time_format)
+        except ValueError:
+            continue
+    raise ValueError(
+        f'Invalid time "{value}", expected format YYYY-MM-DD HH:MM:SS.')
@@ -0,0 +1,108 @@
+"""Explains the events service's MongoDB queries, flagging collection scans.
+
+Runs explain() on each query the app issues and prints the stages of their
+winning plans. A COLLSCAN stage means the query reads every document of the
+collection because no index supports it. Run it against a DB with
+production-like data before deploying:
+
+    MONGODB_URI="mongodb+srv://..." python3 explain_queries.py
+
+Exits with status 1 if any plan has a COLLSCAN.
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import datetime
+from bson import ObjectId
+
+COLLSCAN = 'COLLSCAN'
+
+
+def canonical_queries(app_module):
+    """Returns (name, cursor) pairs of the queries the app issues.
+
+    Cursors are built with the app's own query functions where it has them,
+    so the explained queries stay in sync with the app.
+    """
+    coll = app_module.app.config['COLLECTION']
+    limit = app_module.DEFAULT_PAGE_LIMIT
+    return [
+        ('list events', app_module.find_events_page(coll, limit)),
+        ('list events after a page',
+         app_module.find_events_page(coll, limit, after=ObjectId())),
+        ('upcoming events', app_module.find_events_by_time(
+            coll, limit, start=datetime.datetime.utcnow())),
+        ('search events', app_module.find_text_matches(
+            coll, 'example', app_module.DEFAULT_SEARCH_LIMIT)),
+        ('events by ID', coll.find({'_id': {'$in': [ObjectId()]}})),
+    ]
+
+
+def plan_stages(plan):
+    """Returns the names of all stages of a query plan, root first."""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def explain_queries(queries):
+    """Explains queries.
+
+    Args:
+        queries (list): (name, cursor) pairs, as from canonical_queries.
+
+    Returns:
+        list: (name, stages of the winning plan, number of documents
+            examined or None if unknown) of each query.
+    """
+    results = []
+    for name, cursor in queries:
+        explanation = cursor.explain()
+        stages = plan_stages(explanation['queryPlanner']['winningPlan'])
+        docs_examined = explanation.get('executionStats', {}).get(
+            'totalDocsExamined')
+        results.append((name, stages, docs_examined))
+    return results
+
+
+def main():  # pragma: no cover
+    """Explains the queries against the DB at MONGODB_URI."""
+    if os.environ.get('MONGODB_URI') is None:
+        sys.exit('Not able to find MONGODB_URI environment variable')
+    import app     # pylint: disable=import-outside-toplevel
+    num_collscans = 0
+    for name, stages, docs_examined in explain_queries(
+            canonical_queries(app)):
+        flag = ''
+        if COLLSCAN in stages:
+            flag = '  <-- COLLSCAN'
+            num_collscans += 1
+        print(f'{name}: {" <- ".join(stages)}'
+              f' ({docs_examined} documents examined){flag}')
+    if num_collscans:
+        sys.exit(f'{num_collscans} queries scan a whole collection.')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,156 @@
+"""Index management for the events collection.
+
+Declares every index the events service relies on. The app builds missing
+ones once per process when connecting to the DB; run this module to build
+them ahead of a deployment instead, which also replaces a text index whose
+weights changed:
+
+    MONGODB_URI="mongodb+srv://..." python3 indexes.py
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import sys
+import pymongo
+from pymongo import IndexModel
+
+LOGGER = logging.getLogger(__name__)
+
+TEXT_INDEX_NAME = 'event_text'
+# Relative importance of matches in each text-indexed field, overridden by
+# the EVENTS_TEXT_WEIGHTS environment variable, e.g. "name=10,description=1".
+DEFAULT_TEXT_WEIGHTS = {'name': 10, 'description': 1}
+
+
+def parse_text_weights(spec):
+    """Parses a "field=weight,..." string into a dict of text index weights.
+
+    Returns DEFAULT_TEXT_WEIGHTS if spec is None or empty. Raises a ValueError
+    if spec is malformatted or a weight is not a positive integer.
+    """
+    if not spec:
+        return dict(DEFAULT_TEXT_WEIGHTS)
+    weights = {}
+    for item in spec.split(','):
+        field, weight = item.split('=')
+        weight = int(weight)
+        if weight < 1:
+            raise ValueError(f'Text index weight for {field} must be positive.')
+        weights[field.strip()] = weight
+    return weights
+
+
+TEXT_WEIGHTS = parse_text_weights(os.environ.get('EVENTS_TEXT_WEIGHTS'))
+
+EVENT_INDEXES = [
+    # weighted text search on event names and descriptions, used by /v1/search
+    IndexModel([(field, pymongo.TEXT) for field in TEXT_WEIGHTS],
+               name=TEXT_INDEX_NAME, weights=TEXT_WEIGHTS),
+    # time-ordered queries on events
+    IndexModel([('event_time', pymongo.ASCENDING)], name='event_time_1'),
+    # events created by an organizer
+    IndexModel([('author', pymongo.ASCENDING)], name='author_1'),
+]
+
+
+class IndexesNotBuiltError(RuntimeError):
+    """Raised when indexes are missing after trying to build them."""
+
+
+def ensure_indexes(collection):
+    """Builds any missing indexes on the events collection and verifies them.
+
+    Building an index that already exists is a no-op, so this is safe to call
+    on every startup. Never drops an index: a collection can only have one
+    text index, so if the existing one has a different name or weights, it is
+    kept and a warning logged. Dropping it here would break searches on every
+    other instance until it was rebuilt, and instances configured with
+    different weights would keep replacing each other's index. Replace it
+    with `rebuild_indexes` instead.
+
+    Raises an IndexesNotBuiltError if any index is still missing afterwards.
+    """
+    indexes = EVENT_INDEXES
+    stale = find_stale_text_indexes(collection)
+    if stale:
+        LOGGER.warning(
+            'Text index %s does not match EVENTS_TEXT_WEIGHTS %s; run '
+            'indexes.py to rebuild it', ', '.join(stale), TEXT_WEIGHTS)
+        indexes = [index for index in EVENT_INDEXES
+                   if index.document['name'] != TEXT_INDEX_NAME]
+    collection.create_indexes(indexes)
+    verify_indexes(collection, indexes)
+
+
+def rebuild_indexes(collection):
+    """Builds all indexes, replacing a text index that doesn't match.
+
+    Raises an IndexesNotBuiltError if any index is still missing afterwards.
+    """
+    for name in find_stale_text_indexes(collection):
+        collection.drop_index(name)
+    collection.create_indexes(EVENT_INDEXES)
+    verify_indexes(collection)
+
+
+def find_stale_text_indexes(collection):
+    """Returns names of text indexes that don't match the declared one."""
+    stale = []
+    for name, info in collection.index_information().items():
+        is_text = any(kind == pymongo.TEXT for _, kind in info['key'])
+        if is_text and (name != TEXT_INDEX_NAME
+                        or info.get('weights', TEXT_WEIGHTS) != TEXT_WEIGHTS):
+            stale.append(name)
+    return stale
+
+
+def verify_indexes(collection, indexes=None):
+    """Raises an IndexesNotBuiltError if any of indexes is missing.
+
+    Checks all of EVENT_INDEXES if indexes is None.
+    """
+    missing = find_missing_indexes(collection, indexes)
+    if missing:
+        raise IndexesNotBuiltError(
+            'Missing indexes on events collection: ' + ', '.join(missing))
+
+
+def find_missing_indexes(collection, indexes=None):
+    """Returns the sorted names of indexes missing from collection.
+
+    Checks all of EVENT_INDEXES if indexes is None.
+    """
+    if indexes is None:
+        indexes = EVENT_INDEXES
+    existing = collection.index_information()
+    return sorted(index.document['name'] for index in indexes
+                  if index.document['name'] not in existing)
+
+
+def main():  # pragma: no cover
+    """Builds the events indexes in the DB at MONGODB_URI."""
+    mongodb_uri = os.environ.get('MONGODB_URI')
+    if mongodb_uri is None:
+        sys.exit('Not able to find MONGODB_URI environment variable')
+    collection = pymongo.MongoClient(mongodb_uri).eventsDB.all_events
+    rebuild_indexes(collection)
+    for name in collection.index_information():
+        print(name)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
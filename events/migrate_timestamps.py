@@ -0,0 +1,96 @@
+"""One-time migration of event timestamps from strings to BSON datetimes.
+
+Events used to be stored with event_time and created_at as strings. This
+converts them in place, reading events through a cursor and writing updates
+in batches, so it runs in constant memory on collections of any size:
+
+    MONGODB_URI="mongodb+srv://..." python3 migrate_timestamps.py [batch_size]
+
+Strings that can't be parsed are left unchanged and reported. The migration
+only touches string timestamps, so it is safe to run again.
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import pymongo
+from pymongo import UpdateOne
+from eventclass import parse_timestamp
+from versions import bump_version
+
+TIMESTAMP_FIELDS = ('event_time', 'created_at')
+DEFAULT_BATCH_SIZE = 500
+
+
+def migrate_timestamps(collection, batch_size=DEFAULT_BATCH_SIZE):
+    """Converts string timestamps of all events in collection to datetimes.
+
+    Args:
+        collection: pymongo collection of events.
+        batch_size (int): number of events read and updated per round trip.
+
+    Returns:
+        tuple: number of events converted, and a list of (_id, field) pairs of
+            timestamps that could not be parsed.
+    """
+    query = {'$or': [{field: {'$type': 'string'}}
+                     for field in TIMESTAMP_FIELDS]}
+    projection = {field: 1 for field in TIMESTAMP_FIELDS}
+    num_converted = 0
+    unparsed = []
+    updates = []
+    for event in collection.find(query, projection, batch_size=batch_size):
+        converted = {}
+        for field in TIMESTAMP_FIELDS:
+            if isinstance(event.get(field), str):
+                try:
+                    converted[field] = parse_timestamp(event[field])
+                except ValueError:
+                    unparsed.append((event['_id'], field))
+        if converted:
+            # only update if the timestamps haven't changed since being read
+            expected = {field: event[field] for field in converted}
+            updates.append(UpdateOne(dict(_id=event['_id'], **expected),
+                                     {'$set': converted}))
+        if len(updates) >= batch_size:
+            num_converted += write_updates(collection, updates)
+            updates = []
+    if updates:
+        num_converted += write_updates(collection, updates)
+    if num_converted:
+        bump_version(collection)
+    return num_converted, unparsed
+
+
+def write_updates(collection, updates):
+    """Writes a batch of updates and returns the number of modified events."""
+    return collection.bulk_write(updates, ordered=False).modified_count
+
+
+def main(batch_size=DEFAULT_BATCH_SIZE):  # pragma: no cover
+    """Migrates the events collection in the DB at MONGODB_URI."""
+    mongodb_uri = os.environ.get('MONGODB_URI')
+    if mongodb_uri is None:
+        sys.exit('Not able to find MONGODB_URI environment variable')
+    collection = pymongo.MongoClient(mongodb_uri).eventsDB.all_events
+    num_converted, unparsed = migrate_timestamps(collection, batch_size)
+    print(f'Converted timestamps of {num_converted} events.')
+    for event_id, field in unparsed:
+        print(f'Could not parse {field} of event {event_id}.')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,230 @@
+"""In-memory read replica of the events collection."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+LOGGER = logging.getLogger(__name__)
+
+# how long to wait for a change before marking the replica as up to date
+CHANGE_STREAM_AWAIT_MS = 1000
+# how long to wait before reopening a change stream after an error
+RETRY_INTERVAL = 5.0
+
+
+def tokenize(text):
+    """Splits text into lowercase words."""
+    return re.findall(r'\w+', str(text).lower())
+
+
+class EventsReplica():
+    """Copy of the events collection kept in memory and in sync with the DB.
+
+    A background thread follows the collection's change stream. Change streams
+    need a replica set (e.g. MongoDB Atlas), so if the DB doesn't support them
+    (e.g. mongomock or a local standalone server) the thread instead re-reads
+    the whole collection every poll_interval seconds.
+
+    `staleness` is the time since the replica was last known to be up to date,
+    and readers should fall back to the DB once it is over max_staleness.
+    """
+
+    def __init__(self, collection, text_weights, poll_interval=5.0,
+                 max_staleness=30.0, clock=time.monotonic):
+        """Creates an empty replica. Call sync() or start() to fill it.
+
+        Args:
+            collection: pymongo collection of events to replicate.
+            text_weights (dict): weight of each field searched by search().
+            poll_interval (float): seconds between reloads when polling.
+            max_staleness (float): seconds after which the replica is stale.
+            clock (function): returns the current time in seconds.
+        """
+        self.mode = None
+        self.poll_interval = poll_interval
+        self.max_staleness = max_staleness
+        self._collection = collection
+        self._text_weights = text_weights
+        self._clock = clock
+        self._last_synced = None
+        self._lock = threading.Lock()
+        self._events = {}       # _id -> event document
+        self._ids = []          # sorted _ids
+        self._terms = {field: defaultdict(set)  # field -> word -> set of _ids
+                       for field in text_weights}
+        self._thread = None
+
+    def __len__(self):
+        """Returns the number of events in the replica."""
+        return len(self._ids)
+
+    @property
+    def staleness(self):
+        """Seconds since the replica was last up to date, or None if never."""
+        if self._last_synced is None:
+            return None
+        return self._clock() - self._last_synced
+
+    def is_fresh(self):
+        """Returns True if the replica is recent enough to serve reads."""
+        staleness = self.staleness
+        return staleness is not None and staleness <= self.max_staleness
+
+    def start(self):
+        """Loads the collection, then keeps it in sync in the background."""
+        self.sync()
+        self._thread = threading.Thread(
+            target=self._run, name='events-replica', daemon=True)
+        self._thread.start()
+
+    def sync(self):
+        """Replaces the replica with the current contents of the collection."""
+        synced_at = self._clock()
+        events = {event['_id']: event for event in self._collection.find()}
+        terms = {field: defaultdict(set) for field in self._text_weights}
+        for event in events.values():
+            self._index_terms(terms, event)
+        with self._lock:
+            self._events = events
+            self._ids = sorted(events)
+            self._terms = terms
+            self._last_synced = synced_at
+
+    def apply_change(self, change):
+        """Applies one change stream event to the replica."""
+        with self._lock:
+            operation = change['operationType']
+            if operation in ('insert', 'replace', 'update'):
+                event = change.get('fullDocument')
+                if event is None:   # deleted since the update
+                    self._remove(change['documentKey']['_id'])
+                else:
+                    self._remove(event['_id'])
+                    self._add(event)
+            elif operation == 'delete':
+                self._remove(change['documentKey']['_id'])
+            elif operation in ('drop', 'rename', 'dropDatabase'):
+                self._events = {}
+                self._ids = []
+                self._terms = {field: defaultdict(set)
+                               for field in self._text_weights}
+
+    def page(self, limit, after=None):
+        """Returns up to limit events with _ids after `after`, in _id order."""
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_right(
+                self._ids, after)
+            return [self._events[event_id]
+                    for event_id in self._ids[start:start + limit]]
+
+    def get(self, event_id):
+        """Returns the event with the given _id, or None if there is none."""
+        return self._events.get(event_id)
+
+    def get_many(self, event_ids):
+        """Returns the events with the given _ids, skipping missing ones."""
+        events = self._events
+        return [events[event_id] for event_id in event_ids
+                if event_id in events]
+
+    def search(self, text, limit, offset=0):
+        """Returns events containing words of text, most relevant first.
+
+        An approximation of MongoDB text search: matches whole words,
+        ignoring capitalization, and scores each event by the weights of the
+        fields its matching words are in. Unlike MongoDB, it doesn't match
+        word stems or ignore stop words.
+        """
+        scores = defaultdict(int)
+        with self._lock:
+            for word in set(tokenize(text)):
+                for field, weight in self._text_weights.items():
+                    for event_id in self._terms[field].get(word, ()):
+                        scores[event_id] += weight
+            best = heapq.nsmallest(
+                offset + limit, scores,
+                key=lambda event_id: (-scores[event_id], str(event_id)))
+            return [self._events[event_id] for event_id in best[offset:]]
+
+    def _add(self, event):
+        """Adds an event to the replica. Caller must hold the lock."""
+        self._events[event['_id']] = event
+        bisect.insort(self._ids, event['_id'])
+        self._index_terms(self._terms, event)
+
+    def _remove(self, event_id):
+        """Removes an event from the replica. Caller must hold the lock."""
+        event = self._events.pop(event_id, None)
+        if event is None:
+            return
+        del self._ids[bisect.bisect_left(self._ids, event_id)]
+        for field in self._text_weights:
+            for word in tokenize(event.get(field, '')):
+                self._terms[field][word].discard(event_id)
+
+    def _index_terms(self, terms, event):
+        """Adds the words of an event's searched fields to terms."""
+        for field in self._text_weights:
+            for word in tokenize(event.get(field, '')):
+                terms[field][word].add(event['_id'])
+
+    def _run(self):
+        """Keeps the replica in sync until the process exits."""
+        if not isinstance(self._collection, Collection):
+            self._poll()    # e.g. mongomock, which has no change streams
+        while True:
+            try:
+                self._follow_change_stream()
+            except PyMongoError as error:
+                if self.mode is None:   # change streams aren't supported
+                    LOGGER.info('Events change stream unavailable (%s), '
+                                'polling every %ss.',
+                                error, self.poll_interval)
+                    self._poll()
+                LOGGER.warning('Events change stream failed: %s', error)
+            time.sleep(RETRY_INTERVAL)
+
+    def _follow_change_stream(self):
+        """Applies changes from the change stream as they happen."""
+        with self._collection.watch(
+                full_document='updateLookup',
+                max_await_time_ms=CHANGE_STREAM_AWAIT_MS) as stream:
+            self.mode = 'change_stream'
+            self.sync()     # changes from here on are in the stream
+            while stream.alive:
+                checked_at = self._clock()
+                change = stream.try_next()
+                if change is None:  # caught up with the stream
+                    self._last_synced = checked_at
+                else:
+                    self.apply_change(change)
+
+    def _poll(self):
+        """Reloads the whole collection every poll_interval seconds."""
+        self.mode = 'polling'
+        while True:
+            try:
+                self.sync()
+            except PyMongoError as error:
+                LOGGER.warning('Failed to reload events: %s', error)
+            time.sleep(self.poll_interval)
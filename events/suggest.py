@@ -0,0 +1,110 @@
+"""In-memory prefix index of event names, used for search autocomplete."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import threading
+
+
+def normalize_name(name):
+    """Normalizes capitalization and whitespace of an event name or prefix."""
+    return ' '.join(str(name).lower().split())
+
+
+class PrefixIndex():
+    """Sorted array of event names supporting prefix lookups.
+
+    Every word of a name starts a key, so "fest" matches both "Festival
+    Opening" and "Summer Festival". Keys are kept in a sorted list, so a
+    lookup is a binary search for the prefix followed by a scan of the
+    matching keys, and costs O(log n + limit) string comparisons.
+    """
+
+    def __init__(self):
+        self.version = None     # version of the events indexed, see rebuild
+        self._keys = []     # sorted (name suffix, str(event_id)) tuples
+        self._events = {}   # str(event_id) -> (event_id, name)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Returns the number of indexed events."""
+        return len(self._events)
+
+    def rebuild(self, events, version=None):
+        """Replaces the index with the names of the given events.
+
+        Args:
+            events (iterable): event dicts with `_id` and `name` fields, e.g.
+                a cursor projecting only those fields.
+            version (str): version of the events, e.g. the collection's ETag,
+                to tell later whether the index is out of date.
+        """
+        indexed = {str(event['_id']): (event['_id'], event['name'])
+                   for event in events}
+        keys = sorted(key for id_key, (_, name) in indexed.items()
+                      for key in self._make_keys(id_key, name))
+        with self._lock:
+            self._keys = keys
+            self._events = indexed
+            self.version = version
+
+    def advance(self, previous, version):
+        """Records a write of events that were also added to the index.
+
+        Args:
+            previous (str): version of the events just before the write.
+            version (str): version of the events just after it, which the
+                index is now at if it was at `previous`, i.e. if nothing
+                else changed the events since it was built.
+        """
+        with self._lock:
+            if self.version == previous:
+                self.version = version
+
+    def add(self, event_id, name):
+        """Adds one event to the index."""
+        id_key = str(event_id)
+        with self._lock:
+            if id_key in self._events:
+                return
+            self._events[id_key] = (event_id, name)
+            for key in self._make_keys(id_key, name):
+                bisect.insort(self._keys, key)
+
+    def suggest(self, prefix, limit):
+        """Returns up to limit (event_id, name) pairs matching prefix.
+
+        Matches are ordered by the matching part of their names.
+        """
+        prefix = normalize_name(prefix)
+        suggestions = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while len(suggestions) < limit and i < len(self._keys):
+                key, id_key = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if id_key not in seen:
+                    seen.add(id_key)
+                    suggestions.append(self._events[id_key])
+                i += 1
+        return suggestions
+
+    @staticmethod
+    def _make_keys(id_key, name):
+        """Returns the keys of an event: its name from each word on."""
+        words = normalize_name(name).split(' ')
+        return [(' '.join(words[i:]), id_key) for i in range(len(words))]
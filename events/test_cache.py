@@ -0,0 +1,77 @@
+"""Unit tests for the search result cache."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from cache import SearchCache
+
+
+class FakeClock():  # pylint: disable=too-few-public-methods
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSearchCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SearchCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get('key', 'v1'))
+        self.cache.put('key', 'value', 'v1')
+        self.assertEqual(self.cache.get('key', 'v1'), 'value')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['size'], 1)
+
+    def test_expiry(self):
+        self.cache.put('key', 'value', 'v1')
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get('key', 'v1'), 'value')
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get('key', 'v1'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_lru_eviction(self):
+        self.cache.put('a', 1, 'v1')
+        self.cache.put('b', 2, 'v1')
+        self.cache.get('a', 'v1')  # 'b' is now least recently used
+        self.cache.put('c', 3, 'v1')
+        self.assertEqual(self.cache.get('a', 'v1'), 1)
+        self.assertIsNone(self.cache.get('b', 'v1'))
+        self.assertEqual(self.cache.get('c', 'v1'), 3)
+
+    def test_version_changed(self):
+        """Results read at another version are dropped."""
+        self.cache.put('key', 'value', 'v1')
+        self.assertIsNone(self.cache.get('key', 'v2'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_clear(self):
+        self.cache.put('key', 'value', 'v1')
+        self.cache.get('key', 'v1')
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['size'], 0)
+        self.assertEqual(self.cache.stats()['hits'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
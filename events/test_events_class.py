@@ -86,5 +86,85 @@ class TestEventsClass(unittest.TestCase):
         self.assertNotEqual(self.test_info, test_info_str_time)
 
 
+class TestEventDocumentToDict(unittest.TestCase):
+    def setUp(self):
+        self.test_info = {'name': 'test_event',
+                          'description': 'testing!',
+                          'author': 'admin',
+                          'event_time': EXAMPLE_TIME_STRING,
+                          'created_at': EXAMPLE_TIME_STRING}
+
+    def test_same_as_event_dict(self):
+        for info in (self.test_info,
+                     dict(event_id=1, **self.test_info),
+                     dict(_id=2, **self.test_info),
+                     dict(event_id=1, _id=2, **self.test_info),
+                     dict(_id=None, **self.test_info)):
+            self.assertEqual(app.event_document_to_dict(info),
+                             app.Event(**info).dict)
+
+    def test_does_not_modify_document(self):
+        info = dict(_id=2, **self.test_info)
+        app.event_document_to_dict(info)
+        self.assertEqual(info, dict(_id=2, **self.test_info))
+
+    def test_format_error(self):
+        info_missing_name = self.test_info.copy()
+        del info_missing_name['name']
+        info_extra_field = self.test_info.copy()
+        info_extra_field['extra'] = 'hello'
+        info_replaced_field = info_missing_name.copy()
+        info_replaced_field['extra'] = 'hello'
+
+        for info in (info_missing_name, info_extra_field, info_replaced_field):
+            with self.assertRaises(ValueError):
+                app.event_document_to_dict(info)
+            with self.assertRaises(ValueError):
+                app.Event(**info)
+
+    def test_partial_document(self):
+        document = {'_id': 2, 'name': 'test_event', 'author': 'admin'}
+        self.assertEqual(
+            app.event_document_to_dict(document, ('name', 'author')),
+            document)
+        self.assertEqual(app.event_document_to_dict(document, ('name',)),
+                         {'_id': 2, 'name': 'test_event'})
+        with self.assertRaises(ValueError):
+            app.event_document_to_dict(document, ('name', 'description'))
+
+
+class TestParseFields(unittest.TestCase):
+    def test_fields(self):
+        self.assertEqual(app.parse_fields(' event_time,name'),
+                         ('name', 'event_time'))
+        self.assertIsNone(app.parse_fields(None))
+        self.assertIsNone(app.parse_fields(
+            'name,description,author,created_at,event_time'))
+
+    def test_invalid_fields(self):
+        for value in ('', ' , ', 'name,_id', 'password'):
+            with self.assertRaises(ValueError):
+                app.parse_fields(value)
+
+
+class TestParseTimestamp(unittest.TestCase):
+    def test_formats(self):
+        expected = datetime.datetime(2019, 7, 30, 18, 5)
+        for value in ('2019-07-30 18:05', '2019-07-30T18:05',
+                      '2019-07-30 18:05:00', ' 2019-07-30T18:05:00.000 '):
+            self.assertEqual(app.parse_timestamp(value), expected)
+        self.assertEqual(app.parse_timestamp('2019-07-30'),
+                         datetime.datetime(2019, 7, 30))
+
+    def test_datetime_unchanged(self):
+        time = datetime.datetime(2019, 7, 30, 18, 5)
+        self.assertIs(app.parse_timestamp(time), time)
+
+    def test_invalid_format(self):
+        for value in ('7-30-2019', 'soon', '2019-07-30 25:00', ''):
+            with self.assertRaises(ValueError):
+                app.parse_timestamp(value)
+
+
 if __name__ == '__main__':
     unittest.main()
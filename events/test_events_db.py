@@ -16,7 +16,10 @@
 # limitations under the License.
 
 import unittest
+from unittest.mock import patch, MagicMock
 import datetime
+import json
+from bson import json_util
 import mongomock
 import app
 
@@ -48,6 +51,47 @@ class TestEventsDB(unittest.TestCase):
             self.assertEqual(retrieved_event, self.test_event)
         self.assertEqual(events_dict['num_events'], 10)
 
+    def test_generate_json_list(self):
+        """Checks streamed JSON matches json_util's encoding of the list."""
+        for _ in range(10):
+            self.test_coll.insert_one(self.test_event.dict)
+        self.test_coll.insert_one(dict(
+            self.event_info, created_at=datetime.datetime(2019, 6, 11)))
+        events = list(self.test_coll.find())
+        with patch('app.STREAM_CHUNK_SIZE', 100):  # force multiple chunks
+            chunks = list(app.generate_json_list(
+                iter(events), 'events',
+                lambda count, last: {'num_events': count, 'last': last['_id']}))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json_util.loads(''.join(chunks)),
+                         {'events': events, 'num_events': len(events),
+                          'last': events[-1]['_id']})
+
+    def test_generate_empty_json_list(self):
+        """Checks an empty list is streamed as valid JSON."""
+        chunks = app.generate_json_list(
+            iter([]), 'events', lambda count, last: {'num_events': count})
+        self.assertEqual(json.loads(''.join(chunks)),
+                         {'events': [], 'num_events': 0})
+
+    def test_text_search_ranked(self):
+        """Checks text search sorts by relevance and bounds the results."""
+        mock_coll = MagicMock()
+        cursor = mock_coll.find.return_value.sort.return_value.skip.return_value
+        cursor.limit.return_value = [dict(self.event_info, score=1.5)]
+        events = list(app.text_search_event_name(
+            mock_coll, 'test', limit=5, offset=10))
+
+        score = {'$meta': 'textScore'}
+        mock_coll.find.assert_called_once_with(
+            {'$text': {'$search': 'test'}}, {'score': score})
+        mock_coll.find.return_value.sort.assert_called_once_with(
+            [('score', score)])
+        mock_coll.find.return_value.sort.return_value.skip.assert_called_once_with(
+            10)
+        cursor.limit.assert_called_once_with(5)
+        self.assertEqual(events, [self.event_info])
+
     def test_build_info(self):
         test_info = {'name': 'test_event',
                      'description': 'testing!',
@@ -0,0 +1,86 @@
+"""Unit tests for events collection index management."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import mongomock
+import indexes
+
+DECLARED_INDEX_NAMES = sorted(
+    index.document['name'] for index in indexes.EVENT_INDEXES)
+
+
+class TestEnsureIndexes(unittest.TestCase):
+    def setUp(self):
+        self.coll = mongomock.MongoClient().eventsDB.all_events
+
+    def test_builds_all_indexes(self):
+        """All declared indexes exist after ensure_indexes."""
+        self.assertEqual(indexes.find_missing_indexes(self.coll),
+                         DECLARED_INDEX_NAMES)
+        indexes.ensure_indexes(self.coll)
+        self.assertEqual(indexes.find_missing_indexes(self.coll), [])
+        for name in DECLARED_INDEX_NAMES:
+            self.assertIn(name, self.coll.index_information())
+
+    def test_ensure_is_idempotent(self):
+        """Building indexes that already exist doesn't fail."""
+        indexes.ensure_indexes(self.coll)
+        indexes.ensure_indexes(self.coll)
+        self.assertEqual(indexes.find_missing_indexes(self.coll), [])
+
+    def test_verify_missing_index(self):
+        """Verification fails when a declared index is missing."""
+        indexes.ensure_indexes(self.coll)
+        self.coll.drop_index('author_1')
+        with self.assertRaises(indexes.IndexesNotBuiltError):
+            indexes.verify_indexes(self.coll)
+
+    def test_keeps_stale_text_index(self):
+        """The app keeps an old text index, building the other indexes."""
+        self.coll.create_index([('name', 'text')], name='name_text')
+        with self.assertLogs('indexes', 'WARNING'):
+            indexes.ensure_indexes(self.coll)
+        self.assertIn('name_text', self.coll.index_information())
+        self.assertIn('author_1', self.coll.index_information())
+
+    def test_rebuild_replaces_stale_text_index(self):
+        """An old text index is replaced by the declared one."""
+        self.coll.create_index([('name', 'text')], name='name_text')
+        indexes.rebuild_indexes(self.coll)
+        self.assertNotIn('name_text', self.coll.index_information())
+        self.assertIn(indexes.TEXT_INDEX_NAME, self.coll.index_information())
+        self.assertEqual(indexes.find_missing_indexes(self.coll), [])
+
+
+class TestParseTextWeights(unittest.TestCase):
+    def test_default_weights(self):
+        self.assertEqual(indexes.parse_text_weights(None),
+                         indexes.DEFAULT_TEXT_WEIGHTS)
+        self.assertEqual(indexes.parse_text_weights(''),
+                         indexes.DEFAULT_TEXT_WEIGHTS)
+
+    def test_configured_weights(self):
+        self.assertEqual(indexes.parse_text_weights('name=5, description=2'),
+                         {'name': 5, 'description': 2})
+
+    def test_invalid_weights(self):
+        for spec in ('name', 'name=heavy', 'name=0', 'name=1=2'):
+            with self.assertRaises(ValueError):
+                indexes.parse_text_weights(spec)
+
+
+if __name__ == '__main__':
+    unittest.main()
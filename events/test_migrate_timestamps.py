@@ -0,0 +1,71 @@
+"""Unit tests for migrating event timestamps to datetimes."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import datetime
+import mongomock
+import migrate_timestamps
+
+EXAMPLE_TIME = datetime.datetime(2019, 6, 11, 10, 33, 1)
+EXAMPLE_TIME_STRING = EXAMPLE_TIME.isoformat(sep=' ')
+
+
+class TestMigrateTimestamps(unittest.TestCase):
+    def setUp(self):
+        self.coll = mongomock.MongoClient().eventsDB.all_events
+        self.event = {'name': 'test_event',
+                      'description': 'testing!',
+                      'author': 'admin'}
+
+    def test_converts_strings(self):
+        self.coll.insert_many([
+            dict(self.event, event_time=EXAMPLE_TIME_STRING,
+                 created_at=EXAMPLE_TIME_STRING)
+            for _ in range(5)])
+        num_converted, unparsed = migrate_timestamps.migrate_timestamps(
+            self.coll, batch_size=2)
+        self.assertEqual(num_converted, 5)
+        self.assertEqual(unparsed, [])
+        for event in self.coll.find():
+            self.assertEqual(event['event_time'], EXAMPLE_TIME)
+            self.assertEqual(event['created_at'], EXAMPLE_TIME)
+            self.assertEqual(event['name'], self.event['name'])
+
+    def test_skips_datetimes(self):
+        self.coll.insert_one(dict(self.event, event_time=EXAMPLE_TIME,
+                                  created_at=EXAMPLE_TIME_STRING))
+        self.coll.insert_one(dict(self.event, event_time=EXAMPLE_TIME,
+                                  created_at=EXAMPLE_TIME))
+        num_converted, _ = migrate_timestamps.migrate_timestamps(self.coll)
+        self.assertEqual(num_converted, 1)
+        self.assertEqual(self.coll.count_documents(
+            {'created_at': EXAMPLE_TIME, 'event_time': EXAMPLE_TIME}), 2)
+
+    def test_reports_unparsed(self):
+        event_id = self.coll.insert_one(dict(
+            self.event, event_time='7-30-2019',
+            created_at=EXAMPLE_TIME_STRING)).inserted_id
+        num_converted, unparsed = migrate_timestamps.migrate_timestamps(
+            self.coll)
+        self.assertEqual(num_converted, 1)
+        self.assertEqual(unparsed, [(event_id, 'event_time')])
+        event = self.coll.find_one()
+        self.assertEqual(event['event_time'], '7-30-2019')
+        self.assertEqual(event['created_at'], EXAMPLE_TIME)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Unit tests for the in-memory events replica."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import mongomock
+from replica import EventsReplica
+
+WEIGHTS = {'name': 10, 'description': 1}
+EVENTS = [
+    {'_id': 1, 'name': 'Summer Festival', 'description': 'Music outside.'},
+    {'_id': 2, 'name': 'Jazz Night', 'description': 'Festival music.'},
+    {'_id': 3, 'name': 'Rock Night', 'description': 'Loud.'}]
+
+
+class FakeClock():
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class TestEventsReplica(unittest.TestCase):
+    def setUp(self):
+        self.collection = mongomock.MongoClient().db.collection
+        self.collection.insert_many([dict(event) for event in EVENTS])
+        self.clock = FakeClock()
+        self.replica = EventsReplica(self.collection, WEIGHTS,
+                                     max_staleness=30, clock=self.clock)
+        self.replica.sync()
+
+    def get_ids(self, events):
+        return [event['_id'] for event in events]
+
+    def test_sync(self):
+        self.assertEqual(len(self.replica), len(EVENTS))
+        self.assertEqual(self.replica.get(2)['name'], 'Jazz Night')
+        self.assertIsNone(self.replica.get(4))
+        self.collection.delete_one({'_id': 1})
+        self.replica.sync()
+        self.assertIsNone(self.replica.get(1))
+
+    def test_page(self):
+        self.assertEqual(self.get_ids(self.replica.page(2)), [1, 2])
+        self.assertEqual(self.get_ids(self.replica.page(2, after=2)), [3])
+        self.assertEqual(self.replica.page(2, after=3), [])
+
+    def test_get_many(self):
+        self.assertEqual(self.get_ids(self.replica.get_many([3, 4, 1])),
+                         [3, 1])
+
+    def test_search_ranks_by_weight(self):
+        """Matches in names outweigh matches in descriptions."""
+        self.assertEqual(self.get_ids(self.replica.search('FESTIVAL', 10)),
+                         [1, 2])
+        self.assertEqual(self.get_ids(self.replica.search('festival', 1, 1)),
+                         [2])
+        self.assertEqual(self.get_ids(self.replica.search('night rock', 10)),
+                         [3, 2])
+        self.assertEqual(self.replica.search('fest', 10), [])
+
+    def test_apply_insert_and_update(self):
+        self.replica.apply_change({
+            'operationType': 'insert',
+            'fullDocument': {'_id': 4, 'name': 'Poetry', 'description': ''}})
+        self.assertEqual(self.get_ids(self.replica.page(10, after=2)), [3, 4])
+        self.replica.apply_change({
+            'operationType': 'update', 'documentKey': {'_id': 4},
+            'fullDocument': {'_id': 4, 'name': 'Slam', 'description': ''}})
+        self.assertEqual(self.get_ids(self.replica.search('slam', 10)), [4])
+        self.assertEqual(self.replica.search('poetry', 10), [])
+        self.assertEqual(len(self.replica), len(EVENTS) + 1)
+
+    def test_apply_delete(self):
+        self.replica.apply_change(
+            {'operationType': 'delete', 'documentKey': {'_id': 2}})
+        self.assertEqual(self.get_ids(self.replica.page(10)), [1, 3])
+        self.assertEqual(
+            self.get_ids(self.replica.search('jazz festival', 10)), [1])
+
+    def test_apply_drop(self):
+        self.replica.apply_change({'operationType': 'drop'})
+        self.assertEqual(len(self.replica), 0)
+        self.assertEqual(self.replica.search('night', 10), [])
+
+    def test_staleness(self):
+        self.assertTrue(self.replica.is_fresh())
+        self.clock.time = 31
+        self.assertEqual(self.replica.staleness, 31)
+        self.assertFalse(self.replica.is_fresh())
+        self.replica.sync()
+        self.assertTrue(self.replica.is_fresh())
+
+    def test_never_synced_is_stale(self):
+        replica = EventsReplica(self.collection, WEIGHTS)
+        self.assertIsNone(replica.staleness)
+        self.assertFalse(replica.is_fresh())
+
+
+if __name__ == '__main__':
+    unittest.main()
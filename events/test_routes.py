@@ -16,12 +16,14 @@
 # limitations under the License.
 
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, ANY, MagicMock
 import datetime
+import json
 from contextlib import contextmanager
-from bson import json_util
+from bson import json_util, ObjectId
 import mongomock
 import app
+from versions import bump_version
 
 EXAMPLE_TIME_STRING = datetime.datetime(
     2019, 6, 11, 10, 33, 1, 100000).isoformat(sep=' ', timespec='seconds')
@@ -36,6 +38,12 @@ INVALID_REQUEST_INFO_MISSING_ATTRIBUTE = {
     'description': 'This event is missing an author!',
     'event_time': EXAMPLE_TIME_STRING}
 
+VALID_REQUEST_INFO_DB = {
+    'name': 'valid_event',
+    'description': 'This event is formatted correctly!',
+    'author': 'admin',
+    'created_at': datetime.datetime(2019, 6, 11, 10, 33, 1)}
+
 VALID_EVENT_NAME = 'valid_event'
 VALID_DB_EVENT = {
     'name': VALID_EVENT_NAME,
@@ -87,6 +95,23 @@ class TestUploadEventRoute(unittest.TestCase):
 
         self.assertEqual(self.coll.count_documents({}), 1)
 
+    def test_add_event_stores_datetimes(self):
+        """Test event times are stored as datetimes."""
+        self.client.post('/v1/add', data=dict(VALID_REQUEST_INFO,
+                                              event_time='2019-07-30T18:00'))
+        event = self.coll.find_one()
+        self.assertEqual(event['event_time'],
+                         datetime.datetime(2019, 7, 30, 18, 0))
+        self.assertIsInstance(event['created_at'], datetime.datetime)
+
+    def test_add_invalid_event_time(self):
+        """Test posting of event with a malformatted event_time."""
+        response = self.client.post(
+            '/v1/add', data=dict(VALID_REQUEST_INFO, event_time='7-30-2019'))
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(self.coll.count_documents({}), 0)
+
     def test_add_invalid_event(self):
         """Test posting of invalid event with missing attributes."""
         response = self.client.post(
@@ -107,6 +132,97 @@ class TestUploadEventRoute(unittest.TestCase):
             self.assertEqual(self.coll.count_documents({}), 0)
 
 
+class TestBulkAddEventsRoute(unittest.TestCase):
+    """Test bulk add events endpoint POST /v1/bulk_add."""
+
+    def setUp(self):
+        """Set up test client and mock DB."""
+        self.coll = mongomock.MongoClient().db.collection
+        app.app.config['COLLECTION'] = self.coll
+        app.app.config['TESTING'] = True
+        self.client = app.app.test_client()
+
+    def test_add_json_array(self):
+        """Test adding a JSON array of valid events."""
+        events = [dict(VALID_REQUEST_INFO, event_name=f'event {i}')
+                  for i in range(5)]
+        response = self.client.post('/v1/bulk_add', json=events)
+        self.assertEqual(response.status_code, 201)
+        data = response.get_json()
+        self.assertEqual(data['num_added'], 5)
+        self.assertEqual(data['num_failed'], 0)
+        self.assertEqual([result['index'] for result in data['results']],
+                         list(range(5)))
+        self.assertEqual(self.coll.count_documents({}), 5)
+        for i, result in enumerate(data['results']):
+            event = self.coll.find_one({'_id': ObjectId(result['_id'])})
+            self.assertEqual(event['name'], f'event {i}')
+
+    def test_add_ndjson(self):
+        """Test adding newline-delimited events with some invalid lines."""
+        body = '\n'.join([json.dumps(VALID_REQUEST_INFO),
+                          json.dumps(INVALID_REQUEST_INFO_MISSING_ATTRIBUTE),
+                          '',
+                          '{not json',
+                          json.dumps(['not', 'an', 'event']),
+                          json.dumps(VALID_REQUEST_INFO)])
+        response = self.client.post('/v1/bulk_add', data=body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 207)
+        data = response.get_json()
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['added', 'invalid', 'invalid', 'invalid', 'added'])
+        self.assertEqual(data['num_added'], 2)
+        self.assertEqual(data['num_failed'], 3)
+        self.assertEqual(self.coll.count_documents({}), 2)
+
+    def test_add_in_batches(self):
+        """Test events are inserted with one insert_many call per batch."""
+        events = [VALID_REQUEST_INFO] * 5
+        with patch.object(self.coll, 'insert_many',
+                          wraps=self.coll.insert_many) as insert_many:
+            with patch('app.BULK_INSERT_BATCH_SIZE', 2):
+                response = self.client.post('/v1/bulk_add', json=events)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(insert_many.call_count, 3)
+        self.assertEqual(self.coll.count_documents({}), 5)
+
+    def test_failed_inserts(self):
+        """Test events rejected by the DB are reported without stopping."""
+        existing_id = ObjectId()
+        self.coll.insert_one({'_id': existing_id})
+        real_insert_many = self.coll.insert_many
+
+        def insert_with_duplicate(events, ordered):
+            events[0]['_id'] = existing_id  # duplicate key error
+            return real_insert_many(events, ordered=ordered)
+        with patch.object(self.coll, 'insert_many', insert_with_duplicate):
+            response = self.client.post(
+                '/v1/bulk_add', json=[VALID_REQUEST_INFO] * 3)
+        self.assertEqual(response.status_code, 207)
+        data = response.get_json()
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['failed', 'added', 'added'])
+        self.assertEqual(self.coll.count_documents({}), 3)
+
+    def test_not_a_list(self):
+        """Test posting something other than a list of events."""
+        for body in ({'event_name': 'not in a list'}, 'not json'):
+            response = self.client.post('/v1/bulk_add', json=body)
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.coll.count_documents({}), 0)
+
+    def test_db_not_defined(self):
+        """Test bulk adding events when DB connection is undefined."""
+        with environ(app.os.environ):
+            if 'MONGODB_URI' in app.os.environ:
+                del app.os.environ['MONGODB_URI']
+            app.app.config['COLLECTION'] = app.connect_to_mongodb()
+            response = self.client.post('/v1/bulk_add',
+                                        json=[VALID_REQUEST_INFO])
+            self.assertEqual(response.status_code, 500)
+
+
 class TestGetEventsRoute(unittest.TestCase):
     """Test retrieve all events endpoint GET /v1/."""
 
@@ -141,6 +257,75 @@ class TestGetEventsRoute(unittest.TestCase):
         self.assertEqual(len(data['events']), 0)
         self.assertEqual(data['num_events'], 0)
 
+    def test_paginate_events(self):
+        """Test retrieving all events a page at a time with `next` cursors."""
+        event = {k: v for k, v in VALID_DB_EVENT.items() if k != '_id'}
+        self.coll.insert_many(
+            [dict(event, name=f'event {i}') for i in range(5)])
+
+        names = []
+        query = {'limit': 2}
+        while True:
+            response = self.client.get('/v1/', query_string=query)
+            self.assertEqual(response.status_code, 200)
+            data = json_util.loads(response.data)
+            self.assertLessEqual(len(data['events']), 2)
+            self.assertEqual(data['num_events'], 5)
+            names.extend(event['name'] for event in data['events'])
+            if data['next'] is None:
+                break
+            query = {'limit': 2, 'after': data['next']}
+        self.assertEqual(names, [f'event {i}' for i in range(5)])
+
+    def test_last_page_has_no_next(self):
+        """Test that a page smaller than the limit has no `next` cursor."""
+        self.coll.insert_many(self.fake_events)
+        response = self.client.get('/v1/', query_string={'limit': 5})
+        data = json_util.loads(response.data)
+        self.assertEqual(len(data['events']), len(self.fake_events))
+        self.assertIsNone(data['next'])
+
+    def test_conditional_get(self):
+        """Test that unchanged events are answered with 304 Not Modified."""
+        self.coll.insert_many(self.fake_events)
+        response = self.client.get('/v1/')
+        etag = response.headers['ETag']
+        response = self.client.get('/v1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.data, b'')
+
+    def test_add_event_changes_etag(self):
+        """Test that adding events makes cached ETags stale."""
+        etag = self.client.get('/v1/').headers['ETag']
+        self.client.post('/v1/add', data=VALID_REQUEST_INFO)
+        response = self.client.get('/v1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(json_util.loads(response.data)['events']), 1)
+
+        etag = response.headers['ETag']
+        self.client.post('/v1/bulk_add', json=[VALID_REQUEST_INFO])
+        response = self.client.get('/v1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_fields_projection(self):
+        """Test returning only the requested fields of each event."""
+        self.coll.insert_many(self.fake_events)
+        with patch.object(self.coll, 'find', wraps=self.coll.find) as find:
+            response = self.client.get('/v1/', query_string={'fields': 'name'})
+        self.assertNotIn('description', find.call_args[0][1])
+        data = json_util.loads(response.data)
+        self.assertEqual([set(event) for event in data['events']],
+                         [{'_id', 'name'}] * len(self.fake_events))
+
+    def test_invalid_page_parameters(self):
+        """Test malformatted `limit` and `after` parameters."""
+        for query in ({'limit': 0}, {'limit': 'ten'}, {'after': 'not an id'},
+                      {'fields': 'name,password'}):
+            response = self.client.get('/v1/', query_string=query)
+            self.assertEqual(response.status_code, 400)
+
     def test_db_not_defined(self):
         """Test getting events when DB connection is undefined."""
         with environ(app.os.environ):
@@ -151,6 +336,62 @@ class TestGetEventsRoute(unittest.TestCase):
             self.assertEqual(response.status_code, 500)
 
 
+class TestEventsByTimeRoutes(unittest.TestCase):
+    """Test time range endpoints GET /v1/range and GET /v1/upcoming."""
+
+    def setUp(self):
+        """Set up test client and seed mock DB with an event each day."""
+        self.coll = mongomock.MongoClient().db.collection
+        app.app.config['COLLECTION'] = self.coll
+        app.app.config['TESTING'] = True
+        self.client = app.app.test_client()
+        self.now = datetime.datetime.utcnow().replace(microsecond=0)
+        self.times = [self.now + datetime.timedelta(days=days)
+                      for days in (3, -2, 1, -1, 2)]
+        self.coll.insert_many(
+            [dict(VALID_REQUEST_INFO_DB, event_time=time, name=str(days))
+             for days, time in enumerate(self.times)])
+
+    def get_event_times(self, response):
+        """Returns the event times of the events in a response."""
+        self.assertEqual(response.status_code, 200)
+        data = json_util.loads(response.data)
+        self.assertEqual(data['num_events'], len(data['events']))
+        return [event['event_time'].replace(tzinfo=None)
+                for event in data['events']]
+
+    def test_range(self):
+        """Test getting events in a time range, ordered by time."""
+        start = self.now - datetime.timedelta(days=1)
+        end = self.now + datetime.timedelta(days=3)
+        response = self.client.get('/v1/range', query_string={
+            'start': start.isoformat(), 'end': end.isoformat()})
+        self.assertEqual(self.get_event_times(response),
+                         sorted(time for time in self.times
+                                if start <= time < end))
+
+    def test_range_limit(self):
+        """Test getting the first events in a time range."""
+        response = self.client.get('/v1/range', query_string={
+            'start': '2000-01-01', 'end': '3000-01-01', 'limit': 2})
+        self.assertEqual(self.get_event_times(response),
+                         sorted(self.times)[:2])
+
+    def test_invalid_range(self):
+        """Test malformatted and missing range bounds."""
+        for query in ({'start': '2019-07-30'}, {'end': '2019-07-30'},
+                      {'start': 'yesterday', 'end': '2019-07-30'}):
+            response = self.client.get('/v1/range', query_string=query)
+            self.assertEqual(response.status_code, 400)
+
+    def test_upcoming(self):
+        """Test getting the next events to take place."""
+        response = self.client.get('/v1/upcoming', query_string={'limit': 2})
+        self.assertEqual(self.get_event_times(response),
+                         sorted(time for time in self.times
+                                if time > self.now)[:2])
+
+
 class TestSearchEventsRoute(unittest.TestCase):
     """Test searching for an event by name at endpoint GET /v1/."""
 
@@ -165,6 +406,7 @@ class TestSearchEventsRoute(unittest.TestCase):
             VALID_DB_EVENT_WITH_ID
         ]
         self.coll.insert_many(self.fake_events)
+        app.SEARCH_CACHE.clear()
 
     @patch('app.text_search_event_name', MagicMock(return_value=[VALID_DB_EVENT]))
     def test_search_existing_event(self):
@@ -204,6 +446,58 @@ class TestSearchEventsRoute(unittest.TestCase):
         self.assertEqual(len(data['events']), 0)
         self.assertEqual(data['num_events'], 0)
 
+    @patch('app.text_search_event_name', MagicMock(return_value=[]))
+    def test_search_page_parameters(self):
+        """Search passes the requested page of results to the DB query."""
+        response = self.client.get('/v1/search', query_string={
+            'name': VALID_EVENT_NAME, 'limit': 5, 'offset': 10})
+        self.assertEqual(response.status_code, 200)
+        _, kwargs = app.text_search_event_name.call_args
+        self.assertEqual(kwargs, {'limit': 5, 'offset': 10, 'fields': None})
+
+    def test_search_invalid_page_parameters(self):
+        """Malformatted `limit` and `offset` when searching for events."""
+        for query in ({'limit': -1}, {'offset': -1}, {'offset': 'x'},
+                      {'offset': app.MAX_SEARCH_OFFSET + 1}):
+            response = self.client.get(
+                '/v1/search', query_string=dict(name=VALID_EVENT_NAME, **query))
+            self.assertEqual(response.status_code, 400)
+
+    @patch('app.text_search_event_name')
+    def test_repeat_search_is_cached(self, mock_search):
+        """Repeat searches differing only in case and spacing hit the cache."""
+        mock_search.side_effect = lambda *args, **kwargs: [VALID_DB_EVENT]
+        first = self.client.get('/v1/search?name=' + VALID_EVENT_NAME)
+        second = self.client.get(
+            '/v1/search', query_string={'name': f' {VALID_EVENT_NAME.upper()}'})
+        self.assertEqual(mock_search.call_count, 1)
+        self.assertEqual(json_util.loads(first.data),
+                         json_util.loads(second.data))
+
+        stats = json_util.loads(self.client.get('/v1/cache_stats').data)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    @patch('app.text_search_event_name')
+    def test_add_event_invalidates_cache(self, mock_search):
+        """Adding an event makes cached search results stale."""
+        mock_search.side_effect = lambda *args, **kwargs: [VALID_DB_EVENT]
+        self.client.get('/v1/search?name=' + VALID_EVENT_NAME)
+        self.client.post('/v1/add', data=VALID_REQUEST_INFO)
+        self.client.get('/v1/search?name=' + VALID_EVENT_NAME)
+        self.assertEqual(mock_search.call_count, 2)
+
+    @patch('app.text_search_event_name')
+    def test_events_added_elsewhere_invalidate_cache(self, mock_search):
+        """Events added by other processes make cached results stale too."""
+        mock_search.side_effect = lambda *args, **kwargs: [VALID_DB_EVENT]
+        self.client.get('/v1/search?name=' + VALID_EVENT_NAME)
+        self.coll.insert_one(dict(VALID_REQUEST_INFO_DB))
+        bump_version(self.coll)
+        self.client.get('/v1/search?name=' + VALID_EVENT_NAME)
+        self.assertEqual(mock_search.call_count, 2)
+
     def test_search_malformatted_name(self):
         """Malformatted query when searching for events."""
         response = self.client.get('/v1/search?bad_arg=' + 'not allowed')
@@ -219,6 +513,130 @@ class TestSearchEventsRoute(unittest.TestCase):
             self.assertEqual(response.status_code, 500)
 
 
+class TestSuggestEventsRoute(unittest.TestCase):
+    """Test event name autocomplete endpoint GET /v1/suggest."""
+
+    def setUp(self):
+        """Set up test client and build the index from a seeded mock DB."""
+        self.coll = mongomock.MongoClient().db.collection
+        app.app.config['COLLECTION'] = self.coll
+        app.app.config['TESTING'] = True
+        self.client = app.app.test_client()
+        self.coll.insert_many([dict(VALID_REQUEST_INFO_DB, name=name)
+                               for name in ('Jazz Night', 'Jazz Brunch')])
+        app.load_suggest_index(self.coll)
+
+    def get_suggested_names(self, query):
+        """Returns the sorted names suggested for the query."""
+        response = self.client.get('/v1/suggest', query_string=query)
+        self.assertEqual(response.status_code, 200)
+        data = json_util.loads(response.data)
+        self.assertEqual(data['num_suggestions'], len(data['suggestions']))
+        for suggestion in data['suggestions']:
+            self.assertEqual(
+                self.coll.find_one(suggestion['_id'])['name'],
+                suggestion['name'])
+        return sorted(suggestion['name'] for suggestion in data['suggestions'])
+
+    def test_suggest(self):
+        """Test suggesting events by name prefix."""
+        self.assertEqual(self.get_suggested_names({'prefix': 'ja'}),
+                         ['Jazz Brunch', 'Jazz Night'])
+        self.assertEqual(self.get_suggested_names({'prefix': 'ja', 'limit': 1}),
+                         ['Jazz Brunch'])
+        self.assertEqual(self.get_suggested_names({'prefix': 'rock'}), [])
+
+    def test_added_events_are_suggested(self):
+        """Test events added through the API are suggested."""
+        self.client.post('/v1/add', data=dict(VALID_REQUEST_INFO,
+                                              event_name='Rock Night'))
+        self.client.post('/v1/bulk_add', json=[dict(VALID_REQUEST_INFO,
+                                                    event_name='Rock Brunch')])
+        self.assertEqual(self.get_suggested_names({'prefix': 'rock'}),
+                         ['Rock Brunch', 'Rock Night'])
+
+    def test_events_added_elsewhere_are_suggested(self):
+        """Test events added by other processes are suggested once checked."""
+        self.coll.insert_one(dict(VALID_REQUEST_INFO_DB, name='Rock Night'))
+        bump_version(self.coll)
+        self.assertEqual(self.get_suggested_names({'prefix': 'rock'}), [])
+        app.refresh_suggest_index(self.coll)
+        self.assertEqual(self.get_suggested_names({'prefix': 'rock'}),
+                         ['Rock Night'])
+
+    def test_own_events_are_not_rebuilt(self):
+        """Test events added by this process don't need a rebuild."""
+        self.client.post('/v1/add', data=dict(VALID_REQUEST_INFO,
+                                              event_name='Rock Night'))
+        with patch('app.load_suggest_index') as mock_load:
+            app.refresh_suggest_index(self.coll)
+        mock_load.assert_not_called()
+
+    def test_invalid_query(self):
+        """Test suggesting without a prefix or with an invalid limit."""
+        for query in ({}, {'prefix': 'ja', 'limit': 0}):
+            response = self.client.get('/v1/suggest', query_string=query)
+            self.assertEqual(response.status_code, 400)
+
+
+class TestGetEventsBatchRoute(unittest.TestCase):
+    """Test getting many events by ID at endpoint GET /v1/batch."""
+
+    def setUp(self):
+        """Set up test client and seed mock DB."""
+        self.coll = mongomock.MongoClient().db.collection
+        app.app.config['COLLECTION'] = self.coll
+        app.app.config['TESTING'] = True
+        self.client = app.app.test_client()
+        event = {k: v for k, v in VALID_DB_EVENT.items() if k != '_id'}
+        self.ids = self.coll.insert_many(
+            [dict(event, name=f'event {i}') for i in range(3)]).inserted_ids
+
+    def get_batch(self, ids, **kwargs):
+        return self.client.get(
+            '/v1/batch', query_string={'ids': ','.join(map(str, ids))},
+            **kwargs)
+
+    def test_results_in_request_order(self):
+        """Test that events are returned in request order, with misses."""
+        missing_id = ObjectId()
+        response = self.get_batch(
+            [self.ids[2], missing_id, self.ids[0], self.ids[2]])
+        self.assertEqual(response.status_code, 200)
+        data = json_util.loads(response.data)
+        names = [event and event['name'] for event in data['events']]
+        self.assertEqual(names, ['event 2', None, 'event 0', 'event 2'])
+        self.assertEqual(data['missing'], [str(missing_id)])
+        self.assertEqual(data['num_events'], 3)
+
+    def test_single_query(self):
+        """Test that all IDs are looked up with one $in query."""
+        with patch.object(self.coll, 'find', wraps=self.coll.find) as find:
+            self.get_batch(self.ids)
+        find.assert_called_once_with({'_id': {'$in': ANY}}, None)
+        self.assertCountEqual(find.call_args[0][0]['_id']['$in'], self.ids)
+
+    def test_conditional_get(self):
+        etag = self.get_batch(self.ids).headers['ETag']
+        response = self.get_batch(self.ids, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalid_ids(self):
+        for ids in ('', ' , ', 'not an id', ','.join(['a' * 24] * 101)):
+            response = self.client.get('/v1/batch', query_string={'ids': ids})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/v1/batch').status_code, 400)
+
+    def test_db_not_defined(self):
+        """Test getting events when DB connection is undefined."""
+        with environ(app.os.environ):
+            if 'MONGODB_URI' in app.os.environ:
+                del app.os.environ['MONGODB_URI']
+            app.app.config['COLLECTION'] = app.connect_to_mongodb()
+            response = self.get_batch(self.ids)
+            self.assertEqual(response.status_code, 500)
+
+
 class TestGetEventByID(unittest.TestCase):
     """Test searching for an event by name at endpoint GET /v1/."""
 
@@ -266,5 +684,79 @@ class TestGetEventByID(unittest.TestCase):
             self.assertEqual(response.status_code, 500)
 
 
+class TestReadReplicaRoutes(unittest.TestCase):
+    """Test serving reads from the in-memory replica."""
+
+    def setUp(self):
+        """Set up test client and a replica of a mock DB."""
+        self.coll = mongomock.MongoClient().db.collection
+        event = {k: v for k, v in VALID_DB_EVENT.items() if k != '_id'}
+        self.coll.insert_many(
+            [dict(event, name=f'event {i}') for i in range(3)])
+        app.app.config['COLLECTION'] = self.coll
+        app.app.config['TESTING'] = True
+        self.clock = MagicMock(return_value=0)
+        self.replica = app.EventsReplica(
+            self.coll, {'name': 1}, max_staleness=30, clock=self.clock)
+        self.replica.sync()
+        app.app.config['REPLICA'] = self.replica
+        app.SEARCH_CACHE.clear()
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        app.app.config['REPLICA'] = None
+
+    def get_names(self, response):
+        self.assertEqual(response.status_code, 200)
+        data = json_util.loads(response.data)
+        return [event['name'] for event in data['events']]
+
+    def test_reads_use_replica(self):
+        """Events deleted from the DB are still served until the next sync."""
+        event_id = self.coll.find_one({'name': 'event 1'})['_id']
+        self.coll.delete_many({})
+        self.assertEqual(self.get_names(self.client.get('/v1/')),
+                         ['event 0', 'event 1', 'event 2'])
+        self.assertEqual(self.get_names(self.client.put(f'/v1/{event_id}')),
+                         ['event 1'])
+        response = self.client.get(
+            '/v1/batch', query_string={'ids': f'{event_id},{event_id}'})
+        self.assertEqual(self.get_names(response), ['event 1', 'event 1'])
+        self.assertEqual(
+            self.get_names(self.client.get('/v1/search?name=EVENT&limit=2')),
+            ['event 0', 'event 1'])
+
+    def test_replica_responses_have_no_etag(self):
+        etag = self.client.get('/v1/').headers.get('ETag')
+        self.assertIsNone(etag)
+        self.clock.return_value = 31
+        etag = self.client.get('/v1/').headers['ETag']
+        self.clock.return_value = 0
+        response = self.client.get('/v1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_replica_falls_back_to_db(self):
+        self.coll.delete_many({'name': 'event 0'})
+        self.clock.return_value = 31
+        self.assertEqual(self.get_names(self.client.get('/v1/')),
+                         ['event 1', 'event 2'])
+
+    def test_added_events_are_replicated(self):
+        self.client.post('/v1/add', data=VALID_REQUEST_INFO)
+        self.assertEqual(self.get_names(self.client.get('/v1/'))[-1],
+                         VALID_REQUEST_INFO['event_name'])
+
+    def test_replica_status(self):
+        self.clock.return_value = 12
+        response = self.client.get('/v1/replica_status')
+        self.assertEqual(json.loads(response.data), {
+            'enabled': True, 'mode': None, 'fresh': True,
+            'staleness_seconds': 12, 'max_staleness_seconds': 30,
+            'num_events': 3})
+        app.app.config['REPLICA'] = None
+        response = self.client.get('/v1/replica_status')
+        self.assertEqual(json.loads(response.data), {'enabled': False})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+"""Unit tests for the event name prefix index."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from suggest import PrefixIndex
+
+EVENTS = [
+    {'_id': 1, 'name': 'Summer Festival'},
+    {'_id': 2, 'name': 'Festival  Opening'},
+    {'_id': 3, 'name': 'Jazz Night'},
+    {'_id': 4, 'name': 'festival of festivals'}]
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.rebuild(EVENTS)
+
+    def test_suggest_name_prefix(self):
+        self.assertEqual(self.index.suggest('jaz', 10), [(3, 'Jazz Night')])
+
+    def test_suggest_any_word(self):
+        """Prefixes match the start of any word, ignoring case."""
+        suggestions = self.index.suggest(' FEST', 10)
+        self.assertEqual(sorted(event_id for event_id, _ in suggestions),
+                         [1, 2, 4])
+
+    def test_suggest_across_words(self):
+        self.assertEqual(self.index.suggest('festival op', 10),
+                         [(2, 'Festival  Opening')])
+
+    def test_suggest_limit(self):
+        self.assertEqual(len(self.index.suggest('fest', 2)), 2)
+
+    def test_suggest_no_match(self):
+        self.assertEqual(self.index.suggest('rock', 10), [])
+        self.assertEqual(self.index.suggest('nightly', 10), [])
+
+    def test_add(self):
+        self.index.add(5, 'Rock Night')
+        self.assertEqual(self.index.suggest('rock', 10), [(5, 'Rock Night')])
+        suggestions = self.index.suggest('night', 10)
+        self.assertEqual(sorted(event_id for event_id, _ in suggestions),
+                         [3, 5])
+        self.assertEqual(len(self.index), len(EVENTS) + 1)
+
+    def test_add_existing(self):
+        self.index.add(3, 'Jazz Night')
+        self.assertEqual(self.index.suggest('jazz', 10), [(3, 'Jazz Night')])
+        self.assertEqual(len(self.index), len(EVENTS))
+
+    def test_rebuild_replaces(self):
+        self.index.rebuild([{'_id': 6, 'name': 'Closing Party'}])
+        self.assertEqual(self.index.suggest('fest', 10), [])
+        self.assertEqual(len(self.index), 1)
+
+    def test_advance(self):
+        """The version only advances past writes of this index's own."""
+        self.index.rebuild(EVENTS, 'v1')
+        self.index.advance('v1', 'v2')
+        self.assertEqual(self.index.version, 'v2')
+        self.index.advance('v3', 'v4')     # missed the write to v3
+        self.assertEqual(self.index.version, 'v2')
+
+    def test_version(self):
+        self.index.rebuild(EVENTS, 'v2')
+        self.assertEqual(self.index.version, 'v2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Version counters of collections, used as ETags of list responses.
+
+Each counter is a document {_id: collection name, version, epoch} in the
+`collection_versions` collection of the same DB. Writers bump the counter
+*after* changing the collection, and readers read it *before* reading the
+collection, so a response is never tagged with a version newer than its
+contents. The epoch is set when the counter is created, so ETags don't repeat
+if the counter is deleted and starts over.
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import uuid
+from pymongo import ReturnDocument
+
+VERSIONS_COLLECTION = 'collection_versions'
+
+
+def get_etag(collection):
+    """Returns the current ETag of collection's contents, without quotes."""
+    counter = collection.database[VERSIONS_COLLECTION].find_one(
+        {'_id': collection.name})
+    if counter is None:     # never written since versioning was added
+        return f'{collection.name}-0'
+    return f'{collection.name}-{counter["epoch"]}-{counter["version"]}'
+
+
+def bump_version(collection):
+    """Records that collection changed. Call after every write.
+
+    Returns:
+        tuple: The ETags just before and just after this change, so callers
+            can tell whether anything else changed in between.
+    """
+    counter = collection.database[VERSIONS_COLLECTION].find_one_and_update(
+        {'_id': collection.name},
+        {'$inc': {'version': 1},
+         '$setOnInsert': {'epoch': uuid.uuid4().hex[:8]}},
+        upsert=True, return_document=ReturnDocument.AFTER)
+    version = counter['version']
+    previous = (f'{collection.name}-0' if version == 1
+                else f'{collection.name}-{counter["epoch"]}-{version - 1}')
+    return previous, f'{collection.name}-{counter["epoch"]}-{version}'
@@ -19,12 +19,27 @@ Serve web UI and act as an API gateway to other services.
 # limitations under the License.
 
 import os
-from flask import Flask, render_template, request, url_for, session, redirect
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from flask import (Flask, jsonify, render_template, request, url_for, session,
+                   redirect)
 from werkzeug.exceptions import BadRequestKeyError  # WSGI library for Flask
 
 import requests
+import metrics
+from upload_stream import MultipartStream
 
 app = Flask(__name__)  # pylint: disable=invalid-name
+metrics.init_app(app)
+
+# last ETag and body of each list request, revalidated with If-None-Match
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE = OrderedDict()  # (url, params) -> (ETag, JSON body)
+RESPONSE_CACHE_LOCK = threading.Lock()
+# event fields shown in the event dropdowns of index.html
+DROPDOWN_EVENT_FIELDS = 'name'
 
 
 @app.route('/v1/', methods=['GET'])
@@ -35,7 +50,7 @@ def index():
             'index.html',
             posts=get_posts(),
             auth=is_organizer(get_user()),
-            events=get_events(),
+            events=get_events(fields=DROPDOWN_EVENT_FIELDS),
             app_config=app.config
         )
     except RuntimeError as error:
@@ -68,7 +83,7 @@ def add_event():
         form_data = dict(**request.form.to_dict(), author_id=user['user_id'])
         # get rid of 'T' separator in event_time
         form_data['event_time'] = form_data['event_time'].replace('T', ' ')
-        r = requests.post(url, data=form_data)
+        r = call_backend('events', 'post', url, data=form_data)
         if r.status_code == 201:
             # upload successful, redirect to index
             return redirect(url_for('index'))
@@ -98,10 +113,13 @@ def add_post():
         return 'Error: not logged in.', 401
     url = app.config['POSTS_ENDPOINT'] + 'add'
     form_data = dict(**request.form.to_dict(), author_id=user['user_id'])
-    images = ((img.filename, img.read())
-              for img in request.files.getlist("images") if img.filename != '')
-    response = requests.post(
-        url, data=form_data, files=images)
+    images = [(f'file_{i}', img.filename, img.mimetype, img.stream)
+              for i, img in enumerate(request.files.getlist("images"))
+              if img.filename != '']
+    # forward the images a chunk at a time rather than reading them whole
+    body = MultipartStream(form_data, images)
+    response = call_backend('posts', 'post', url, data=body,
+                            headers={'Content-Type': body.content_type})
     if response.status_code == 201:
         # upload successful, redirect to index
         return redirect(url_for("index"))
@@ -144,8 +162,9 @@ def delete_post(post_id):
     """Authenticates and proxies a request to users service to delete a post."""
     try:
         my_user_id = get_user()['user_id']
-        response = requests.delete(app.config['POSTS_ENDPOINT'] + post_id,
-                                   data={'author_id': my_user_id})
+        response = call_backend(
+            'posts', 'delete', app.config['POSTS_ENDPOINT'] + post_id,
+            data={'author_id': my_user_id})
         return response.text, response.status_code
     except TypeError:
         return 'Error: Not signed in', 401
@@ -168,19 +187,18 @@ def show_events():
 @app.route('/v1/get_posts/<event_id>', methods=['GET'])
 def get_posts_for_event(event_id):
     """Retrieves all posts for a certain event and displays in web template."""
-    response = requests.get(app.config['POSTS_ENDPOINT'] +
-                            f'by_event/{event_id}')
-    if response.status_code == 200:
-        return render_template(
-            'index.html',
-            posts=parse_posts(response.json()),
-            auth=is_organizer(get_user()),
-            events=get_events(),
-            sub_event=event_id,
-            app_config=app.config
-        )
-    else:
+    try:
+        posts = get_posts(event_id)
+    except RuntimeError:
         return 'Unable to retrieve events', 500
+    return render_template(
+        'index.html',
+        posts=posts,
+        auth=is_organizer(get_user()),
+        events=get_events(fields=DROPDOWN_EVENT_FIELDS),
+        sub_event=event_id,
+        app_config=app.config
+    )
 
 
 @app.route('/v1/query_event', methods=['GET'])
@@ -192,7 +210,8 @@ def query_event_by_id():
     """
     try:
         event_id = request.args['event_id']
-        response = requests.put(app.config['EVENTS_ENDPOINT'] + event_id)
+        response = call_backend(
+            'events', 'put', app.config['EVENTS_ENDPOINT'] + event_id)
         if response.status_code == 200:
             return render_template(
                 'search_results.html',
@@ -215,8 +234,9 @@ def search_event():
     """
     try:
         event_name = request.form['event_name']
-        response = requests.get(app.config['EVENTS_ENDPOINT'] + 'search',
-                                params={'name': event_name})
+        response = call_backend(
+            'events', 'get', app.config['EVENTS_ENDPOINT'] + 'search',
+            params={'name': event_name})
         if response.status_code == 200:
             return render_template(
                 'search_results.html',
@@ -230,6 +250,29 @@ def search_event():
         return f'Error: {error}.', 400
 
 
+@app.route('/v1/suggest_events', methods=['GET'])
+def suggest_events():
+    """Proxy for event name autocomplete in the events service.
+
+    Request args:
+        prefix: start of the event names to suggest.
+
+    Response:
+        200: JSON list of suggested event names.
+        Error message and status code of the events service otherwise.
+    """
+    try:
+        response = call_backend(
+            'events', 'get', app.config['EVENTS_ENDPOINT'] + 'suggest',
+            params={'prefix': request.args['prefix']})
+        if response.status_code == 200:
+            return jsonify([suggestion['name'] for suggestion
+                            in response.json()['suggestions']])
+        return response.content, response.status_code
+    except BadRequestKeyError as error:
+        return f'Error: {error}.', 400
+
+
 @app.route('/v1/sign_out', methods=['GET'])
 def sign_out():
     """Sign the user out.
@@ -250,27 +293,117 @@ def authenticate_with_users_service(gauth_token):
     Response:
         response: response from the users service
     """
-    return requests.post(
-        app.config['USERS_ENDPOINT'] + 'authenticate',
+    return call_backend(
+        'users', 'post', app.config['USERS_ENDPOINT'] + 'authenticate',
         data={'gauth_token': gauth_token})
 
 
-def get_events():
-    """Gets all sub-events from events service."""
+def get_events(fields=None):
+    """Gets all sub-events from events service.
+
+    The events service returns events a page at a time, so this follows the
+    `next` cursor of each page until all pages are retrieved.
+
+    Args:
+        fields (str): comma-separated event fields to get besides `_id`, or
+            None for all fields.
+    """
     url = app.config['EVENTS_ENDPOINT']
-    response = requests.get(url, params={})
-    if response.status_code == 200:
-        return parse_events(response.json())
-    raise RuntimeError('Error in retrieving events.')
+    events = []
+    params = {} if fields is None else {'fields': fields}
+    while True:
+        status_code, events_dict = get_json_if_modified('events', url, params)
+        if status_code != 200:
+            raise RuntimeError('Error in retrieving events.')
+        events.extend(parse_events(events_dict))
+        if not events_dict.get('next'):
+            return events
+        params = dict(params, after=events_dict['next'])
+
 
+def get_posts(event_id=None):
+    """Gets all posts, or all posts of an event, from posts service.
 
-def get_posts():
-    """Gets all posts from posts service."""
+    The posts service returns posts a page at a time, newest first, so this
+    follows the `next` cursor of each page until all pages are retrieved.
+
+    Args:
+        event_id (str): ID of the event to get the posts of, or None for all
+            posts.
+    """
     url = app.config['POSTS_ENDPOINT']
-    response = requests.get(url, params={})
-    if response.status_code == 200:
-        return parse_posts(response.json())
-    raise RuntimeError('Error in retrieving posts.')
+    if event_id is not None:
+        url += f'by_event/{event_id}'
+    posts = []
+    params = {}
+    while True:
+        status_code, posts_dict = get_json_if_modified('posts', url, params)
+        if status_code != 200:
+            raise RuntimeError('Error in retrieving posts.')
+        posts.extend(parse_posts(posts_dict))
+        if not posts_dict.get('next'):
+            return posts
+        params = {'before': posts_dict['next']}
+
+
+def get_json_if_modified(backend, url, params=None):
+    """GETs a JSON response, reusing the last one if it hasn't changed.
+
+    If the last response to the same request had an ETag, sends it in an
+    If-None-Match header, and reuses that response's body if the service
+    answers 304 Not Modified, which saves it from reading and serializing the
+    same documents again.
+
+    Returns:
+        tuple: status code (200 for reused responses) and JSON body, or None
+            if the request failed.
+    """
+    key = (url, tuple(sorted((params or {}).items())))
+    with RESPONSE_CACHE_LOCK:
+        cached = RESPONSE_CACHE.get(key)
+    headers = {} if cached is None else {'If-None-Match': cached[0]}
+    response = call_backend(
+        backend, 'get', url, params=params, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        with RESPONSE_CACHE_LOCK:
+            if key in RESPONSE_CACHE:
+                RESPONSE_CACHE.move_to_end(key)
+        return 200, cached[1]
+    if response.status_code != 200:
+        return response.status_code, None
+    body = response.json()
+    etag = response.headers.get('ETag')
+    if etag:
+        with RESPONSE_CACHE_LOCK:
+            RESPONSE_CACHE[key] = (etag, body)
+            RESPONSE_CACHE.move_to_end(key)
+            if len(RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+                RESPONSE_CACHE.popitem(last=False)
+    return 200, body
+
+
+def call_backend(backend, method, url, **kwargs):
+    """Sends an HTTP request to one of the services and times it.
+
+    Args:
+        backend (str): name of the service, e.g. 'events', to label metrics.
+        method (str): lowercase HTTP method, e.g. 'get'.
+        url (str): URL to send the request to.
+        **kwargs: passed on to requests.
+
+    Returns:
+        requests.Response: the service's response.
+    """
+    start = time.perf_counter()
+    status = 'error'    # if no response is received
+    try:
+        response = getattr(requests, method)(url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        metrics.BACKEND_LATENCY.labels(
+            backend, method.upper(), status).observe(
+                time.perf_counter() - start)
 
 
 def get_user():
@@ -291,7 +424,8 @@ def is_organizer(user):
     if user is None:
         return False
     url = app.config['USERS_ENDPOINT'] + 'authorization'
-    response = requests.post(url, data={'user_id': user['user_id']})
+    response = call_backend('users', 'post', url,
+                            data={'user_id': user['user_id']})
     return response.json()['is_organizer'] is True
 
 
@@ -323,6 +457,45 @@ def parse_posts(posts_dict):
     return posts_dict['posts']
 
 
+@app.template_filter('srcset')
+def format_srcset(variants, webp=False):
+    """Formats resized variants of an image as an img srcset attribute.
+
+    Args:
+        variants (list): {'url', 'width', 'type'} dicts of the variants of an
+            image made by the posts service.
+        webp (bool): whether to list the WebP variants or the others.
+
+    Returns:
+        str: e.g. "/small.jpg 320w, /large.jpg 800w".
+    """
+    return ', '.join(f"{variant['url']} {variant['width']}w"
+                     for variant in variants
+                     if (variant['type'] == 'image/webp') == webp)
+
+
+@app.template_filter('timestamp')
+def format_timestamp(value):
+    """Formats a timestamp from the events or posts services for display.
+
+    Timestamps are either strings, which are returned unchanged, or dates in
+    MongoDB extended JSON, e.g. {'$date': 1564509600000} or
+    {'$date': '2019-07-30T18:00:00Z'}, which are formatted like
+    "2019-07-30 18:00:00".
+    """
+    if not isinstance(value, dict) or '$date' not in value:
+        return value
+    date = value['$date']
+    if isinstance(date, dict):  # canonical format {'$numberLong': '...'}
+        date = int(date['$numberLong'])
+    if isinstance(date, (int, float)):  # milliseconds since the epoch
+        timestamp = datetime.datetime.utcfromtimestamp(date / 1000)
+    else:
+        timestamp = datetime.datetime.strptime(
+            date[:19], '%Y-%m-%dT%H:%M:%S')
+    return timestamp.isoformat(sep=' ', timespec='seconds')
+
+
 def config_endpoints(endpoints):
     """Sets given list of endpoints globally from environment variables.
 
@@ -345,6 +518,10 @@ app.config['GAUTH_CLIENT_ID'] = os.environ.get('GAUTH_CLIENT_ID')
 app.config['GAUTH_CALLBACK_ENDPOINT'] = (app.config['USERS_ENDPOINT']
                                          + 'authenticate')
 
+# reject uploads larger than this from their Content-Length, before reading
+app.config['MAX_CONTENT_LENGTH'] = int(
+    os.environ.get('MAX_UPLOAD_BYTES', 100 * 1024 * 1024))
+
 # set flask secret key used for session encryption
 app.secret_key = os.environ.get('FLASK_SECRET_KEY')
 
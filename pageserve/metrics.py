@@ -0,0 +1,88 @@
+"""Prometheus metrics of the pageserve service, exposed at /metrics.
+
+Gunicorn may run the app in several worker processes. To report metrics of
+all of them, set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the
+workers, as the Dockerfile does, and run gunicorn with gunicorn.conf.py, which
+cleans up after exited workers.
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time to handle HTTP requests, until the response starts streaming.',
+    ['route', 'method', 'status'])
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'HTTP requests being handled.',
+    ['route', 'method'], multiprocess_mode='livesum')
+BACKEND_LATENCY = Histogram(
+    'backend_request_duration_seconds',
+    'Time to call the users, events, and posts services.',
+    ['backend', 'method', 'status'])
+
+
+def init_app(app):
+    """Records request metrics of app and serves them at /metrics."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', get_metrics, methods=['GET'])
+
+
+def get_metrics():
+    """Returns the metrics of every worker process in text format."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def _route():
+    """Returns the URL rule matching the request, which labels its metrics.
+
+    Labels by rule rather than path, e.g. "/v1/<event_id>", to keep the
+    number of time series bounded.
+    """
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _before_request():
+    """Starts timing the request."""
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_PROGRESS.labels(_route(), request.method).inc()
+
+
+def _after_request(response):
+    """Records the time taken to handle the request."""
+    if 'metrics_start' in g:
+        elapsed = time.perf_counter() - g.metrics_start
+        REQUEST_LATENCY.labels(
+            _route(), request.method, response.status_code).observe(elapsed)
+    return response
+
+
+def _teardown_request(_):
+    """Marks the request as finished, even if it raised an exception."""
+    if 'metrics_start' in g:
+        REQUESTS_IN_PROGRESS.labels(_route(), request.method).dec()
@@ -0,0 +1,58 @@
+"""Unit tests for the pageserve service metrics."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import requests_mock
+from prometheus_client import REGISTRY
+import app
+
+
+def get_sample(name, labels):
+    """Returns the current value of a metric, or 0 if never recorded."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.TestCase):
+    """Test the /metrics endpoint and the metrics it reports."""
+
+    def setUp(self):
+        app.app.config['TESTING'] = True
+        self.client = app.app.test_client()
+
+    @requests_mock.Mocker()
+    def test_backend_latency(self, mock_requests):
+        """Test that calls to other services are timed by service."""
+        url = app.app.config['EVENTS_ENDPOINT'] + 'suggest'
+        mock_requests.get(url, json={'suggestions': []})
+        labels = {'backend': 'events', 'method': 'GET', 'status': '200'}
+        before = get_sample('backend_request_duration_seconds_count', labels)
+        self.client.get('/v1/suggest_events', query_string={'prefix': 'a'})
+        self.assertEqual(
+            get_sample('backend_request_duration_seconds_count', labels),
+            before + 1)
+        labels = {'route': '/v1/suggest_events', 'method': 'GET',
+                  'status': '200'}
+        self.assertGreater(
+            get_sample('http_request_duration_seconds_count', labels), 0)
+
+    def test_metrics_endpoint(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'backend_request_duration_seconds', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import ast
+import io
 import requests_mock
 from flask_testing import TestCase
 import flask
@@ -316,6 +317,41 @@ class TestSearchEventsRoute(TestCase):
         self.assertEqual(response.status_code, 400)
 
 
+class TestSuggestEventsRoute(unittest.TestCase):
+    """Tests event name autocomplete at GET /v1/suggest_events."""
+
+    def setUp(self):
+        """Set up test client."""
+        app.app.config["TESTING"] = True
+        self.client = app.app.test_client()
+        self.expected_url = app.app.config['EVENTS_ENDPOINT'] + 'suggest'
+
+    @requests_mock.Mocker()
+    def test_suggest_events(self, mock_requests):
+        """Test suggested event names are returned."""
+        mock_requests.get(self.expected_url,
+                          json={'suggestions': [{'_id': '1', 'name': 'Jazz'},
+                                                {'_id': '2', 'name': 'Jam'}],
+                                'num_suggestions': 2},
+                          status_code=200)
+        response = self.client.get('/v1/suggest_events?prefix=ja')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), ['Jazz', 'Jam'])
+        self.assertEqual(mock_requests.last_request.qs, {'prefix': ['ja']})
+
+    @requests_mock.Mocker()
+    def test_suggest_events_error(self, mock_requests):
+        """Test events service error when suggesting events."""
+        mock_requests.get(self.expected_url, text='Error', status_code=500)
+        response = self.client.get('/v1/suggest_events?prefix=ja')
+        self.assertEqual(response.status_code, 500)
+
+    def test_malformatted_suggest(self):
+        """Test suggesting without required prefix field."""
+        response = self.client.get('/v1/suggest_events')
+        self.assertEqual(response.status_code, 400)
+
+
 class TestQueryEventsByIDRoute(TestCase):
     """Tests querying for events at GET /v1/query_event."""
     def create_app(self):
@@ -475,6 +511,40 @@ class TestAddPostRoute(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.data.decode(), 'Example error message')
 
+    @patch('app.get_user', MagicMock(return_value=AUTHORIZED_USER_OBJECT))
+    @requests_mock.Mocker()
+    def test_images_are_streamed(self, mock_requests):
+        """Images are forwarded in a body with a known length."""
+        forwarded = {}
+
+        def read_body(request, _):
+            forwarded['headers'] = request.headers
+            forwarded['body'] = b''.join(request.body)
+            return 'Example success message'
+        mock_requests.post(self.expected_url, text=read_body, status_code=201)
+
+        form = dict(VALID_POST_FORM, images=[
+            (io.BytesIO(b'first image'), 'first.jpg'),
+            (io.BytesIO(b''), '')])
+        response = self.client.post('/v1/add_post', data=form)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(int(forwarded['headers']['Content-Length']),
+                         len(forwarded['body']))
+        self.assertTrue(forwarded['headers']['Content-Type'].startswith(
+            'multipart/form-data; boundary='))
+        self.assertIn(b'filename="first.jpg"', forwarded['body'])
+        self.assertIn(b'first image', forwarded['body'])
+        self.assertEqual(forwarded['body'].count(b'filename='), 1)
+
+    @patch('app.get_user', MagicMock(return_value=AUTHORIZED_USER_OBJECT))
+    def test_upload_too_large(self):
+        """Uploads over MAX_CONTENT_LENGTH are rejected."""
+        with patch.dict(app.app.config, MAX_CONTENT_LENGTH=10):
+            response = self.client.post('/v1/add_post', data=dict(
+                VALID_POST_FORM, images=(io.BytesIO(b'x' * 100), 'a.jpg')))
+        self.assertEqual(response.status_code, 413)
+
     def test_not_logged_in(self):
         """Not logged in, don't add."""
         response = self.client.post('/v1/add_post', data=VALID_POST_FORM)
@@ -110,6 +110,55 @@ class TestServe(unittest.TestCase):
             app.config_endpoints(['url3'])
 
 
+class TestFormatTimestamp(unittest.TestCase):
+    """Test app.format_timestamp template filter."""
+
+    def test_extended_json_dates(self):
+        """Dates in any MongoDB extended JSON format are formatted."""
+        for value in ({'$date': 1564509600000},
+                      {'$date': {'$numberLong': '1564509600000'}},
+                      {'$date': '2019-07-30T18:00:00Z'},
+                      {'$date': '2019-07-30T18:00:00.000+00:00'}):
+            self.assertEqual(app.format_timestamp(value),
+                             '2019-07-30 18:00:00')
+
+    def test_strings_unchanged(self):
+        """Timestamps stored as strings are displayed as is."""
+        self.assertEqual(app.format_timestamp('2019-07-30 18:00:00'),
+                         '2019-07-30 18:00:00')
+        self.assertEqual(app.format_timestamp('soon'), 'soon')
+
+
+class TestFormatSrcset(unittest.TestCase):
+    """Test app.format_srcset template filter and its use in index.html."""
+
+    VARIANTS = [
+        {'url': '/a-320w.jpg', 'width': 320, 'type': 'image/jpeg'},
+        {'url': '/a-320w.webp', 'width': 320, 'type': 'image/webp'},
+        {'url': '/a-800w.jpg', 'width': 800, 'type': 'image/jpeg'},
+        {'url': '/a-800w.webp', 'width': 800, 'type': 'image/webp'}]
+
+    def test_format_srcset(self):
+        """WebP and other variants are listed separately."""
+        self.assertEqual(app.format_srcset(self.VARIANTS),
+                         '/a-320w.jpg 320w, /a-800w.jpg 800w')
+        self.assertEqual(app.format_srcset(self.VARIANTS, webp=True),
+                         '/a-320w.webp 320w, /a-800w.webp 800w')
+
+    def test_feed_uses_variants(self):
+        """Images with variants are shown with a srcset, others without."""
+        post = {'_id': {'$oid': 'abc'}, 'author_id': 'a', 'event_id': 'e',
+                'text': '', 'created_at': 'now',
+                'files': ['/a.jpg', '/b.gif'], 'variants': [self.VARIANTS, []]}
+        with app.app.test_request_context():
+            html = flask.render_template(
+                'index.html', posts=[post], auth=False, events=[],
+                app_config=app.app.config)
+        self.assertIn('srcset="/a-320w.webp 320w, /a-800w.webp 800w"', html)
+        self.assertIn('srcset="/a-320w.jpg 320w, /a-800w.jpg 800w"', html)
+        self.assertIn('<img src="/b.gif" loading="lazy">', html)
+
+
 class TestGetPosts(unittest.TestCase):
     """Test app.get_posts function with mock call to posts service."""
 
@@ -125,6 +174,18 @@ class TestGetPosts(unittest.TestCase):
         posts = app.get_posts()
         self.assertTrue(posts, self.posts_dict)
 
+    @requests_mock.Mocker()
+    def test_get_posts_follows_pages(self, mock_requests):
+        """Test that every page of posts is retrieved."""
+        mock_requests.get(self.url + 'by_event/picnic', [
+            {'json': {'posts': ['newest', 'posts'], 'next': 'cursor'}},
+            {'json': {'posts': ['oldest', 'posts'], 'next': None}}])
+        posts = app.get_posts('picnic')
+        self.assertEqual(posts, ['newest', 'posts', 'oldest', 'posts'])
+        self.assertEqual(mock_requests.call_count, 2)
+        self.assertEqual(mock_requests.last_request.qs,
+                         {'before': ['cursor']})
+
     @requests_mock.Mocker()
     def test_get_posts_fail(self, mock_requests):
         """Test that error is raised when posts cannot be retrieved."""
@@ -139,6 +200,7 @@ class TestGetEvents(unittest.TestCase):
     def setUp(self):
         self.url = app.app.config['EVENTS_ENDPOINT']
         self.events_dict = {'events': ['these', 'are', 'fake', 'events']}
+        app.RESPONSE_CACHE.clear()
 
     @requests_mock.Mocker()
     def test_get_events_success(self, mock_requests):
@@ -148,6 +210,41 @@ class TestGetEvents(unittest.TestCase):
         posts = app.get_events()
         self.assertTrue(posts, self.events_dict)
 
+    @requests_mock.Mocker()
+    def test_get_events_follows_pages(self, mock_requests):
+        """Test that every page of events is retrieved."""
+        mock_requests.get(self.url, [
+            {'json': {'events': ['first', 'page'], 'next': 'cursor'}},
+            {'json': {'events': ['last', 'page'], 'next': None}}])
+        events = app.get_events()
+        self.assertEqual(events, ['first', 'page', 'last', 'page'])
+        self.assertEqual(mock_requests.call_count, 2)
+        self.assertEqual(mock_requests.last_request.qs, {'after': ['cursor']})
+
+    @requests_mock.Mocker()
+    def test_get_events_fields(self, mock_requests):
+        """Test that requested fields are passed to every page request."""
+        mock_requests.get(self.url, [
+            {'json': {'events': ['first'], 'next': 'cursor'}},
+            {'json': {'events': ['last'], 'next': None}}])
+        app.get_events(fields='name')
+        self.assertEqual(mock_requests.request_history[0].qs,
+                         {'fields': ['name']})
+        self.assertEqual(mock_requests.last_request.qs,
+                         {'fields': ['name'], 'after': ['cursor']})
+
+    @requests_mock.Mocker()
+    def test_get_events_revalidates(self, mock_requests):
+        """Test that unchanged events are reused after a 304 response."""
+        mock_requests.get(self.url, [
+            {'json': self.events_dict, 'headers': {'ETag': '"v1"'}},
+            {'status_code': 304, 'headers': {'ETag': '"v1"'}}])
+        self.assertEqual(app.get_events(), self.events_dict['events'])
+        self.assertNotIn('If-None-Match', mock_requests.last_request.headers)
+        self.assertEqual(app.get_events(), self.events_dict['events'])
+        self.assertEqual(
+            mock_requests.last_request.headers['If-None-Match'], '"v1"')
+
     @requests_mock.Mocker()
     def test_get_events_fail(self, mock_requests):
         """Test error is raised when events cannot be retrieved."""
@@ -0,0 +1,72 @@
+"""Unit tests for streamed multipart/form-data request bodies."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import unittest
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+import upload_stream
+from upload_stream import MultipartStream
+
+
+def parse(stream):
+    """Parses a MultipartStream as a server would."""
+    body = b''.join(stream)
+    environ = EnvironBuilder(method='POST', data=body,
+                             content_type=stream.content_type).get_environ()
+    return body, Request(environ)
+
+
+class TestMultipartStream(unittest.TestCase):
+    """Test upload_stream.MultipartStream."""
+
+    def test_round_trip(self):
+        """Fields and files are parsed back from the body."""
+        files = [('file_0', 'a "b".jpg', 'image/jpeg', io.BytesIO(b'jpeg')),
+                 ('file_1', 'c.txt', '', io.BytesIO(b'text'))]
+        stream = MultipartStream({'event_id': 'e1', 'text': 'hi'}, files)
+        body, request = parse(stream)
+        self.assertEqual(len(stream), len(body))
+        self.assertEqual(request.form.to_dict(),
+                         {'event_id': 'e1', 'text': 'hi'})
+        self.assertEqual(request.files['file_0'].read(), b'jpeg')
+        self.assertEqual(request.files['file_0'].mimetype, 'image/jpeg')
+        self.assertEqual(request.files['file_1'].read(), b'text')
+        self.assertEqual(request.files['file_1'].mimetype,
+                         'application/octet-stream')
+
+    def test_files_are_read_in_chunks(self):
+        """Large files are sent a chunk at a time."""
+        contents = b'x' * (upload_stream.CHUNK_SIZE * 2 + 1)
+        stream = MultipartStream(
+            {}, [('file_0', 'big', None, io.BytesIO(contents))])
+        chunks = list(stream)
+        self.assertLessEqual(max(len(chunk) for chunk in chunks),
+                             upload_stream.CHUNK_SIZE)
+        _, request = parse(stream)
+        self.assertEqual(request.files['file_0'].read(), contents)
+
+    def test_can_be_sent_again(self):
+        """Iterating again, e.g. on a retry, sends the same body."""
+        file = io.BytesIO(b'contents')
+        file.read()     # already read, e.g. by a validator
+        stream = MultipartStream({}, [('file_0', 'a', None, file)])
+        self.assertEqual(b''.join(stream), b''.join(stream))
+        self.assertIn(b'contents', b''.join(stream))
+
+
+if __name__ == '__main__':
+    unittest.main()
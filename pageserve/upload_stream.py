@@ -0,0 +1,86 @@
+"""multipart/form-data request bodies streamed from files as they are sent."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import uuid
+
+CHUNK_SIZE = 256 * 1024  # bytes of a file read per chunk sent
+
+
+def quote(value):
+    """Escapes a form field or file name for a Content-Disposition header."""
+    return (value.replace('\r', '%0D').replace('\n', '%0A')
+            .replace('"', '%22'))
+
+
+class MultipartStream():
+    """Body of a multipart/form-data request, read from its files lazily.
+
+    requests buffers the whole body of a request made with `files=`, so the
+    body of an upload would be in memory twice. Passing this as `data=`
+    instead sends the files a chunk at a time. Its length is known up front,
+    so the request has a Content-Length header and the receiving service can
+    reject uploads that are too large before reading them.
+    """
+
+    def __init__(self, fields, files):
+        """Args:
+            fields (dict): form field names and their string values.
+            files (list): (field name, file name, content type, file) tuples,
+                where file is a seekable binary file object.
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self._parts = []    # bytes, or a (file, size) pair
+        for name, value in fields.items():
+            self._parts.append(self._part_header(name) + value.encode())
+            self._parts.append(b'\r\n')
+        for name, filename, content_type, file in files:
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            file.seek(0)
+            self._parts.append(self._part_header(
+                name, filename, content_type or 'application/octet-stream'))
+            self._parts.append((file, size))
+            self._parts.append(b'\r\n')
+        self._parts.append(f'--{self.boundary}--\r\n'.encode())
+
+    def __len__(self):
+        """Returns the length of the body in bytes."""
+        return sum(len(part) if isinstance(part, bytes) else part[1]
+                   for part in self._parts)
+
+    def __iter__(self):
+        """Yields the body in chunks, reading files as it goes."""
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            file, _ = part
+            file.seek(0)
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                yield chunk
+
+    def _part_header(self, name, filename=None, content_type=None):
+        """Returns the boundary and headers starting a part of the body."""
+        disposition = f'form-data; name="{quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{quote(filename)}"'
+        header = (f'--{self.boundary}\r\n'
+                  f'Content-Disposition: {disposition}\r\n')
+        if content_type is not None:
+            header += f'Content-Type: {content_type}\r\n'
+        return (header + '\r\n').encode()
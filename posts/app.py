@@ -22,31 +22,146 @@ import os
 import uuid
 import json
 import datetime
+import collections
+import io
+import logging
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pymongo
 from bson import json_util, ObjectId
-from flask import Flask, request
+from bson.errors import InvalidId
+from flask import Flask, Request, Response, request, send_file, url_for
+from werkzeug.datastructures import FileStorage
 from werkzeug.exceptions import BadRequestKeyError
 from google.cloud import storage
+from cache import FeedCache
+import image_variants
+from indexes import ensure_indexes
+from jobs import JobQueue, JobQueueFullError
+import media_index
+import metrics
+from storage_backends import (COPY_CHUNK_SIZE, GCSBackend, LocalBackend,
+                              StoredFile)
+from versions import bump_version, get_etag
 
-app = Flask(__name__)  # pylint: disable=invalid-name
 
 REQUIRED_ATTRIBUTES = {'event_id', 'author_id', 'text', 'files'}
+POST_FIELDS = REQUIRED_ATTRIBUTES | {'created_at', 'file_hashes', 'variants'}
+STREAM_CHUNK_SIZE = 64 * 1024  # characters of JSON buffered per yield
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+# newest posts of the most recently read events, see get_feed_page
+FEED_CACHE = FeedCache(
+    max_events=int(os.environ.get('FEED_CACHE_EVENTS', 256)),
+    max_posts=int(os.environ.get('FEED_CACHE_POSTS', DEFAULT_PAGE_LIMIT)))
+# threads uploading files, shared by all requests to bound the process's
+# concurrent uploads
+UPLOAD_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('UPLOAD_POOL_SIZE', 16)),
+    thread_name_prefix='upload')
+# posts added with ?async=true, processed in the background, see queue_post
+INGEST_QUEUE = JobQueue(
+    workers=int(os.environ.get('INGEST_WORKERS', 4)),
+    max_jobs=int(os.environ.get('INGEST_QUEUE_SIZE', 64)), name='ingest')
+POST_JOBS_COLLECTION = 'post_jobs'
+# posts deleted by event or author, see queue_bulk_deletion
+DELETION_QUEUE = JobQueue(
+    workers=int(os.environ.get('DELETION_WORKERS', 2)),
+    max_jobs=int(os.environ.get('DELETION_QUEUE_SIZE', 16)), name='deletion')
+DELETION_JOBS_COLLECTION = 'deletion_jobs'
+DELETION_BATCH_SIZE = 500   # posts deleted per delete_many
+# threads deleting the files of deleted posts from storage
+DELETE_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('DELETE_POOL_SIZE', 8)),
+    thread_name_prefix='delete')
+INGEST_RETRY_AFTER = 5  # seconds clients wait to retry when the queue is full
+# threads making resized variants of posted images in the background
+VARIANT_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('VARIANT_POOL_SIZE', 2)),
+    thread_name_prefix='variants')
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60  # seconds media files can be cached for
+# bytes of an uploaded file kept in memory before spooling it to disk
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', 1024 * 1024))
+
+
+class SpooledRequest(Request):
+    """Request keeping uploaded files in memory only while they are small.
+
+    Werkzeug's default keeps files whose request is under 500KB in memory.
+    This instead spools each file to a temporary file on disk once it
+    reaches UPLOAD_SPOOL_BYTES, so the memory used by a request is bounded
+    regardless of the size of its files.
+    """
+
+    # pylint: disable=arguments-differ,unused-argument
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(
+            max_size=UPLOAD_SPOOL_BYTES, mode='rb+')
+
+
+app = Flask(__name__)  # pylint: disable=invalid-name
+app.request_class = SpooledRequest
+metrics.init_app(app)
+LOGGER = logging.getLogger(__name__)
+# reject uploads larger than this from their Content-Length, before reading
+app.config['MAX_CONTENT_LENGTH'] = int(
+    os.environ.get('MAX_UPLOAD_BYTES', 100 * 1024 * 1024))
 
 
 @app.route('/v1/', methods=['GET'])
 def get_all_posts():
-    """Get all posts for the whole event."""
-    # serialize otherwise nonserializable ObjectIDs
-    post_list = find_posts_in_db(app.config['COLLECTION'])
-    return serialize_posts_to_json(post_list)
+    """Get one page of the posts for the whole event, newest first.
+
+    Supports conditional requests, see `stream_posts_if_modified`, the
+    `limit` and `before` query parameters, see `parse_page`, and the `fields`
+    query parameter, see `parse_fields`.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as error:
+        return f'Invalid fields: {error}', 400
+    try:
+        limit, before = parse_page(request.args)
+    except (ValueError, InvalidId) as error:
+        return f'Invalid page parameters: {error}', 400
+    return stream_posts_if_modified(
+        app.config['COLLECTION'], fields=fields, limit=limit, before=before)
+
+
+@app.route('/v1/since/<post_id>', methods=['GET'])
+def get_posts_since(post_id):
+    """Get the posts added since the post with the specified ID.
+
+    For clients polling for new posts. Posts are oldest first, at most
+    `limit` of them, and the response has a `latest` field with the ID to
+    poll with next. Supports the same conditional requests and `fields`
+    query parameter as `get_all_posts`; polling with the ETag of the last
+    response gets a 304 without reading any posts while none were added.
+    """
+    return stream_posts_since(post_id)
+
+
+@app.route('/v1/cache_stats', methods=['GET'])
+def get_cache_stats():
+    """Return the size and hit rate of this process's feed cache."""
+    return FEED_CACHE.stats()
 
 
 @app.route('/v1/<post_id>', methods=['GET'])
 def get_post_by_id(post_id):
     """Get the post with the specified ID.
+
+    Supports the `fields` query parameter, see `parse_fields`.
     """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as error:
+        return f'Invalid fields: {error}', 400
     post_list = find_posts_in_db(
-        app.config['COLLECTION'], post_id=ObjectId(post_id))
+        app.config['COLLECTION'], post_id=ObjectId(post_id), fields=fields)
     return serialize_posts_to_json(post_list)
 
 
@@ -76,6 +191,10 @@ def upload_new_post():
     text: text to be sent
     All the files the user wants to upload
     to the server.
+
+    With the query parameter `async=true`, responds 202 as soon as the
+    request is received and adds the post in the background, see
+    `queue_post`. Otherwise responds 201 with the post's ID once it is added.
     """
     try:
         post = {
@@ -84,6 +203,8 @@ def upload_new_post():
             'text':  request.form['text'],
             'files': [file for file in request.files.values()]
         }
+        if request.args.get('async') == 'true':
+            return queue_post(post, app.config['COLLECTION'])
         return str(upload_new_post_to_db(post, app.config['COLLECTION'])), 201
     except BadRequestKeyError:
         return f'Invalid request. Required data: {REQUIRED_ATTRIBUTES}.', 400
@@ -91,24 +212,173 @@ def upload_new_post():
         return 'Post must contain text and/or files.', 400
 
 
+@app.route('/v1/status/<job_id>', methods=['GET'])
+def get_post_status(job_id):
+    """Get the status of a post added with `async=true`.
+
+    Returns:
+        JSON object with the `job_id`, and the `status` of the post: pending,
+            published with its `post_id`, or failed with an `error` message.
+            404 if there is no such job.
+    """
+    try:
+        job = get_post_jobs(app.config['COLLECTION']).find_one(
+            {'_id': ObjectId(job_id)})
+    except InvalidId:
+        job = None
+    if job is None:
+        return 'Job not found.', 404
+    status = {'job_id': job_id, 'status': job['status']}
+    if 'post_id' in job:
+        status['post_id'] = str(job['post_id'])
+    if 'error' in job:
+        status['error'] = job['error']
+    return status
+
+
+@app.route('/v1/by_event/<event_id>', methods=['DELETE'])
+def delete_posts_of_event(event_id):
+    """Delete all posts of the event with the specified ID.
+
+    For tearing down events. Like `delete_post_by_id`, assumes the caller is
+    allowed to. Responds 202 and deletes the posts in the background, see
+    `queue_bulk_deletion`.
+    """
+    return queue_bulk_deletion(
+        {'event_id': event_id}, app.config['COLLECTION'])
+
+
+@app.route('/v1/by_author/<author_id>', methods=['DELETE'])
+def delete_posts_of_author(author_id):
+    """Delete all posts of the user with the specified ID.
+
+    For moderation. Works like `delete_posts_of_event`.
+    """
+    return queue_bulk_deletion(
+        {'author_id': author_id}, app.config['COLLECTION'])
+
+
+@app.route('/v1/deletions/<job_id>', methods=['GET'])
+def get_deletion_status(job_id):
+    """Get the progress of a deletion of posts by event or author.
+
+    Returns:
+        JSON object with the `job_id`, its `status`: pending, running, done
+            or failed with an `error` message, the `total` number of posts to
+            delete once running, the number of posts `deleted` so far, and the
+            number of `files_deleted` from storage. 404 if there is no such
+            job.
+    """
+    try:
+        job = get_deletion_jobs(app.config['COLLECTION']).find_one(
+            {'_id': ObjectId(job_id)})
+    except InvalidId:
+        job = None
+    if job is None:
+        return 'Job not found.', 404
+    status = {'job_id': job_id}
+    for key in ('status', 'total', 'deleted', 'files_deleted', 'error'):
+        if key in job:
+            status[key] = job[key]
+    return status
+
+
+@app.route('/v1/media/<name>', methods=['GET'])
+def get_media_file(name):
+    """Serves a media file stored by the local storage backend.
+
+    Files are sent from disk without being read into the app, with sendfile
+    when the WSGI server supports it. Other backends serve their own files,
+    so this always returns 404 for them.
+    """
+    try:
+        path = STORAGE.path(name)
+    except FileNotFoundError:
+        return 'File not found.', 404
+    # stored file names are unique, so a file never changes
+    return send_file(path, conditional=True, max_age=MEDIA_MAX_AGE)
+
+
 @app.route('/v1/by_event/<event_id>', methods=['GET'])
 def get_all_posts_for_event(event_id):
-    """Get all posts matching the event with the specified ID."""
-    # serialize otherwise nonserializable ObjectIDs
-    post_list = find_posts_in_db(app.config['COLLECTION'], event_id=event_id)
-    return serialize_posts_to_json(post_list)
+    """Get one page of the posts of the event with the specified ID.
+
+    Posts are newest first. Supports the same query parameters and
+    conditional requests as `get_all_posts`.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as error:
+        return f'Invalid fields: {error}', 400
+    try:
+        limit, before = parse_page(request.args)
+    except (ValueError, InvalidId) as error:
+        return f'Invalid page parameters: {error}', 400
+    return stream_posts_if_modified(
+        app.config['COLLECTION'], event_id=event_id, fields=fields,
+        limit=limit, before=before)
+
+
+@app.route('/v1/by_event/<event_id>/since/<post_id>', methods=['GET'])
+def get_posts_for_event_since(event_id, post_id):
+    """Get the posts of an event added since the post with the specified ID.
+
+    Works like `get_posts_since` for the posts of one event.
+    """
+    return stream_posts_since(post_id, event_id)
+
+
+def stream_posts_since(post_id, event_id=None):
+    """Parses the query parameters of a request for new posts and streams them.
+
+    Args:
+        post_id (str): ID of the newest post the client has.
+        event_id (str): ID of an event to find new posts of, or None for all
+            posts.
+
+    Returns:
+        flask.Response: Response as in `stream_posts_if_modified`, or 400 for
+            invalid parameters.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as error:
+        return f'Invalid fields: {error}', 400
+    try:
+        limit, _ = parse_page(request.args)
+        after = ObjectId(post_id)
+    except (ValueError, InvalidId) as error:
+        return f'Invalid page parameters: {error}', 400
+    return stream_posts_if_modified(
+        app.config['COLLECTION'], event_id=event_id, fields=fields,
+        limit=limit, after=after)
 
 
 def delete_post(post_id, author_id, collection):
-    """Deletes the post matching post_id and author_id if it exists."""
-    result = collection.delete_one(
-        {'_id': ObjectId(post_id), 'author_id': author_id})
-    return (('Document deleted.', 204) if result.deleted_count
-            else ('Document not found.', 404))
+    """Deletes the post matching post_id and author_id if it exists.
+
+    Files of the post are deleted too, unless other posts have them, as are
+    the files of posts added before files were deduplicated.
+    """
+    post = collection.find_one_and_delete(
+        # unless being deleted by delete_posts_in_bulk, which releases files
+        {'_id': ObjectId(post_id), 'author_id': author_id,
+         'deleted_by': {'$exists': False}},
+        projection={'event_id': 1, 'file_hashes': 1, 'files': 1})
+    if post is None:
+        return 'Document not found.', 404
+    FEED_CACHE.remove(post['event_id'], post['_id'],
+                      *bump_post_versions(collection, post['event_id']))
+    for digest in post.get('file_hashes', []):
+        media_index.release_file(collection, STORAGE, digest)
+    for url in legacy_file_urls(post):
+        delete_legacy_file(url)
+    return 'Document deleted.', 204
 
 
-def find_posts_in_db(collection, post_id=None, event_id=None):
-    """Finds all matching posts in the database.
+def find_posts_in_db(collection, post_id=None, event_id=None, fields=None,
+                     limit=None, before=None, after=None):
+    """Finds all matching posts in the database, newest first.
 
     Query is configured using one or none of args `post_id` and `event_id`.
     If one is not None, searches for matching posts.
@@ -119,20 +389,93 @@ def find_posts_in_db(collection, post_id=None, event_id=None):
         collection (pymongo.collection): The collection to search in.
         post_id (string): ID of a post to search for.
         event_id (string): ID of an event to find all posts for.
+        fields (list): Fields of the posts to read besides `_id`, or None for
+            all fields.
+        limit (int): Max number of posts to find, or None for all.
+        before (ObjectId): Only find posts older than the post with this ID,
+            i.e. the last post of the previous page.
+        after (ObjectId): Only find posts newer than the post with this ID,
+            oldest first rather than newest first.
 
     Returns:
         list: List of all matching post objects.
     """
+    return list(query_posts_in_db(
+        collection, post_id, event_id, fields, limit, before, after))
+
+
+def query_posts_in_db(collection, post_id=None, event_id=None, fields=None,
+                      limit=None, before=None, after=None):
+    """Queries the database for matching posts without reading them.
+
+    Takes the same arguments as `find_posts_in_db`. Pages of an event's posts
+    are read from the (event_id, _id) index, see indexes.py, so they take the
+    same time however many posts the event has.
+
+    Returns:
+        pymongo.cursor.Cursor: Cursor over all matching post objects.
+    """
     query = {}
     if post_id is not None:
         query = {'_id': post_id}
     elif event_id is not None:
         query = {'event_id': event_id}
-    cursor = collection.find(query)
-    list_of_posts = []
-    for post in cursor:
-        list_of_posts.append(post)
-    return list_of_posts
+    order = pymongo.DESCENDING
+    if post_id is None and (before is not None or after is not None):
+        query['_id'] = {}
+        if before is not None:
+            query['_id']['$lt'] = before
+        if after is not None:
+            query['_id']['$gt'] = after
+            order = pymongo.ASCENDING
+    projection = None if fields is None else dict.fromkeys(fields, True)
+    # ObjectIds start with their creation time, so this is newest first
+    cursor = collection.find(query, projection).sort('_id', order)
+    return cursor if limit is None else cursor.limit(limit)
+
+
+def parse_page(args):
+    """Parse the `limit` and `before` query parameters of a page of posts.
+
+    Args:
+        args (dict): Query parameters, where `limit` is the max number of
+            posts to return (default 100, max 1000), and `before` is the
+            `next` field of the previous page, i.e. the `_id` of its last post.
+
+    Returns:
+        tuple: The limit, and the ObjectId of `before` or None if not given.
+
+    Raises:
+        ValueError: The limit is not a positive integer.
+        bson.errors.InvalidId: `before` is not a valid ObjectId.
+    """
+    limit = int(args.get('limit', DEFAULT_PAGE_LIMIT))
+    if limit < 1:
+        raise ValueError('limit must be positive.')
+    before = args.get('before')
+    return (min(limit, MAX_PAGE_LIMIT),
+            None if before is None else ObjectId(before))
+
+
+def parse_fields(value):
+    """Parse the `fields` query parameter into a list of post fields.
+
+    Args:
+        value (string): Comma-separated post fields, e.g. "text,files", or
+            None for all fields.
+
+    Returns:
+        list: Sorted list of the fields, or None for all fields.
+
+    Raises:
+        ValueError: No fields or unknown fields were given.
+    """
+    if value is None:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    if not fields or not fields <= POST_FIELDS:
+        raise ValueError(f'fields must be some of {sorted(POST_FIELDS)}.')
+    return sorted(fields)
 
 
 def generate_timestamp():
@@ -162,16 +505,236 @@ def serialize_posts_to_json(post_list):
          'num_posts': len(post_list)}))
 
 
-def upload_file_to_cloud(file):
-    """Uploads a file to the GCloud Storage bucket.
+def generate_json_list(documents, list_key, trailer):
+    """Yields the JSON object {list_key: [documents...], ...} in chunks.
+
+    Documents are encoded one at a time as they are read from the cursor,
+    handling MongoDB objects (e.g. ObjectID, datetime) the same way as
+    bson.json_util, so at most one document and one chunk of encoded text are
+    in memory at once.
+
+    Args:
+        documents (iterable): documents to encode, e.g. a pymongo cursor.
+        list_key (str): key to hold the list of documents.
+        trailer (function): called with the number of documents and the last
+            document once all documents are encoded. Returns a dict of the
+            remaining fields of the JSON object.
+
+    Yields:
+        str: consecutive pieces of the JSON object.
+    """
+    chunk = ['{%s: [' % json.dumps(list_key)]
+    chunk_size = 0
+    count = 0
+    document = None
+    for document in documents:
+        encoded = json.dumps(document, default=json_util.default)
+        if count:
+            chunk.append(', ')
+        chunk.append(encoded)
+        chunk_size += len(encoded)
+        count += 1
+        if chunk_size >= STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            chunk_size = 0
+    chunk.append(']')
+    for key, value in trailer(count, document).items():
+        chunk.append(', %s: %s' % (
+            json.dumps(key), json.dumps(value, default=json_util.default)))
+    chunk.append('}')
+    yield ''.join(chunk)
+
+
+def stream_posts_as_json(cursor, limit=None, after=None):
+    """Stream the posts in the cursor as an HTTP response.
+
+    Streaming equivalent of `serialize_posts_to_json` for large queries:
+    posts are serialized one at a time straight from the cursor instead of
+    materializing the whole list.
+
+    Args:
+        cursor (iterable): Posts to serialize.
+        limit (int): Number of posts in a full page, if the cursor is a page.
+        after (ObjectId): ID the posts are newer than, if the cursor is of new
+            posts, oldest first.
+
+    Returns:
+        flask.Response: Streamed JSON response with the list of posts in a
+            'posts' key, the number of posts in a 'num_posts' key, and in a
+            'next' key the `before` parameter of the next page, or None if
+            this is the last page. For new posts, instead of 'next', the
+            'latest' key has the ID of the newest post the client has now.
+    """
+    def trailer(count, last_post):
+        if after is not None:
+            latest = after if last_post is None else last_post['_id']
+            return {'num_posts': count, 'latest': str(latest)}
+        next_cursor = (str(last_post['_id']) if limit and count == limit
+                       else None)
+        return {'num_posts': count, 'next': next_cursor}
+    return Response(generate_json_list(cursor, 'posts', trailer),
+                    mimetype='application/json')
+
+
+def stream_posts_if_modified(collection, event_id=None, fields=None,
+                             limit=None, before=None, after=None):
+    """Stream the matching posts unless the client already has them.
+
+    The response has an ETag derived from the collection's version, which
+    changes whenever a post is added or deleted. If the request's
+    If-None-Match header matches it, responds 304 Not Modified without
+    querying the posts. Pollers send the ETag of one page of new posts with
+    the request for the next, so the ETag of such a page includes `after`
+    and `limit`: if the previous page was cut off at `limit`, the next one
+    has posts the client hasn't seen even though the version is unchanged.
+
+    Args:
+        collection (pymongo.collection): The collection to search in.
+        event_id (string): ID of an event to find all posts for, or None for
+            all posts.
+        fields (list): Fields of the posts to return besides `_id`, or None
+            for all fields.
+        limit (int): Max number of posts to return, or None for all.
+        before (ObjectId): Only return posts older than this post.
+        after (ObjectId): Only return posts newer than this post.
+
+    Returns:
+        flask.Response: Streamed JSON response as in `stream_posts_as_json`,
+            or an empty 304 response.
+    """
+    etag = get_etag(collection)     # read before the posts, see versions.py
+    if after is not None:
+        etag = f'{etag}-{after}-{limit}'
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    elif (event_id is not None and fields is None and before is None
+          and after is None and limit <= FEED_CACHE.max_posts):
+        response = get_feed_page(collection, event_id, limit)
+    else:
+        response = stream_posts_as_json(
+            query_posts_in_db(collection, event_id=event_id, fields=fields,
+                              limit=limit, before=before, after=after),
+            limit, after)
+    response.set_etag(etag)
+    return response
+
+
+def get_feed_page(collection, event_id, limit):
+    """Responds with the newest posts of an event, from FEED_CACHE if cached.
+
+    The cache holds the newest FEED_CACHE.max_posts posts of recently read
+    events, already encoded. A cached feed is used while the version of the
+    event's posts is unchanged, which costs one lookup of a version counter
+    rather than a query of the posts. Otherwise the feed is read from the DB
+    and cached.
+
+    Returns:
+        flask.Response: JSON response as in `stream_posts_as_json`.
+    """
+    version = get_etag(collection, event_id)    # read before the posts
+    posts = FEED_CACHE.get(event_id, version, limit)
+    if posts is None:
+        posts = [(post['_id'], encode_post(post)) for post in
+                 query_posts_in_db(collection, event_id=event_id,
+                                   limit=FEED_CACHE.max_posts)]
+        FEED_CACHE.put(event_id, version, posts,
+                       len(posts) < FEED_CACHE.max_posts)
+        posts = posts[:limit]
+    next_cursor = str(posts[-1][0]) if len(posts) == limit else None
+    return Response(
+        '{"posts": [%s], "num_posts": %d, "next": %s}' % (
+            ', '.join(encoded for _, encoded in posts), len(posts),
+            json.dumps(next_cursor)),
+        mimetype='application/json')
+
+
+def encode_post(post):
+    """Returns a post encoded as JSON, as in `generate_json_list`."""
+    return json.dumps(post, default=json_util.default)
+
+
+def bump_post_versions(collection, event_id):
+    """Records that a post of an event changed.
+
+    Returns:
+        tuple: The versions of the event's posts just before and after the
+            change, as returned by `versions.bump_version`.
+    """
+    bump_version(collection)
+    return bump_version(collection, event_id)
+
+
+def upload_file(file, collection):
+    """Uploads a file to the storage backend, unless it is already stored.
+
+    Files are identified by the SHA-256 of their contents, see media_index.
+    Records the time taken in metrics.STORAGE_UPLOAD_LATENCY.
+
+    Returns:
+        media_index.MediaFile: Hash, name and public URL of the file.
+    """
+    start = time.perf_counter()
+    status = 'failed'
+    try:
+        media = media_index.store_file(collection, STORAGE, file)
+        status = 'succeeded' if media.uploaded else 'deduplicated'
+        return media
+    finally:
+        metrics.STORAGE_UPLOAD_LATENCY.labels(status).observe(
+            time.perf_counter() - start)
+
+
+def upload_files(files, collection):
+    """Uploads files to the storage backend concurrently.
+
+    Uploads run on the shared UPLOAD_POOL, so a post with many files takes
+    about as long as its slowest file rather than the sum. If any upload
+    fails, the files that were uploaded are released again.
+
+    Args:
+        files (list): Files to upload.
+        collection: pymongo collection of posts.
 
     Returns:
-        str: Public URL of the file in the cloud.
+        list: The MediaFiles uploaded, in the same order as files.
+
+    Raises:
+        Exception: The first error raised by an upload.
     """
-    filename = str(uuid.uuid4()) + '-' + file.filename
-    blob = CLOUD_STORAGE_BUCKET.blob(filename)
-    blob.upload_from_file(file)
-    return blob.public_url
+    futures = [UPLOAD_POOL.submit(upload_file, file, collection)
+               for file in files]
+    media_files = []
+    error = None
+    for future in futures:
+        try:
+            media_files.append(future.result())
+        except Exception as upload_error:  # pylint: disable=broad-except
+            error = error or upload_error
+    if error is not None:
+        release_files(media_files, collection)
+        raise error
+    return media_files
+
+
+def release_files(media_files, collection):
+    """Releases uploaded files of a post that wasn't added."""
+    for media in media_files:
+        try:
+            media_index.release_file(collection, STORAGE, media.digest)
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.warning('Failed to release uploaded file %s: %s',
+                           media.name, error)
+
+
+def delete_files(stored_files):
+    """Deletes uploaded files, logging any that can't be deleted."""
+    for stored in stored_files:
+        try:
+            STORAGE.delete(stored.name)
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.warning('Failed to delete uploaded file %s: %s',
+                           stored.name, error)
 
 
 def upload_new_post_to_db(post, collection):
@@ -191,6 +754,33 @@ def upload_new_post_to_db(post, collection):
     Returns:
         ObjectID: DB ID of the post that was uploaded.
 
+    Raises:
+        ValueError: Has no text body (i.e. empty string) nor any files
+            to upload.
+        AttributeError: `post` has not enough or too many attributes.
+    """
+    validate_post(post)
+    # post is valid, add on timestamp, upload files, insert into db
+    post['created_at'] = generate_timestamp()
+    media_files = upload_files(post['files'], collection)
+    post['files'] = [media.url for media in media_files]
+    post['file_hashes'] = [media.digest for media in media_files]
+    try:
+        post_id = collection.insert_one(post).inserted_id
+    except Exception:
+        release_files(media_files, collection)  # files of a missing post
+        raise
+    FEED_CACHE.add(post['event_id'], post_id, encode_post(post),
+                   *bump_post_versions(collection, post['event_id']))
+    if any(image_variants.is_image(media.name) for media in media_files):
+        VARIANT_POOL.submit(add_image_variants, post_id, media_files,
+                            collection)
+    return post_id
+
+
+def validate_post(post):
+    """Checks a new post has the attributes `upload_new_post_to_db` requires.
+
     Raises:
         ValueError: Has no text body (i.e. empty string) nor any files
             to upload.
@@ -201,11 +791,352 @@ def upload_new_post_to_db(post, collection):
                              'attributes {required_attributes}')
     if not post['text'] and not post['files']:
         raise ValueError('One of text or files must not be empty.')
-    # post is valid, add on timestamp, upload files, insert into db
-    post['created_at'] = generate_timestamp()
-    post['files'] = [
-        upload_file_to_cloud(file) for file in post['files']]
-    return collection.insert_one(post).inserted_id
+
+
+def get_post_jobs(collection):
+    """Returns the collection of posts being added in the background.
+
+    Its documents record the status of each post queued by `queue_post`:
+    pending, published with the `post_id` it was added as, or failed with an
+    `error`. Posts are only added to the posts collection once their files are
+    stored, so reads never see pending posts.
+    """
+    return collection.database[POST_JOBS_COLLECTION]
+
+
+def queue_post(post, collection):
+    """Records a new post as pending and adds it on INGEST_QUEUE.
+
+    The request only waits for its files to be copied to temporary files,
+    which outlive the request, rather than for them to be stored.
+
+    Args:
+        post (dict): Post to add, as for `upload_new_post_to_db`.
+        collection: pymongo collection of posts.
+
+    Returns:
+        tuple: JSON response with the `job_id` and `status_url` of the
+            post, and status 202, or 503 if the queue is full.
+
+    Raises:
+        ValueError, AttributeError: as `validate_post`.
+    """
+    validate_post(post)
+    post['files'] = [copy_upload(file) for file in post['files']]
+    post_jobs = get_post_jobs(collection)
+    job_id = post_jobs.insert_one({
+        'status': 'pending', 'event_id': post['event_id'],
+        'author_id': post['author_id'], 'created_at': generate_timestamp(),
+    }).inserted_id
+    try:
+        INGEST_QUEUE.submit(ingest_post, job_id, post, collection)
+    except JobQueueFullError:
+        post_jobs.delete_one({'_id': job_id})
+        for file in post['files']:
+            file.close()
+        return ('Too many posts being added, try again later.', 503,
+                {'Retry-After': str(INGEST_RETRY_AFTER)})
+    return job_accepted('get_post_status', job_id)
+
+
+def job_accepted(status_endpoint, job_id):
+    """Returns a 202 response for a queued job, with its status URL.
+
+    Args:
+        status_endpoint (str): name of the route with the job's status.
+        job_id (ObjectId): ID of the job.
+    """
+    status_url = url_for(status_endpoint, job_id=str(job_id))
+    return ({'job_id': str(job_id), 'status': 'pending',
+             'status_url': status_url}, 202, {'Location': status_url})
+
+
+def get_deletion_jobs(collection):
+    """Returns the collection of deletions of posts by event or author.
+
+    Its documents record the progress of each deletion queued by
+    `queue_bulk_deletion`, see `get_deletion_status`.
+    """
+    return collection.database[DELETION_JOBS_COLLECTION]
+
+
+def queue_bulk_deletion(query, collection):
+    """Queues the deletion of all posts matching query on DELETION_QUEUE.
+
+    A failed deletion of the same posts is resumed rather than started anew,
+    so the files of the batch it failed in are still released.
+
+    Returns:
+        tuple: JSON response with the `job_id` and `status_url` of the
+            deletion, and status 202, or 503 if the queue is full.
+    """
+    deletion_jobs = get_deletion_jobs(collection)
+    failed_job = deletion_jobs.find_one_and_update(
+        {'query': query, 'status': 'failed'},
+        {'$set': {'status': 'pending'}, '$unset': {'error': ''}})
+    if failed_job is None:
+        job_id = deletion_jobs.insert_one({
+            'status': 'pending', 'query': query,
+            'created_at': generate_timestamp()}).inserted_id
+    else:
+        job_id = failed_job['_id']
+    try:
+        DELETION_QUEUE.submit(delete_posts_in_bulk, job_id, query, collection)
+    except JobQueueFullError:
+        if failed_job is None:
+            deletion_jobs.delete_one({'_id': job_id})
+        else:
+            deletion_jobs.update_one({'_id': job_id}, {'$set': {
+                'status': 'failed', 'error': failed_job.get('error')}})
+        return ('Too many deletions running, try again later.', 503,
+                {'Retry-After': str(INGEST_RETRY_AFTER)})
+    return job_accepted('get_deletion_status', job_id)
+
+
+def delete_posts_in_bulk(job_id, query, collection):
+    """Deletes all posts matching query, and their files unless shared.
+
+    Posts are deleted DELETION_BATCH_SIZE at a time. Each batch is first
+    claimed by setting the posts' `deleted_by` to the job's ID, so only the
+    posts this job deleted have their files released, even if some are
+    deleted by another request meanwhile. The batch is then saved as the
+    job's `pending` batch before its posts are deleted, see
+    `finish_deletion_batch`, so if the job fails it resumes that batch
+    when run again. Progress is recorded in the job's document after every
+    batch.
+    """
+    deletion_jobs = get_deletion_jobs(collection)
+    # including posts claimed by this job before it failed
+    query = {'$and': [query, {'$or': [
+        {'deleted_by': {'$exists': False}}, {'deleted_by': job_id}]}]}
+    try:
+        job = deletion_jobs.find_one_and_update(
+            {'_id': job_id}, {'$set': {'status': 'running'},
+                              '$inc': {'deleted': 0, 'files_deleted': 0}},
+            return_document=pymongo.ReturnDocument.AFTER)
+        if 'pending' in job:
+            finish_deletion_batch(job_id, job['pending'], collection)
+            job = deletion_jobs.find_one({'_id': job_id})
+        deletion_jobs.update_one({'_id': job_id}, {'$set': {
+            'total': job['deleted'] + collection.count_documents(query)}})
+        while True:
+            post_ids = [post['_id'] for post in collection.find(
+                query, {'_id': True}).limit(DELETION_BATCH_SIZE)]
+            if not post_ids:
+                break
+            collection.update_many(
+                {'_id': {'$in': post_ids}, 'deleted_by': {'$exists': False}},
+                {'$set': {'deleted_by': job_id}})
+            posts = list(collection.find(
+                {'_id': {'$in': post_ids}, 'deleted_by': job_id},
+                {'event_id': True, 'file_hashes': True, 'files': True}))
+            digests = collections.Counter(
+                digest for post in posts
+                for digest in post.get('file_hashes', []))
+            batch = {
+                'post_ids': [post['_id'] for post in posts],
+                'event_ids': sorted({post['event_id'] for post in posts}),
+                'digests': [{'digest': digest, 'count': count}
+                            for digest, count in digests.items()],
+                'urls': [url for post in posts
+                         for url in legacy_file_urls(post)]}
+            deletion_jobs.update_one(
+                {'_id': job_id}, {'$set': {'pending': batch}})
+            finish_deletion_batch(job_id, batch, collection)
+        deletion_jobs.update_one(
+            {'_id': job_id}, {'$set': {'status': 'done'}})
+    except Exception as error:  # pylint: disable=broad-except
+        # nothing else would see the error of a task on the queue
+        LOGGER.exception('Failed to delete posts of job %s', job_id)
+        deletion_jobs.update_one({'_id': job_id}, {'$set': {
+            'status': 'failed', 'error': str(error)}})
+
+
+def finish_deletion_batch(job_id, batch, collection):
+    """Deletes a batch of posts claimed by a deletion job, and their files.
+
+    The files are released concurrently on DELETE_POOL, each once however
+    many of the batch's posts have it, and removed from the job's `pending`
+    batch as soon as they are, so running this again after an error only
+    releases the files that weren't.
+
+    Args:
+        job_id (ObjectId): ID of the deletion job.
+        batch (dict): the job's `pending` batch, with the `post_ids` and
+            `event_ids` of its posts, the `digests` of their files with the
+            `count` of posts with each, and the `urls` of the files of posts
+            without `file_hashes`.
+        collection: pymongo collection of posts.
+    """
+    deletion_jobs = get_deletion_jobs(collection)
+    collection.delete_many(
+        {'_id': {'$in': batch['post_ids']}, 'deleted_by': job_id})
+    bump_version(collection)
+    for event_id in batch['event_ids']:
+        bump_version(collection, event_id)
+
+    def release(item):
+        deleted = media_index.release_file(
+            collection, STORAGE, item['digest'], item['count'])
+        deletion_jobs.update_one({'_id': job_id}, {
+            '$pull': {'pending.digests': {'digest': item['digest']}},
+            '$inc': {'files_deleted': int(deleted)}})
+
+    def delete(url):
+        deleted = delete_legacy_file(url)
+        deletion_jobs.update_one({'_id': job_id}, {
+            '$pull': {'pending.urls': url},
+            '$inc': {'files_deleted': int(deleted)}})
+
+    futures = [DELETE_POOL.submit(release, item) for item in batch['digests']]
+    futures += [DELETE_POOL.submit(delete, url) for url in batch['urls']]
+    error = None
+    for future in futures:
+        try:
+            future.result()
+        except Exception as release_error:  # pylint: disable=broad-except
+            error = error or release_error
+    if error is not None:
+        raise error
+    deletion_jobs.update_one({'_id': job_id}, {
+        '$unset': {'pending': ''},
+        '$inc': {'deleted': len(batch['post_ids'])}})
+
+
+def legacy_file_urls(post):
+    """Returns the URLs of the files of a post not in media_index.
+
+    Posts added before files were deduplicated have no `file_hashes` to find
+    their files in media_index by, so their files are found by URL instead.
+    """
+    return [] if 'file_hashes' in post else post.get('files', [])
+
+
+def delete_legacy_file(url):
+    """Deletes a file of a post without `file_hashes` from storage.
+
+    Returns:
+        bool: whether the file was deleted.
+    """
+    try:
+        name = STORAGE.name_from_url(url)
+        if name is None:
+            LOGGER.warning('Not deleting file %s stored elsewhere', url)
+            return False
+        STORAGE.delete(name)
+    except Exception as error:  # pylint: disable=broad-except
+        LOGGER.warning('Failed to delete stored file %s: %s', url, error)
+        return False
+    return True
+
+
+def copy_upload(file):
+    """Copies an uploaded file to a temporary file, which outlives the request.
+
+    Returns:
+        werkzeug.datastructures.FileStorage: the copy, with the same name.
+    """
+    copy = tempfile.TemporaryFile()
+    try:
+        shutil.copyfileobj(file.stream, copy, COPY_CHUNK_SIZE)
+        copy.seek(0)
+    except BaseException:
+        copy.close()
+        raise
+    return FileStorage(stream=copy, filename=file.filename, name=file.name,
+                       content_type=file.content_type)
+
+
+def ingest_post(job_id, post, collection):
+    """Adds a post queued by `queue_post` and records its status."""
+    files = post['files']
+    post_jobs = get_post_jobs(collection)
+    try:
+        post_id = upload_new_post_to_db(post, collection)
+        post_jobs.update_one({'_id': job_id}, {'$set': {
+            'status': 'published', 'post_id': post_id}})
+    except Exception as error:  # pylint: disable=broad-except
+        # nothing else would see the error of a task on the queue
+        LOGGER.exception('Failed to add queued post %s', job_id)
+        post_jobs.update_one({'_id': job_id}, {'$set': {
+            'status': 'failed', 'error': str(error)}})
+    finally:
+        for file in files:
+            file.close()
+
+
+def add_image_variants(post_id, media_files, collection):
+    """Adds resized variants of the images of a post to it.
+
+    Runs on VARIANT_POOL after the post is added, so posting doesn't wait for
+    images to be resized. Sets the post's `variants` to a list with, for each
+    of its files, a list of the file's variants as returned by
+    store_image_variants().
+    """
+    try:
+        variants = [get_image_variants(media, collection)
+                    for media in media_files]
+        if not any(variants):
+            return
+        post = collection.find_one_and_update(
+            {'_id': post_id}, {'$set': {'variants': variants}},
+            return_document=pymongo.ReturnDocument.AFTER)
+        if post is not None:
+            FEED_CACHE.replace(
+                post['event_id'], post_id, encode_post(post),
+                *bump_post_versions(collection, post['event_id']))
+    except Exception:  # pylint: disable=broad-except
+        # nothing else would see the error of a task on the pool
+        LOGGER.exception('Failed to add image variants to post %s', post_id)
+
+
+def get_image_variants(media, collection):
+    """Returns the variants of a file of a post, making them if needed.
+
+    Variants are shared by all posts with the file, like the file itself.
+    """
+    if not image_variants.is_image(media.name):
+        return []
+    try:
+        variants = media_index.get_variants(collection, media.digest)
+    except KeyError:    # deleted with its posts
+        return []
+    if variants is not None:
+        return variants
+    made = store_image_variants(media)
+    variants = media_index.set_variants(collection, media.digest, made)
+    if variants != made:    # made by another post first, or file deleted
+        delete_files([StoredFile(variant['name'], variant['url'])
+                      for variant in made])
+    return variants or []
+
+
+def store_image_variants(stored):
+    """Makes and stores the variants of an uploaded file.
+
+    Returns:
+        list: {'name', 'url', 'width', 'type'} dicts of the variants, or an
+            empty list if the file isn't an image or the variants can't be
+            made.
+    """
+    if not image_variants.is_image(stored.name):
+        return []
+    # unique names, so variants made by two posts at once don't collide
+    stem = f'{os.path.splitext(stored.name)[0]}-{uuid.uuid4().hex[:8]}'
+    saved = []
+    try:
+        with STORAGE.open(stored.name) as file:
+            variants = image_variants.make_variants(file)
+        for variant in variants:
+            saved.append(STORAGE.save(io.BytesIO(variant.data), (
+                f'{stem}-{variant.width}w{variant.extension}')))
+    except OSError as error:
+        LOGGER.warning('Failed to make variants of %s: %s', stored.name, error)
+        delete_files(saved)
+        return []
+    return [{'name': variant_file.name, 'url': variant_file.url,
+             'width': variant.width, 'type': variant.content_type}
+            for variant_file, variant in zip(saved, variants)]
 
 
 def connect_to_cloud_storage():  # pragma: no cover
@@ -228,7 +1159,15 @@ def connect_to_cloud_storage():  # pragma: no cover
     return storage_client.get_bucket(bucket_name)
 
 
-CLOUD_STORAGE_BUCKET = connect_to_cloud_storage()
+def connect_to_storage():  # pragma: no cover
+    """Creates the storage backend chosen by the STORAGE_BACKEND env var."""
+    if os.environ.get('STORAGE_BACKEND', 'gcs') == 'local':
+        return LocalBackend(os.environ.get('LOCAL_STORAGE_DIR', 'media'),
+                            os.environ.get('LOCAL_STORAGE_URL', '/v1/media/'))
+    return GCSBackend(connect_to_cloud_storage())
+
+
+STORAGE = connect_to_storage()
 
 
 def connect_to_mongodb():  # pragma: no cover
@@ -247,7 +1186,12 @@ def connect_to_mongodb():  # pragma: no cover
     mongodb_uri = os.environ.get('MONGODB_URI')
     if mongodb_uri is None:
         return Thrower()  # not able to find db config var
-    return pymongo.MongoClient(mongodb_uri).posts_db.posts_collection
+    client = pymongo.MongoClient(
+        mongodb_uri, event_listeners=[metrics.CommandTimer(),
+                                      metrics.SlowCommandLogger()])
+    collection = client.posts_db.posts_collection
+    ensure_indexes(collection)
+    return collection
 
 
 app.config['COLLECTION'] = connect_to_mongodb()
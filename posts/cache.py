@@ -0,0 +1,155 @@
+"""In-process cache of the newest posts of each event."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import OrderedDict
+
+
+class _Feed():  # pylint: disable=too-few-public-methods
+    """Cached newest posts of one event."""
+
+    __slots__ = ('version', 'posts', 'complete')
+
+    def __init__(self, version, posts, complete):
+        self.version = version      # ETag of the event's posts, see versions
+        self.posts = posts          # (post ID, encoded post), newest first
+        self.complete = complete    # whether these are all the event's posts
+
+
+class FeedCache():
+    """Thread-safe LRU cache of the newest encoded posts of events.
+
+    Each event's feed is cached with the version of the event's posts it was
+    read at, see versions.py, and only served while that is still the current
+    version. Readers read the version before the posts and pass it to put().
+    Writers of this process update cached feeds in place with add(),
+    replace() and remove(), passing the versions just before and after their
+    write; a feed at any other version was changed by another process too, so
+    it is dropped instead.
+    """
+
+    def __init__(self, max_events, max_posts):
+        """Creates a cache of up to max_posts posts of max_events events."""
+        self.max_events = max_events
+        self.max_posts = max_posts
+        self.hits = 0
+        self.misses = 0
+        self._feeds = OrderedDict()     # event ID -> _Feed
+        self._lock = threading.Lock()
+
+    def get(self, event_id, version, limit):
+        """Returns the newest `limit` posts of an event, if cached.
+
+        Returns:
+            list: (post ID, encoded post) pairs, newest first, or None if the
+                event isn't cached at `version` or has too few posts cached.
+        """
+        with self._lock:
+            feed = self._feeds.get(event_id)
+            if feed is not None and feed.version != version:
+                del self._feeds[event_id]
+                feed = None
+            if feed is None or (len(feed.posts) < limit and not feed.complete):
+                self.misses += 1
+                return None
+            self._feeds.move_to_end(event_id)
+            self.hits += 1
+            return feed.posts[:limit]
+
+    def put(self, event_id, version, posts, complete):
+        """Caches the newest posts of an event, read at `version`.
+
+        Evicts the least recently used event if the cache is full.
+
+        Args:
+            event_id (str): ID of the event.
+            version (str): ETag of the event's posts, read before them.
+            posts (list): (post ID, encoded post) pairs, newest first.
+            complete (bool): whether these are all the event's posts.
+        """
+        with self._lock:
+            if self.max_events < 1:
+                return
+            posts = posts[:self.max_posts]
+            complete = complete and len(posts) < self.max_posts
+            self._feeds[event_id] = _Feed(version, posts, complete)
+            self._feeds.move_to_end(event_id)
+            if len(self._feeds) > self.max_events:
+                self._feeds.popitem(last=False)
+
+    def add(self, event_id, post_id, encoded, previous, version):
+        """Adds a new post to an event's cached feed, if cached."""
+        def change(feed):
+            ids = [cached_id for cached_id, _ in feed.posts]
+            if post_id in ids:  # read along with the post by another request
+                return
+            index = sum(1 for cached_id in ids if cached_id > post_id)
+            if index == len(ids) and not feed.complete:
+                return      # older than all cached posts, so not the newest
+            feed.posts.insert(index, (post_id, encoded))
+            if len(feed.posts) > self.max_posts:
+                del feed.posts[self.max_posts:]
+                feed.complete = False
+        self._change(event_id, previous, version, change)
+
+    def replace(self, event_id, post_id, encoded, previous, version):
+        """Replaces a changed post in an event's cached feed, if cached."""
+        def change(feed):
+            feed.posts = [
+                (cached_id, encoded if cached_id == post_id else cached_post)
+                for cached_id, cached_post in feed.posts]
+        self._change(event_id, previous, version, change)
+
+    def remove(self, event_id, post_id, previous, version):
+        """Removes a deleted post from an event's cached feed, if cached."""
+        def change(feed):
+            feed.posts = [(cached_id, cached_post) for cached_id, cached_post
+                          in feed.posts if cached_id != post_id]
+        self._change(event_id, previous, version, change)
+
+    def _change(self, event_id, previous, version, change):
+        """Applies a write from `previous` to `version` to an event's feed.
+
+        Drops the feed instead if it wasn't at `previous`.
+        """
+        with self._lock:
+            feed = self._feeds.get(event_id)
+            if feed is None:
+                return
+            if feed.version != previous:
+                del self._feeds[event_id]
+                return
+            change(feed)
+            feed.version = version
+
+    def clear(self):
+        """Drops all cached feeds and resets the hit and miss counters."""
+        with self._lock:
+            self._feeds.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns a dict of cache size, hits, misses, and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._feeds),
+                'max_size': self.max_events,
+                'max_posts': self.max_posts,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,90 @@
+"""Resized variants of posted images, for serving to small screens."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+from collections import namedtuple
+from PIL import Image, ImageOps
+
+VARIANT_WIDTHS = (320, 800, 1600)
+# extensions of the images variants are made of; others (e.g. animated GIFs)
+# are only served as uploaded
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+WEBP_QUALITY = 75
+JPEG_QUALITY = 85
+EXIF_ORIENTATION = 0x0112    # EXIF tag of the rotation of a photo
+
+Variant = namedtuple('Variant', 'width content_type extension data')
+
+
+def is_image(name):
+    """Returns True if variants can be made of the file with the given name."""
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def make_variants(file, widths=VARIANT_WIDTHS):
+    """Resizes an image to each of the given widths.
+
+    Each width is encoded both as WebP and, for browsers without WebP, as
+    JPEG, or PNG if the image is transparent. Images are never enlarged: only
+    widths less than the image's are made, or just the image's own width if it
+    is narrower than all of them, which still compresses it.
+
+    Args:
+        file: binary file object of the image.
+        widths (tuple): widths of the variants in pixels.
+
+    Returns:
+        list: Variants, smallest first.
+
+    Raises:
+        OSError: the file isn't an image Pillow can read.
+    """
+    image = Image.open(file)
+    # phones store the rotation of photos in EXIF, so widths are those of the
+    # image as shown, which is transposed if rotated by 90 degrees
+    width, height = image.size
+    rotated = image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8)
+    if rotated:
+        width, height = height, width
+    widths = sorted(target for target in widths if target < width) or [width]
+    # decode JPEGs at the smallest scale still larger than the largest width
+    draft_size = (widths[-1], widths[-1] * height // width)
+    image.draft('RGB', draft_size[::-1] if rotated else draft_size)
+    image = ImageOps.exif_transpose(image)
+    transparent = image.mode in ('RGBA', 'LA', 'PA') or (
+        'transparency' in image.info)
+    image = image.convert('RGBA' if transparent else 'RGB')
+    fallback = ('PNG', 'image/png', '.png') if transparent else (
+        'JPEG', 'image/jpeg', '.jpg')
+    variants = []
+    # resize largest first, each from the last, which is faster than
+    # resizing the original every time
+    for width in reversed(widths):
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+        variants.append(Variant(width, 'image/webp', '.webp', encode(
+            image, 'WEBP', quality=WEBP_QUALITY, method=4)))
+        variants.append(Variant(width, fallback[1], fallback[2], encode(
+            image, fallback[0], quality=JPEG_QUALITY, optimize=True)))
+    return variants[::-1]
+
+
+def encode(image, image_format, **options):
+    """Returns the bytes of an image saved in the given format."""
+    data = io.BytesIO()
+    image.save(data, image_format, **options)
+    return data.getvalue()
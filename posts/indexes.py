@@ -0,0 +1,81 @@
+"""Index management for the posts collection.
+
+Declares every index the posts service relies on. The app builds them once
+per process when connecting to the DB; run this module to build them ahead
+of a deployment instead:
+
+    MONGODB_URI="mongodb+srv://..." python3 indexes.py
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import pymongo
+from pymongo import IndexModel
+
+POST_INDEXES = [
+    # pages of an event's posts, newest first, used by /v1/by_event/<id>
+    IndexModel([('event_id', pymongo.ASCENDING), ('_id', pymongo.DESCENDING)],
+               name='event_id_1__id_-1'),
+    # posts made by a user
+    IndexModel([('author_id', pymongo.ASCENDING)], name='author_id_1'),
+]
+
+
+class IndexesNotBuiltError(RuntimeError):
+    """Raised when indexes are missing after trying to build them."""
+
+
+def ensure_indexes(collection):
+    """Builds any missing indexes on the posts collection and verifies them.
+
+    Building an index that already exists is a no-op, so this is safe to call
+    on every startup.
+
+    Raises an IndexesNotBuiltError if any index is still missing afterwards.
+    """
+    collection.create_indexes(POST_INDEXES)
+    verify_indexes(collection)
+
+
+def verify_indexes(collection):
+    """Raises an IndexesNotBuiltError if any declared index is missing."""
+    missing = find_missing_indexes(collection)
+    if missing:
+        raise IndexesNotBuiltError(
+            'Missing indexes on posts collection: ' + ', '.join(missing))
+
+
+def find_missing_indexes(collection):
+    """Returns the sorted names of declared indexes missing from collection."""
+    existing = collection.index_information()
+    return sorted(index.document['name'] for index in POST_INDEXES
+                  if index.document['name'] not in existing)
+
+
+def main():  # pragma: no cover
+    """Builds the posts indexes in the DB at MONGODB_URI."""
+    mongodb_uri = os.environ.get('MONGODB_URI')
+    if mongodb_uri is None:
+        sys.exit('Not able to find MONGODB_URI environment variable')
+    collection = pymongo.MongoClient(mongodb_uri).posts_db.posts_collection
+    ensure_indexes(collection)
+    for name in collection.index_information():
+        print(name)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,66 @@
+"""Bounded queue of background jobs run by worker threads."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when submitting a job to a queue with no room for it."""
+
+
+class JobQueue():
+    """Thread pool that refuses jobs beyond a number waiting or running.
+
+    A ThreadPoolExecutor queues any number of jobs, so a burst of them could
+    use unbounded memory and wait for arbitrarily long. This instead raises a
+    JobQueueFullError, so the caller can ask clients to retry later.
+    """
+
+    def __init__(self, workers, max_jobs, name):
+        """Args:
+            workers (int): number of threads running jobs.
+            max_jobs (int): most jobs waiting or running at once.
+            name (str): prefix of the names of the threads.
+        """
+        self.max_jobs = max_jobs
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_jobs)
+
+    def submit(self, function, *args):
+        """Runs function(*args) on a worker thread.
+
+        Returns:
+            concurrent.futures.Future: the result of the job.
+
+        Raises:
+            JobQueueFullError: max_jobs jobs are already waiting or running.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFullError(f'{self.max_jobs} jobs already queued.')
+        try:
+            return self._pool.submit(self._run, function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _run(self, function, *args):
+        """Runs a job, freeing its slot before its result is set."""
+        try:
+            return function(*args)
+        finally:
+            self._slots.release()
@@ -0,0 +1,151 @@
+"""Index of stored media files by their contents.
+
+Identical files posted many times are stored once. Each document of the
+media_index collection, in the same DB as the posts collection, describes one
+stored file:
+
+    _id         SHA-256 of the file's contents, in hex
+    name, url   name and URL of the file in storage
+    refs        number of posts with the file
+    variants    resized variants of the file, once made, see app.py
+
+A file is deleted from storage with its variants when its last post is.
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+import os
+import uuid
+from collections import namedtuple
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+LOGGER = logging.getLogger(__name__)
+
+MEDIA_INDEX_COLLECTION = 'media_index'
+HASH_CHUNK_SIZE = 1024 * 1024  # bytes read per update of a file's hash
+
+# file of a post: its hash, name and URL, and whether it was stored by this
+# post rather than already stored for another
+MediaFile = namedtuple('MediaFile', 'digest name url uploaded')
+
+
+def get_index(collection):
+    """Returns the media index of the posts in collection."""
+    return collection.database[MEDIA_INDEX_COLLECTION]
+
+
+def hash_file(file):
+    """Returns the SHA-256 of a file's contents, then rewinds the file."""
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+def store_file(collection, storage, file):
+    """Stores a file, or adds a reference to an identical stored file.
+
+    Args:
+        collection: pymongo collection of posts.
+        storage (storage_backends.StorageBackend): where files are stored.
+        file: seekable file object with a `filename`, e.g. a FileStorage.
+
+    Returns:
+        MediaFile: the stored file.
+    """
+    digest = hash_file(file)
+    index = get_index(collection)
+    extension = os.path.splitext(file.filename)[1].lower()
+    while True:
+        entry = index.find_one_and_update(
+            {'_id': digest}, {'$inc': {'refs': 1}})
+        if entry is not None:
+            return MediaFile(digest, entry['name'], entry['url'], False)
+        # a new name each time the contents are stored, so deleting a previous
+        # copy of the file can never delete this one
+        stored = storage.save(
+            file, f'{digest}-{uuid.uuid4().hex[:8]}{extension}')
+        try:
+            index.insert_one({'_id': digest, 'name': stored.name,
+                              'url': stored.url, 'refs': 1})
+            return MediaFile(digest, stored.name, stored.url, True)
+        except DuplicateKeyError:   # stored at the same time by another post
+            storage.delete(stored.name)
+            file.seek(0)
+
+
+def release_file(collection, storage, digest, count=1):
+    """Removes posts' references to a stored file.
+
+    Deletes the file and its variants from storage if no other post has it.
+
+    Args:
+        count (int): number of references to remove, i.e. of posts deleted
+            with the file.
+
+    Returns:
+        bool: whether the file was deleted.
+    """
+    index = get_index(collection)
+    entry = index.find_one_and_update(
+        {'_id': digest}, {'$inc': {'refs': -count}},
+        return_document=ReturnDocument.AFTER)
+    if entry is None or entry['refs'] > 0:
+        return False
+    # unless a new post added a reference since
+    entry = index.find_one_and_delete({'_id': digest, 'refs': {'$lte': 0}})
+    if entry is None:
+        return False
+    names = [entry['name']] + [
+        variant['name'] for variant in entry.get('variants', [])]
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.warning('Failed to delete stored file %s: %s', name, error)
+    return True
+
+
+def get_variants(collection, digest):
+    """Returns the variants of a stored file, or None if not made yet.
+
+    Raises:
+        KeyError: the file is no longer stored.
+    """
+    entry = get_index(collection).find_one({'_id': digest}, {'variants': 1})
+    if entry is None:
+        raise KeyError(digest)
+    return entry.get('variants')
+
+
+def set_variants(collection, digest, variants):
+    """Records the variants of a stored file, unless it already has some.
+
+    Returns:
+        list: the variants the file has now, which are other variants if
+            another post made them first, or None if the file is no longer
+            stored.
+    """
+    index = get_index(collection)
+    entry = index.find_one_and_update(
+        {'_id': digest, 'variants': {'$exists': False}},
+        {'$set': {'variants': variants}}, return_document=ReturnDocument.AFTER)
+    if entry is None:
+        entry = index.find_one({'_id': digest}, {'variants': 1})
+    return None if entry is None else entry.get('variants')
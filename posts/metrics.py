@@ -0,0 +1,173 @@
+"""Prometheus metrics of the posts service, exposed at /metrics.
+
+Gunicorn may run the app in several worker processes. To report metrics of
+all of them, set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the
+workers, as the Dockerfile does, and run gunicorn with gunicorn.conf.py, which
+cleans up after exited workers.
+
+SlowCommandLogger also logs every MongoDB command slower than
+MONGO_SLOW_COMMAND_MS milliseconds (default 100), with the command itself,
+so unindexed queries show up in the logs. See explain_queries.py to check
+query plans ahead of time.
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import threading
+import time
+from bson import json_util
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from pymongo import monitoring
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time to handle HTTP requests, until the response starts streaming.',
+    ['route', 'method', 'status'])
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'HTTP requests being handled.',
+    ['route', 'method'], multiprocess_mode='livesum')
+LOGGER = logging.getLogger(__name__)
+SLOW_COMMAND_MS = float(os.environ.get('MONGO_SLOW_COMMAND_MS', 100))
+MAX_LOGGED_COMMAND_LENGTH = 1000    # characters of each command logged
+
+STORAGE_UPLOAD_LATENCY = Histogram(
+    'storage_upload_duration_seconds', 'Time to upload each media file.',
+    ['status'])
+MONGO_COMMAND_LATENCY = Histogram(
+    'mongodb_command_duration_seconds', 'Time to run MongoDB commands.',
+    ['command', 'status'])
+
+
+def init_app(app):
+    """Records request metrics of app and serves them at /metrics."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', get_metrics, methods=['GET'])
+
+
+def get_metrics():
+    """Returns the metrics of every worker process in text format."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def _route():
+    """Returns the URL rule matching the request, which labels its metrics.
+
+    Labels by rule rather than path, e.g. "/v1/<event_id>", to keep the
+    number of time series bounded.
+    """
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _before_request():
+    """Starts timing the request."""
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_PROGRESS.labels(_route(), request.method).inc()
+
+
+def _after_request(response):
+    """Records the time taken to handle the request."""
+    if 'metrics_start' in g:
+        elapsed = time.perf_counter() - g.metrics_start
+        REQUEST_LATENCY.labels(
+            _route(), request.method, response.status_code).observe(elapsed)
+    return response
+
+
+def _teardown_request(_):
+    """Marks the request as finished, even if it raised an exception."""
+    if 'metrics_start' in g:
+        REQUESTS_IN_PROGRESS.labels(_route(), request.method).dec()
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Records the latency of every MongoDB command of a client.
+
+    Register with pymongo.MongoClient(uri, event_listeners=[CommandTimer()]).
+    """
+
+    def started(self, event):
+        """Commands are timed by the driver, see duration_micros."""
+
+    def succeeded(self, event):
+        """Records the latency of a successful command."""
+        MONGO_COMMAND_LATENCY.labels(event.command_name, 'succeeded').observe(
+            event.duration_micros / 1e6)
+
+    def failed(self, event):
+        """Records the latency of a failed command."""
+        MONGO_COMMAND_LATENCY.labels(event.command_name, 'failed').observe(
+            event.duration_micros / 1e6)
+
+
+class SlowCommandLogger(monitoring.CommandListener):
+    """Logs MongoDB commands that take longer than a threshold.
+
+    Register with pymongo.MongoClient(uri, event_listeners=[...]).
+    """
+
+    def __init__(self, threshold_ms=SLOW_COMMAND_MS):
+        """Logs commands taking at least threshold_ms milliseconds."""
+        self.threshold_ms = threshold_ms
+        self._commands = {}     # (connection, request ID) -> command
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        """Remembers the command until it finishes."""
+        with self._lock:
+            self._commands[(event.connection_id, event.request_id)] = (
+                event.command)
+
+    def succeeded(self, event):
+        """Logs the command if it was slow."""
+        self._finish(event, 'succeeded')
+
+    def failed(self, event):
+        """Logs the command if it was slow."""
+        self._finish(event, 'failed')
+
+    def _finish(self, event, status):
+        """Forgets a finished command, logging it if it was slow."""
+        with self._lock:
+            command = self._commands.pop(
+                (event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= self.threshold_ms:
+            LOGGER.warning('Slow MongoDB command %s %s in %.1f ms: %s',
+                           event.command_name, status, duration_ms,
+                           summarize_command(command))
+
+
+def summarize_command(command):
+    """Returns a command as extended JSON, truncated if it is long."""
+    if command is None:
+        return 'unknown'
+    summary = json_util.dumps(
+        {key: value for key, value in command.items()
+         if key not in ('lsid', '$clusterTime', '$db')})
+    if len(summary) > MAX_LOGGED_COMMAND_LENGTH:
+        summary = summary[:MAX_LOGGED_COMMAND_LENGTH] + '...'
+    return summary
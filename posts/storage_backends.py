@@ -0,0 +1,165 @@
+"""Backends storing the media files of posts.
+
+The app uses one backend, chosen by the STORAGE_BACKEND environment variable:
+
+    gcs     GCSBackend, files in a Google Cloud Storage bucket (default)
+    local   LocalBackend, files in a directory served by the app itself,
+            e.g. for running load tests offline
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import abc
+import os
+import shutil
+import tempfile
+import urllib.parse
+from collections import namedtuple
+from werkzeug.utils import secure_filename
+
+COPY_CHUNK_SIZE = 1024 * 1024  # bytes copied per read when saving a file
+# bytes sent per request of a GCS resumable upload, a multiple of 256KB
+GCS_CHUNK_SIZE = 8 * 1024 * 1024
+
+StoredFile = namedtuple('StoredFile', 'name url')
+
+
+class StorageBackend(abc.ABC):
+    """Interface of the places media files can be stored."""
+
+    @abc.abstractmethod
+    def save(self, file, name):
+        """Stores the contents of a file under a new name.
+
+        Args:
+            file: file-like object to read the contents from.
+            name (str): name to store the file under.
+
+        Returns:
+            StoredFile: name the file was stored under, and its public URL.
+        """
+
+    @abc.abstractmethod
+    def delete(self, name):
+        """Deletes the stored file with the given name."""
+
+    @abc.abstractmethod
+    def open(self, name):
+        """Returns a binary file object to read a stored file from."""
+
+    @abc.abstractmethod
+    def name_from_url(self, url):
+        """Returns the name of the stored file with the given public URL.
+
+        Returns:
+            str: the name, or None if the URL isn't of a file of this backend.
+        """
+
+    def path(self, name):
+        """Returns the path on disk of a stored file for the app to serve.
+
+        Raises:
+            FileNotFoundError: if there is no such file, or the backend serves
+                its files itself.
+        """
+        raise FileNotFoundError(name)
+
+
+class GCSBackend(StorageBackend):
+    """Stores files in a Google Cloud Storage bucket.
+
+    Files are uploaded with resumable uploads of chunk_size bytes per request,
+    which is also the most of a file held in memory at a time.
+    """
+
+    def __init__(self, bucket, chunk_size=GCS_CHUNK_SIZE):
+        """Args:
+            bucket (google.cloud.storage.Bucket): bucket to store files in.
+            chunk_size (int): bytes uploaded per request.
+        """
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+
+    def save(self, file, name):
+        blob = self.bucket.blob(name, chunk_size=self.chunk_size)
+        blob.upload_from_file(file)
+        return StoredFile(name, blob.public_url)
+
+    def delete(self, name):
+        self.bucket.blob(name).delete()
+
+    def open(self, name):
+        return self.bucket.blob(name, chunk_size=self.chunk_size).open('rb')
+
+    def name_from_url(self, url):
+        # public URLs are the bucket's, then the whole quoted name, which may
+        # have slashes of its own
+        prefix = f'/{self.bucket.name}/'
+        path = urllib.parse.urlsplit(url).path
+        if not path.startswith(prefix) or path == prefix:
+            return None
+        return urllib.parse.unquote(path[len(prefix):])
+
+
+class LocalBackend(StorageBackend):
+    """Stores files in a local directory.
+
+    Files are first written to a temporary file in the same directory, then
+    renamed into place, so a file is never served half written and a failed
+    save leaves nothing behind.
+    """
+
+    def __init__(self, root, base_url):
+        """Args:
+            root (str): directory to store files in, created if missing.
+            base_url (str): URL the files are served under, which the name of
+                a file is appended to, e.g. '/v1/media/'.
+        """
+        self.root = os.path.abspath(root)
+        self.base_url = base_url
+        os.makedirs(self.root, exist_ok=True)
+
+    def save(self, file, name):
+        name = secure_filename(name)
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(temp_fd, 'wb') as temp_file:
+                shutil.copyfileobj(file, temp_file, COPY_CHUNK_SIZE)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, os.path.join(self.root, name))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return StoredFile(name, self.base_url + name)
+
+    def delete(self, name):
+        os.unlink(self.path(name))
+
+    def open(self, name):
+        return open(self.path(name), 'rb')
+
+    def name_from_url(self, url):
+        if not url.startswith(self.base_url) or url == self.base_url:
+            return None
+        return url[len(self.base_url):]
+
+    def path(self, name):
+        if not name or name != secure_filename(name) or name[0] == '.':
+            raise FileNotFoundError(name)   # not a name save() would give
+        path = os.path.join(self.root, name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(name)
+        return path
@@ -0,0 +1,99 @@
+"""Unit tests for the feed cache."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from cache import FeedCache
+
+POSTS = [(3, 'post 3'), (2, 'post 2'), (1, 'post 1')]
+
+
+class TestFeedCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = FeedCache(max_events=2, max_posts=3)
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get('event', 'v1', 2))
+        self.cache.put('event', 'v1', POSTS, complete=False)
+        self.assertEqual(self.cache.get('event', 'v1', 2), POSTS[:2])
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['size'], 1)
+
+    def test_version_changed(self):
+        """A feed read at another version is dropped."""
+        self.cache.put('event', 'v1', POSTS, complete=False)
+        self.assertIsNone(self.cache.get('event', 'v2', 2))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_too_few_posts(self):
+        """Pages longer than the cached feed are only served if complete."""
+        self.cache.put('event', 'v1', POSTS[:2], complete=False)
+        self.assertIsNone(self.cache.get('event', 'v1', 3))
+        self.cache.put('event', 'v1', POSTS[:2], complete=True)
+        self.assertEqual(self.cache.get('event', 'v1', 3), POSTS[:2])
+
+    def test_lru_eviction(self):
+        self.cache.put('a', 'v1', POSTS, complete=True)
+        self.cache.put('b', 'v1', POSTS, complete=True)
+        self.cache.get('a', 'v1', 1)  # 'b' is now least recently used
+        self.cache.put('c', 'v1', POSTS, complete=True)
+        self.assertIsNotNone(self.cache.get('a', 'v1', 1))
+        self.assertIsNone(self.cache.get('b', 'v1', 1))
+        self.assertIsNotNone(self.cache.get('c', 'v1', 1))
+
+    def test_add(self):
+        """New posts are added newest first, keeping at most max_posts."""
+        self.cache.put('event', 'v1', POSTS[1:], complete=True)
+        self.cache.add('event', 3, 'post 3', 'v1', 'v2')
+        self.assertEqual(self.cache.get('event', 'v2', 3), POSTS)
+        self.cache.add('event', 4, 'post 4', 'v2', 'v3')
+        self.assertEqual(self.cache.get('event', 'v3', 3),
+                         [(4, 'post 4')] + POSTS[:2])
+        self.assertIsNone(self.cache.get('event', 'v3', 4))
+
+    def test_add_read_post(self):
+        """A post already read into the feed isn't added twice."""
+        self.cache.put('event', 'v1', POSTS, complete=True)
+        self.cache.add('event', 3, 'post 3', 'v1', 'v2')
+        self.assertEqual(self.cache.get('event', 'v2', 3), POSTS)
+
+    def test_replace_and_remove(self):
+        self.cache.put('event', 'v1', POSTS, complete=True)
+        self.cache.replace('event', 2, 'post 2 with variants', 'v1', 'v2')
+        self.assertEqual(self.cache.get('event', 'v2', 3)[1],
+                         (2, 'post 2 with variants'))
+        self.cache.remove('event', 2, 'v2', 'v3')
+        self.assertEqual(self.cache.get('event', 'v3', 2),
+                         [POSTS[0], POSTS[2]])
+
+    def test_write_from_other_version(self):
+        """A feed that missed a write of another process is dropped."""
+        self.cache.put('event', 'v1', POSTS, complete=True)
+        self.cache.remove('event', 2, 'v2', 'v3')
+        self.assertIsNone(self.cache.get('event', 'v3', 1))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_clear(self):
+        self.cache.put('event', 'v1', POSTS, complete=True)
+        self.cache.get('event', 'v1', 1)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['size'], 0)
+        self.assertEqual(self.cache.stats()['hits'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
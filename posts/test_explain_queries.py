@@ -0,0 +1,56 @@
+"""Unit tests for explaining the posts service's queries."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest.mock import MagicMock
+import mongomock
+import explain_queries
+import app
+
+
+class TestCanonicalQueries(unittest.TestCase):
+    def test_canonical_queries(self):
+        """Test that posts are looked up by event and by ID."""
+        app.app.config['COLLECTION'] = mongomock.MongoClient().db.collection
+        names = [name for name, _ in explain_queries.canonical_queries(app)]
+        self.assertEqual(names, ['list posts', 'posts by event', 'post by ID',
+                                 'page of posts by event',
+                                 'new posts by event'])
+
+
+class TestPlanStages(unittest.TestCase):
+    def test_plan_stages(self):
+        plan = {'stage': 'LIMIT', 'inputStage': {
+            'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}
+        self.assertEqual(explain_queries.plan_stages(plan),
+                         ['LIMIT', 'FETCH', 'IXSCAN'])
+        plan = {'stage': 'OR', 'inputStages': [
+            {'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'}]}
+        self.assertEqual(explain_queries.plan_stages(plan),
+                         ['OR', 'IXSCAN', 'COLLSCAN'])
+
+    def test_explain_queries(self):
+        cursor = MagicMock()
+        cursor.explain.return_value = {
+            'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}},
+            'executionStats': {'totalDocsExamined': 42}}
+        self.assertEqual(
+            explain_queries.explain_queries([('query', cursor)]),
+            [('query', ['COLLSCAN'], 42)])
+
+
+if __name__ == '__main__':
+    unittest.main()
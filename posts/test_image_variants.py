@@ -0,0 +1,94 @@
+"""Unit tests for resized variants of posted images."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import unittest
+from PIL import Image
+from image_variants import is_image, make_variants
+
+
+def make_image(width, height, image_format, mode='RGB', orientation=None):
+    """Returns a file of a new image, with an EXIF orientation if given."""
+    file = io.BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    Image.new(mode, (width, height), 'red').save(
+        file, image_format, exif=exif)
+    file.seek(0)
+    return file
+
+
+class TestMakeVariants(unittest.TestCase):
+    """Test image_variants.make_variants()."""
+
+    def assert_variant_sizes(self, variants, sizes):
+        """Asserts the variants have the given (width, height, format)s."""
+        actual = []
+        for variant in variants:
+            image = Image.open(io.BytesIO(variant.data))
+            self.assertEqual(variant.width, image.width)
+            self.assertEqual(variant.content_type,
+                             Image.MIME[image.format])
+            actual.append((image.width, image.height, image.format))
+        self.assertEqual(actual, sizes)
+
+    def test_widths_smaller_than_image(self):
+        """An image is resized to each width less than its own."""
+        variants = make_variants(make_image(1000, 500, 'JPEG'))
+        self.assert_variant_sizes(variants, [
+            (320, 160, 'JPEG'), (320, 160, 'WEBP'),
+            (800, 400, 'JPEG'), (800, 400, 'WEBP')])
+
+    def test_small_image_is_not_enlarged(self):
+        """An image narrower than all widths keeps its size."""
+        variants = make_variants(make_image(100, 80, 'JPEG'))
+        self.assert_variant_sizes(
+            variants, [(100, 80, 'JPEG'), (100, 80, 'WEBP')])
+
+    def test_rotated_image_is_not_enlarged(self):
+        """Widths are those of photos as shown, after their EXIF rotation."""
+        variants = make_variants(make_image(1000, 700, 'JPEG', orientation=6))
+        self.assert_variant_sizes(
+            variants, [(320, 457, 'JPEG'), (320, 457, 'WEBP')])
+
+    def test_transparent_fallback_is_png(self):
+        """Transparent images aren't flattened into JPEGs."""
+        variants = make_variants(
+            make_image(400, 400, 'PNG', mode='RGBA'), widths=(320,))
+        self.assert_variant_sizes(
+            variants, [(320, 320, 'PNG'), (320, 320, 'WEBP')])
+
+    def test_not_an_image(self):
+        """Files that aren't images raise OSError."""
+        with self.assertRaises(OSError):
+            make_variants(io.BytesIO(b'not an image'))
+
+
+class TestIsImage(unittest.TestCase):
+    """Test image_variants.is_image()."""
+
+    def test_is_image(self):
+        """Only still image formats get variants."""
+        self.assertTrue(is_image('abc-photo.JPG'))
+        self.assertTrue(is_image('abc-photo.png'))
+        self.assertFalse(is_image('abc-animation.gif'))
+        self.assertFalse(is_image('abc-video.mp4'))
+        self.assertFalse(is_image('abc-no-extension'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Unit tests for the background job queue."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+from jobs import JobQueue, JobQueueFullError
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = JobQueue(workers=1, max_jobs=2, name='test')
+
+    def test_runs_jobs(self):
+        self.assertEqual(self.queue.submit(sum, [1, 2]).result(), 3)
+
+    def test_full(self):
+        """Jobs beyond max_jobs are refused until one finishes."""
+        release = threading.Event()
+        first = self.queue.submit(release.wait)
+        self.queue.submit(release.wait)     # waiting for the only worker
+        with self.assertRaises(JobQueueFullError):
+            self.queue.submit(release.wait)
+        release.set()
+        first.result()
+        self.queue.submit(len, []).result()
+
+    def test_failed_jobs_free_their_slot(self):
+        for _ in range(3):
+            with self.assertRaises(ZeroDivisionError):
+                self.queue.submit(divmod, 1, 0).result()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Unit tests for the index of stored media files."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import mongomock
+import media_index
+from storage_backends import LocalBackend
+
+
+def make_file(contents, filename='photo.JPG'):
+    """Returns an uploaded file."""
+    file = io.BytesIO(contents)
+    file.filename = filename
+    return file
+
+
+class TestMediaIndex(unittest.TestCase):
+    """Test storing and releasing files with media_index."""
+
+    def setUp(self):
+        """Set up a mock DB and local storage."""
+        self.collection = mongomock.MongoClient().db.posts
+        self.index = media_index.get_index(self.collection)
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.media_dir = media_dir.name
+        self.storage = LocalBackend(self.media_dir, '/v1/media/')
+
+    def store(self, contents):
+        """Stores a file with the given contents."""
+        return media_index.store_file(
+            self.collection, self.storage, make_file(contents))
+
+    def test_hash_file(self):
+        """Files are hashed with SHA-256 and rewound."""
+        file = make_file(b'x' * (media_index.HASH_CHUNK_SIZE + 1))
+        self.assertEqual(
+            media_index.hash_file(file),
+            hashlib.sha256(b'x' * (media_index.HASH_CHUNK_SIZE + 1))
+            .hexdigest())
+        self.assertEqual(file.tell(), 0)
+
+    def test_duplicates_are_stored_once(self):
+        """Storing the same contents again reuses the stored file."""
+        first = self.store(b'viral photo')
+        second = self.store(b'viral photo')
+        other = self.store(b'another photo')
+        self.assertTrue(first.uploaded)
+        self.assertFalse(second.uploaded)
+        self.assertEqual(first[:3], second[:3])
+        self.assertNotEqual(first.url, other.url)
+        self.assertTrue(first.name.startswith(first.digest))
+        self.assertTrue(first.name.endswith('.jpg'))
+        self.assertEqual(sorted(os.listdir(self.media_dir)),
+                         sorted([first.name, other.name]))
+        self.assertEqual(self.index.find_one(first.digest)['refs'], 2)
+
+    def test_file_deleted_with_last_reference(self):
+        """A file and its variants are deleted when no post has it."""
+        first = self.store(b'viral photo')
+        self.store(b'viral photo')
+        variant = self.storage.save(io.BytesIO(b'small'), 'variant.webp')
+        media_index.set_variants(self.collection, first.digest, [
+            {'name': variant.name, 'url': variant.url}])
+        self.assertFalse(media_index.release_file(
+            self.collection, self.storage, first.digest))
+        self.assertEqual(len(os.listdir(self.media_dir)), 2)
+        self.assertTrue(media_index.release_file(
+            self.collection, self.storage, first.digest))
+        self.assertEqual(os.listdir(self.media_dir), [])
+        self.assertIsNone(self.index.find_one(first.digest))
+        # stored again as a new file
+        self.assertTrue(self.store(b'viral photo').uploaded)
+
+    def test_release_many_references(self):
+        """References of several deleted posts are released at once."""
+        first = self.store(b'viral photo')
+        for _ in range(2):
+            self.store(b'viral photo')
+        self.assertFalse(media_index.release_file(
+            self.collection, self.storage, first.digest, 2))
+        self.assertTrue(media_index.release_file(
+            self.collection, self.storage, first.digest))
+
+    def test_concurrent_first_upload(self):
+        """If two posts store the same new file at once, one copy is kept."""
+        digest = hashlib.sha256(b'viral photo').hexdigest()
+        real_insert = self.index.insert_one
+
+        def insert_after_other_post(document):
+            real_insert(dict(document, name='other', url='/other'))
+            return real_insert(document)
+        with mock.patch.object(media_index, 'get_index') as mock_get_index:
+            mock_get_index.return_value = mock.Mock(wraps=self.index)
+            mock_get_index.return_value.insert_one.side_effect = (
+                insert_after_other_post)
+            media = self.store(b'viral photo')
+        self.assertEqual(media.url, '/other')
+        self.assertEqual(os.listdir(self.media_dir), [])
+        self.assertEqual(self.index.find_one(digest)['refs'], 2)
+
+    def test_set_variants_once(self):
+        """The first variants set for a file are kept."""
+        media = self.store(b'photo')
+        first, second = [{'name': 'first'}], [{'name': 'second'}]
+        self.assertIsNone(
+            media_index.get_variants(self.collection, media.digest))
+        self.assertEqual(media_index.set_variants(
+            self.collection, media.digest, first), first)
+        self.assertEqual(media_index.set_variants(
+            self.collection, media.digest, second), first)
+        media_index.release_file(self.collection, mock.Mock(), media.digest)
+        self.assertIsNone(media_index.set_variants(
+            self.collection, media.digest, second))
+        with self.assertRaises(KeyError):
+            media_index.get_variants(self.collection, media.digest)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Unit tests for the posts service metrics."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest.mock import MagicMock
+from prometheus_client import REGISTRY
+import mongomock
+import metrics
+from app import app
+
+ROUTE_LABELS = {'route': '/v1/by_event/<event_id>', 'method': 'GET'}
+
+
+def get_sample(name, labels):
+    """Returns the current value of a metric, or 0 if never recorded."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.TestCase):
+    """Test the /metrics endpoint and the metrics it reports."""
+
+    def setUp(self):
+        app.config['COLLECTION'] = mongomock.MongoClient().db.collection
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+    def test_request_latency(self):
+        """Test that requests are counted by route, method and status."""
+        labels = dict(ROUTE_LABELS, status='200')
+        before = get_sample('http_request_duration_seconds_count', labels)
+        self.client.get('/v1/by_event/picnic')
+        self.assertEqual(
+            get_sample('http_request_duration_seconds_count', labels),
+            before + 1)
+        self.assertEqual(
+            get_sample('http_requests_in_progress', ROUTE_LABELS), 0)
+
+    def test_command_timer(self):
+        """Test that MongoDB command latencies are recorded."""
+        labels = {'command': 'find', 'status': 'succeeded'}
+        before = get_sample('mongodb_command_duration_seconds_count', labels)
+        metrics.CommandTimer().succeeded(
+            MagicMock(command_name='find', duration_micros=1500))
+        self.assertEqual(
+            get_sample('mongodb_command_duration_seconds_count', labels),
+            before + 1)
+
+    def test_slow_command_logger(self):
+        """Test that only commands over the threshold are logged."""
+        listener = metrics.SlowCommandLogger(threshold_ms=50)
+        command = {'find': 'collection', 'filter': {'x': 1}, 'lsid': 'id'}
+        with self.assertLogs(metrics.LOGGER) as logs:
+            for request_id, duration_micros in ((1, 60000), (2, 1000)):
+                listener.started(MagicMock(
+                    connection_id='c', request_id=request_id, command=command))
+                listener.succeeded(MagicMock(
+                    connection_id='c', request_id=request_id,
+                    command_name='find', duration_micros=duration_micros))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('find succeeded in 60.0 ms', logs.output[0])
+        self.assertIn('"filter": {"x": 1}', logs.output[0])
+        self.assertNotIn('lsid', logs.output[0])
+
+    def test_metrics_endpoint(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,9 +15,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import unittest
+from unittest import mock
 import mongomock
 import app
+from storage_backends import GCSBackend
 
 FAKE_POSTS = [
     {
@@ -55,6 +58,9 @@ FAKE_POSTS = [
     }
 ]
 
+# URL of a file of a post added before files were deduplicated
+LEGACY_URL = 'https://storage.googleapis.com/bucket/photos/1234-my%20cat.jpg'
+
 
 class TestPostDeletion(unittest.TestCase):
     """Test app.delete_post()."""
@@ -111,6 +117,136 @@ class TestPostDeletion(unittest.TestCase):
         self.assertEqual(status_code, 404)
         self.assertEqual(self.collection.count_documents({}), len(FAKE_POSTS))
 
+    def test_files_are_released(self):
+        """Deleting a post releases each of its stored files."""
+        post_id = self.collection.insert_one(
+            {'event_id': 'picnic', 'author_id': 'mukobi',
+             'file_hashes': ['abc', 'def']}
+        ).inserted_id
+        with mock.patch('media_index.release_file') as mock_release:
+            _, status_code = app.delete_post(
+                post_id, 'mukobi', self.collection)
+        self.assertEqual(status_code, 204)
+        self.assertEqual(
+            [call[0][2] for call in mock_release.call_args_list],
+            ['abc', 'def'])
+
+    def test_legacy_files_are_deleted(self):
+        """Files of posts without file_hashes are deleted by their URLs."""
+        post_id = self.collection.insert_one(
+            {'event_id': 'picnic', 'author_id': 'mukobi',
+             'files': [LEGACY_URL]}
+        ).inserted_id
+        bucket = mock.MagicMock()
+        bucket.name = 'bucket'
+        with mock.patch('app.STORAGE', GCSBackend(bucket)):
+            _, status_code = app.delete_post(
+                post_id, 'mukobi', self.collection)
+        self.assertEqual(status_code, 204)
+        bucket.blob.assert_called_once_with('photos/1234-my cat.jpg')
+        bucket.blob().delete.assert_called_once()
+
+
+class TestBulkDeletion(unittest.TestCase):
+    """Test app.delete_posts_in_bulk()."""
+
+    def setUp(self):
+        """Seed mock db with posts, some sharing files."""
+        self.collection = mongomock.MongoClient().db.collection
+        self.collection.insert_many([
+            {'event_id': 'picnic', 'author_id': 'mukobi',
+             'file_hashes': ['abc', 'def']},
+            {'event_id': 'picnic', 'author_id': 'cmei4444',
+             'file_hashes': ['abc']},
+            {'event_id': 'picnic', 'author_id': 'mukobi'},
+            {'event_id': 'aquarium', 'author_id': 'mukobi',
+             'file_hashes': ['abc']}])
+        self.deletion_jobs = app.get_deletion_jobs(self.collection)
+        self.job_id = self.deletion_jobs.insert_one(
+            {'status': 'pending'}).inserted_id
+        patcher = mock.patch('media_index.release_file', return_value=True)
+        self.mock_release = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def delete(self, query):
+        """Deletes posts matching query in batches of 2."""
+        with mock.patch('app.DELETION_BATCH_SIZE', 2):
+            app.delete_posts_in_bulk(self.job_id, query, self.collection)
+        return self.deletion_jobs.find_one(self.job_id)
+
+    def test_delete_event(self):
+        """All posts of an event are deleted, and their files released."""
+        job = self.delete({'event_id': 'picnic'})
+        self.assertEqual(self.collection.count_documents({}), 1)
+        self.assertEqual(
+            (job['status'], job['total'], job['deleted']), ('done', 3, 3))
+        self.assertEqual(job['files_deleted'], 2)   # abc and def
+        released = collections.Counter()
+        for call in self.mock_release.call_args_list:
+            released[call[0][2]] += call[0][3]
+        self.assertEqual(released, {'abc': 2, 'def': 1})
+
+    def test_delete_author(self):
+        """All posts of an author are deleted."""
+        job = self.delete({'author_id': 'mukobi'})
+        self.assertEqual(self.collection.count_documents({}), 1)
+        self.assertEqual(job['deleted'], 3)
+
+    def test_posts_claimed_by_other_job(self):
+        """Posts already being deleted by another job are left to it."""
+        self.collection.update_one({'author_id': 'cmei4444'},
+                                   {'$set': {'deleted_by': 'other job'}})
+        job = self.delete({'event_id': 'picnic'})
+        self.assertEqual(job['deleted'], 2)
+        self.assertEqual(
+            self.collection.count_documents({'deleted_by': 'other job'}), 1)
+
+    def test_failure_is_recorded(self):
+        """Errors stop the deletion and are recorded in the job."""
+        self.mock_release.side_effect = OSError('storage is down')
+        job = self.delete({'event_id': 'picnic'})
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], 'storage is down')
+
+    def test_retry_after_failure(self):
+        """A failed job resumes its batch without releasing files twice."""
+        released = collections.Counter()
+        failing = ['def']
+
+        def release_file(collection, storage, digest, count=1):
+            if digest in failing:
+                failing.remove(digest)
+                raise OSError('index is down')
+            released[digest] += count
+            return True
+        self.mock_release.side_effect = release_file
+        job = self.delete({'event_id': 'picnic'})
+        self.assertEqual((job['status'], job['deleted']), ('failed', 0))
+        self.assertEqual(job['pending']['digests'],
+                         [{'digest': 'def', 'count': 1}])
+        self.assertEqual(self.collection.count_documents({}), 2)
+        job = self.delete({'event_id': 'picnic'})
+        self.assertEqual(
+            (job['status'], job['total'], job['deleted']), ('done', 3, 3))
+        self.assertEqual(job['files_deleted'], 2)
+        self.assertNotIn('pending', job)
+        self.assertEqual(released, {'abc': 2, 'def': 1})
+
+    def test_legacy_files(self):
+        """Files of posts without file_hashes are deleted by their URLs."""
+        self.collection.insert_one({
+            'event_id': 'picnic', 'author_id': 'mukobi', 'files': [
+                LEGACY_URL, 'https://storage.googleapis.com/bucket/a.jpg']})
+        bucket = mock.MagicMock()
+        bucket.name = 'bucket'
+        with mock.patch('app.STORAGE', GCSBackend(bucket)):
+            job = self.delete({'event_id': 'picnic'})
+        self.assertEqual((job['status'], job['deleted']), ('done', 4))
+        self.assertEqual(job['files_deleted'], 4)
+        self.assertCountEqual(
+            [call[0][0] for call in bucket.blob.call_args_list],
+            ['photos/1234-my cat.jpg', 'a.jpg'])
+
 
 if __name__ == '__main__':
     unittest.main()
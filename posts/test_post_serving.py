@@ -16,6 +16,9 @@
 # limitations under the License.
 
 import unittest
+from unittest import mock
+from bson import json_util
+from bson.errors import InvalidId
 import mongomock
 import app
 
@@ -65,9 +68,9 @@ class TestPostDBGetting(unittest.TestCase):
         self.collection.insert_many(FAKE_POSTS)
 
     def test_find_all_posts(self):
-        """Find all fake posts."""
+        """Find all fake posts, newest first."""
         found = app.find_posts_in_db(self.collection)
-        self.assertEqual(found, FAKE_POSTS)
+        self.assertEqual(found, FAKE_POSTS[::-1])
 
     def test_find_by_post_id(self):
         """Search for 1 post by post ID."""
@@ -80,9 +83,36 @@ class TestPostDBGetting(unittest.TestCase):
         """Search for many posts by event ID."""
         event_id = 'aquarium'
         found = app.find_posts_in_db(self.collection, event_id=event_id)
-        expected = [post for post in FAKE_POSTS if post['event_id'] is event_id]
+        expected = [post for post in FAKE_POSTS[::-1]
+                    if post['event_id'] is event_id]
         self.assertEqual(found, expected)
 
+    def test_find_page(self):
+        """Find the posts older than a given post, newest first."""
+        newest, middle, oldest = FAKE_POSTS[::-1]
+        found = app.find_posts_in_db(self.collection, limit=1)
+        self.assertEqual(found, [newest])
+        found = app.find_posts_in_db(
+            self.collection, limit=1, before=newest['_id'])
+        self.assertEqual(found, [middle])
+        found = app.find_posts_in_db(
+            self.collection, event_id='picnic', before=middle['_id'])
+        self.assertEqual(found, [oldest])
+        found = app.find_posts_in_db(self.collection, before=oldest['_id'])
+        self.assertEqual(found, [])
+
+    def test_find_since(self):
+        """Find the posts newer than a given post, oldest first."""
+        newest, middle, oldest = FAKE_POSTS[::-1]
+        found = app.find_posts_in_db(self.collection, after=oldest['_id'])
+        self.assertEqual(found, [middle, newest])
+        found = app.find_posts_in_db(
+            self.collection, event_id='picnic', after=oldest['_id'])
+        self.assertEqual(found, [])
+        found = app.find_posts_in_db(
+            self.collection, after=oldest['_id'], limit=1)
+        self.assertEqual(found, [middle])
+
     def test_missing_all_posts(self):
         """Can't find any posts in an empty db."""
         self.collection.delete_many({})  # empty the db
@@ -104,6 +134,64 @@ class TestPostDBGetting(unittest.TestCase):
         expected = []
         self.assertEqual(found, expected)
 
+    def test_find_fields(self):
+        """Find only the requested fields of posts."""
+        found = app.find_posts_in_db(
+            self.collection, fields=app.parse_fields('text, event_id'))
+        expected = [{'_id': post['_id'], 'event_id': post['event_id'],
+                     'text': post['text']} for post in FAKE_POSTS[::-1]]
+        self.assertEqual(found, expected)
+
+    def test_parse_fields(self):
+        """Parse valid and invalid `fields` query parameters."""
+        self.assertIsNone(app.parse_fields(None))
+        self.assertEqual(app.parse_fields('text,files,text'), ['files', 'text'])
+        for value in ('', 'text,_id', 'password'):
+            with self.assertRaises(ValueError):
+                app.parse_fields(value)
+
+    def test_parse_page(self):
+        """Parse valid and invalid `limit` and `before` query parameters."""
+        post_id = FAKE_POSTS[0]['_id']
+        self.assertEqual(app.parse_page({}), (app.DEFAULT_PAGE_LIMIT, None))
+        self.assertEqual(
+            app.parse_page({'limit': '5', 'before': str(post_id)}),
+            (5, post_id))
+        self.assertEqual(app.parse_page({'limit': '100000'}),
+                         (app.MAX_PAGE_LIMIT, None))
+        for args in ({'limit': '0'}, {'limit': 'ten'}, {'before': 'nope'}):
+            with self.assertRaises((ValueError, InvalidId)):
+                app.parse_page(args)
+
+
+class TestPostStreaming(unittest.TestCase):
+    """Test app.generate_json_list()."""
+
+    def setUp(self):
+        """Seed mock db."""
+        self.collection = mongomock.MongoClient().db.collection
+        self.collection.insert_many(FAKE_POSTS)
+
+    def test_stream_posts(self):
+        """Streamed posts decode to the same posts as in the db."""
+        expected = list(self.collection.find())
+        with mock.patch('app.STREAM_CHUNK_SIZE', 100):  # force many chunks
+            chunks = list(app.generate_json_list(
+                self.collection.find(), 'posts',
+                lambda count, _: {'num_posts': count}))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json_util.loads(''.join(chunks)),
+                         {'posts': expected, 'num_posts': len(expected)})
+
+    def test_stream_no_posts(self):
+        """An empty cursor is streamed as valid JSON."""
+        self.collection.delete_many({})
+        chunks = app.generate_json_list(
+            self.collection.find(), 'posts',
+            lambda count, _: {'num_posts': count})
+        self.assertEqual(json_util.loads(''.join(chunks)),
+                         {'posts': [], 'num_posts': 0})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -18,21 +18,34 @@
 import unittest
 from unittest import mock
 import datetime
-import collections
+import hashlib
+import io
+import os
+import tempfile
+import threading
 import mongomock
+from PIL import Image
 import app
+import media_index
+from storage_backends import GCSBackend, LocalBackend, StoredFile
 
 MOCK_FILE_URL = 'the url of an uploaded file'
-File = collections.namedtuple('File', 'filename')
-MOCK_FILE = File(filename='the name of a file')
+
+
+def make_file(filename='the name of a file', contents=b'file contents'):
+    """Returns an uploaded file."""
+    file = io.BytesIO(contents)
+    file.filename = filename
+    return file
+
 
 VALID_POST_FULL = {
     'event_id': 'abc123',
     'author_id': 'jrr_tolkien',
     'text': 'This is a very valid post with text and files.',
     'files': [
-        MOCK_FILE,
-        MOCK_FILE
+        make_file(),
+        make_file()
     ]}
 VALID_POST_TEXT_NO_FILES = {
     'event_id': 'abc123',
@@ -44,7 +57,7 @@ VALID_POST_FILES_NO_TEXT = {
     'author_id': 'No text is alright if I have files.',
     'text': '',
     'files': [
-        MOCK_FILE
+        make_file()
     ]}
 INVALID_POST_NO_TEXT_NOR_FILES = {
     'event_id': 'abc123',
@@ -80,8 +93,10 @@ class TestPostUploading(unittest.TestCase):
         # mock db
         self.mock_collection = mongomock.MongoClient().db.collection
         # mock Google Cloud Storage bucket for file uploading
-        patcher = mock.patch('app.CLOUD_STORAGE_BUCKET')
-        self.mock_bucket = patcher.start()
+        self.mock_bucket = mock.MagicMock()
+        patcher = mock.patch.object(
+            app, 'STORAGE', new=GCSBackend(self.mock_bucket))
+        patcher.start()
         self.addCleanup(patcher.stop)
         self.mock_bucket.blob().public_url = MOCK_FILE_URL
 
@@ -137,6 +152,178 @@ class TestPostUploading(unittest.TestCase):
         self.assertIsNone(self.mock_collection.find_one({}))
 
 
+class TestConcurrentUploads(unittest.TestCase):
+    """Test app.upload_files()."""
+
+    def setUp(self):
+        """Set up a mock Google Cloud Storage bucket with a blob per file."""
+        self.mock_bucket = mock.MagicMock()
+        self.mock_bucket.blob.side_effect = self.make_blob
+        patcher = mock.patch.object(
+            app, 'STORAGE', new=GCSBackend(self.mock_bucket))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.blobs = []
+        self.mock_collection = mongomock.MongoClient().db.collection
+
+    def make_blob(self, filename, chunk_size=None):
+        """Returns a mock blob whose URL is its filename."""
+        blob = mock.MagicMock()
+        blob.name = blob.public_url = filename
+        self.blobs.append(blob)
+        return blob
+
+    def test_uploads_run_concurrently(self):
+        """Files of a post are uploaded at the same time."""
+        barrier = threading.Barrier(2, timeout=5)
+        self.mock_bucket.blob.side_effect = lambda filename, **kwargs: (
+            barrier.wait(), self.make_blob(filename))[1]
+        files = [make_file('a', b'a'), make_file('b', b'b')]
+        media_files = app.upload_files(files, self.mock_collection)
+        self.assertEqual([media.digest for media in media_files],
+                         [hashlib.sha256(b'a').hexdigest(),
+                          hashlib.sha256(b'b').hexdigest()])
+
+    def test_failed_upload_releases_uploaded_files(self):
+        """If one file fails to upload, the others are released again."""
+        def upload_from_file(file):
+            if file.filename == 'bad':
+                raise IOError('upload failed')
+        self.mock_bucket.blob.side_effect = (
+            lambda filename, **kwargs: mock.MagicMock(
+                public_url=filename,
+                **{'upload_from_file.side_effect': upload_from_file}))
+        files = [make_file('a', b'a'), make_file('bad', b'bad'),
+                 make_file('c', b'c')]
+        with mock.patch.object(app, 'release_files') as mock_release:
+            with self.assertRaises(IOError):
+                app.upload_files(files, self.mock_collection)
+        self.assertEqual(len(mock_release.call_args[0][0]), 2)
+
+    def test_failed_insert_deletes_uploaded_files(self):
+        """Files are deleted again if the post can't be added to the DB."""
+        post = {'event_id': 'abc123', 'author_id': 'ray_bradbury',
+                'text': '', 'files': [make_file()]}
+        self.mock_collection.insert_one = mock.Mock(side_effect=IOError)
+        with self.assertRaises(IOError):
+            app.upload_new_post_to_db(post, self.mock_collection)
+        uploaded, deleted = self.blobs
+        self.assertEqual(deleted.name, uploaded.name)
+        deleted.delete.assert_called_once()
+        self.assertIsNone(
+            media_index.get_index(self.mock_collection).find_one({}))
+
+    def test_delete_files_continues_after_errors(self):
+        """A file that fails to delete doesn't stop the others."""
+        blobs = {'a': self.make_blob('a'), 'b': self.make_blob('b')}
+        self.mock_bucket.blob.side_effect = blobs.get
+        blobs['a'].delete.side_effect = IOError('delete failed')
+        with self.assertLogs(app.LOGGER, 'WARNING'):
+            app.delete_files([StoredFile('a', 'url a'),
+                              StoredFile('b', 'url b')])
+        blobs['b'].delete.assert_called_once()
+
+
+class TestImageVariants(unittest.TestCase):
+    """Test making variants of posted images in the background."""
+
+    def setUp(self):
+        """Set up a mock DB and local storage holding a posted image."""
+        self.mock_collection = mongomock.MongoClient().db.collection
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.media_dir = media_dir.name
+        backend = LocalBackend(self.media_dir, '/v1/media/')
+        patcher = mock.patch.object(app, 'STORAGE', new=backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        image = io.BytesIO()
+        Image.new('RGB', (1000, 500)).save(image, 'JPEG')
+        self.image = self.store_file('photo.jpg', image.getvalue())
+        self.post_id = self.mock_collection.insert_one(
+            {'files': [self.image.url]}).inserted_id
+
+    def store_file(self, filename, contents):
+        """Stores a file of a post, returning its MediaFile."""
+        return media_index.store_file(self.mock_collection, app.STORAGE,
+                                      make_file(filename, contents))
+
+    def test_variants_are_added_to_post(self):
+        """Each image of a post gets a list of its variants."""
+        text = self.store_file('notes.txt', b'some notes')
+        app.add_image_variants(
+            self.post_id, [self.image, text], self.mock_collection)
+        post = self.mock_collection.find_one({})
+        image_variants, text_variants = post['variants']
+        self.assertEqual(text_variants, [])
+        self.assertEqual(
+            [(variant['width'], variant['type'])
+             for variant in image_variants],
+            [(320, 'image/jpeg'), (320, 'image/webp'),
+             (800, 'image/jpeg'), (800, 'image/webp')])
+        self.assertTrue(image_variants[1]['url'].endswith('-320w.webp'))
+        self.assertIn(image_variants[1]['name'], os.listdir(self.media_dir))
+        self.assertEqual(media_index.get_variants(
+            self.mock_collection, self.image.digest), image_variants)
+
+    def test_variants_are_shared(self):
+        """Posts of the same image share its variants."""
+        app.add_image_variants(
+            self.post_id, [self.image], self.mock_collection)
+        num_files = len(os.listdir(self.media_dir))
+        other_post_id = self.mock_collection.insert_one({}).inserted_id
+        with mock.patch('image_variants.make_variants') as mock_make:
+            app.add_image_variants(
+                other_post_id, [self.image], self.mock_collection)
+        mock_make.assert_not_called()
+        self.assertEqual(len(os.listdir(self.media_dir)), num_files)
+        first, other = self.mock_collection.find({})
+        self.assertEqual(first['variants'], other['variants'])
+
+    def test_variants_made_by_another_post(self):
+        """Variants lost to another post making them first are deleted."""
+        other = [{'name': 'other', 'url': '/other', 'width': 1, 'type': ''}]
+        with mock.patch('media_index.set_variants', return_value=other):
+            app.add_image_variants(
+                self.post_id, [self.image], self.mock_collection)
+        self.assertEqual(self.mock_collection.find_one({})['variants'],
+                         [other])
+        self.assertEqual(os.listdir(self.media_dir), [self.image.name])
+
+    def test_file_deleted_meanwhile(self):
+        """Variants of a file deleted before they were added are deleted."""
+        with mock.patch('media_index.get_variants', return_value=None):
+            media_index.release_file(
+                self.mock_collection, app.STORAGE, self.image.digest)
+            app.add_image_variants(
+                self.post_id, [self.image], self.mock_collection)
+        self.assertEqual(os.listdir(self.media_dir), [])
+        self.assertNotIn('variants', self.mock_collection.find_one({}))
+
+    def test_unreadable_image(self):
+        """Files that can't be read as images get no variants."""
+        broken = self.store_file('bad.jpg', b'not a jpeg')
+        with self.assertLogs(app.LOGGER, 'WARNING'):
+            app.add_image_variants(
+                self.post_id, [broken], self.mock_collection)
+        self.assertNotIn('variants', self.mock_collection.find_one({}))
+        # other posts of the file don't try again
+        self.assertEqual(media_index.get_variants(
+            self.mock_collection, broken.digest), [])
+
+    def test_upload_schedules_variants(self):
+        """Variants are made after a post with images is added."""
+        post = {'event_id': 'abc123', 'author_id': 'ray_bradbury',
+                'text': '', 'files': [make_file('photo.jpg')]}
+        with mock.patch.object(app, 'upload_files',
+                               return_value=[self.image]), \
+                mock.patch.object(app, 'VARIANT_POOL') as mock_pool:
+            post_id = app.upload_new_post_to_db(post, self.mock_collection)
+        mock_pool.submit.assert_called_once_with(
+            app.add_image_variants, post_id, [self.image],
+            self.mock_collection)
+
+
 class TestGenerateTimestamp(unittest.TestCase):
     """Test app.generate_timestamp()."""
 
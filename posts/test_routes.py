@@ -18,10 +18,14 @@
 import unittest
 from unittest import mock
 import io
-import collections
+import tempfile
+import time
 from bson import ObjectId, json_util
 import mongomock
-from app import app
+from app import app, get_deletion_jobs, FEED_CACHE
+from jobs import JobQueueFullError
+from storage_backends import GCSBackend, LocalBackend, StoredFile
+from versions import bump_version
 
 MOCK_FILE_URL = 'the url of an uploaded file'
 
@@ -47,8 +51,7 @@ INVALID_REQUEST_NO_TEXT_NOR_FILES = {
 INVALID_REQUEST_NOT_ENOUGH_ATTRS = {
     'where_did_all_the_attributes_go?': 'I do not know'}
 
-DbFile = collections.namedtuple('File', 'filename')
-MOCK_DB_FILE = DbFile(filename='the name of a file')
+MOCK_DB_FILE = 'https://example.com/the-name-of-a-file.jpg'
 
 VALID_DB_POST_FULL = {
     'event_id': 'foo',
@@ -185,6 +188,32 @@ class TestGetAllPostsRoute(unittest.TestCase):
         self.assertEqual(data['num_posts'], num_expected_posts)
         self.assertEqual(len(data['posts']), num_expected_posts)
 
+    def test_conditional_get(self):
+        """Unchanged posts are answered with 304 until a post is deleted."""
+        post_id = app.config['COLLECTION'].insert_one(
+            dict(VALID_DB_POST_TEXT_NO_FILES)).inserted_id
+        etag = self.client.get('/v1/').headers['ETag']
+        result = self.client.get('/v1/', headers={'If-None-Match': etag})
+        self.assertEqual(result.status_code, 304)
+        self.assertEqual(result.data, b'')
+
+        self.client.delete(f'/v1/{post_id}', data={
+            'author_id': VALID_DB_POST_TEXT_NO_FILES['author_id']})
+        result = self.client.get('/v1/', headers={'If-None-Match': etag})
+        self.assertEqual(result.status_code, 200)
+        self.assertNotEqual(result.headers['ETag'], etag)
+        self.assertEqual(json_util.loads(result.data)['num_posts'], 0)
+
+    def test_fields(self):
+        """Get only the requested fields of all posts."""
+        app.config['COLLECTION'].insert_one(dict(VALID_DB_POST_TEXT_NO_FILES))
+        result = self.client.get('/v1/', query_string={'fields': 'text'})
+        self.assertEqual(result.status_code, 200)
+        data = json_util.loads(result.data)
+        self.assertEqual(set(data['posts'][0]), {'_id', 'text'})
+        result = self.client.get('/v1/', query_string={'fields': 'secret'})
+        self.assertEqual(result.status_code, 400)
+
 
 class TestGetPostByEventIDRoute(unittest.TestCase):
     """Test get post by event  endpoint GET /v1/by_event/<event_id>."""
@@ -192,6 +221,7 @@ class TestGetPostByEventIDRoute(unittest.TestCase):
     def setUp(self):
         """Set up test client and seed mock DB for testing."""
         app.config['COLLECTION'] = mongomock.MongoClient().db.collection
+        FEED_CACHE.clear()
         self.mock_posts = [
             VALID_DB_POST_FULL,
             VALID_DB_POST_TEXT_NO_FILES,
@@ -215,6 +245,7 @@ class TestGetPostByEventIDRoute(unittest.TestCase):
         event_id = self.mock_posts[0]['event_id']
         expected_posts = [
             post for post in self.mock_posts if post['event_id'] is event_id]
+        expected_posts = expected_posts[::-1]   # newest first
         num_expected_posts = len(expected_posts)
         result = self.client.get(f'/v1/by_event/{str(event_id)}')
         self.assertEqual(result.status_code, 200)
@@ -223,6 +254,152 @@ class TestGetPostByEventIDRoute(unittest.TestCase):
         self.assertEqual(len(data['posts']), num_expected_posts)
         self.assertEqual(data['posts'], expected_posts)
 
+    def test_conditional_get(self):
+        """Unchanged posts are answered with 304 until a post is added."""
+        url = f'/v1/by_event/{self.mock_posts[0]["event_id"]}'
+        etag = self.client.get(url).headers['ETag']
+        result = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(result.status_code, 304)
+
+        self.client.post('/v1/add', data=dict(VALID_REQUEST_TEXT_NO_FILES))
+        result = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(result.status_code, 200)
+
+    def test_pages(self):
+        """Pages of posts are newest first and link to the next page."""
+        collection = app.config['COLLECTION']
+        collection.delete_many({})
+        post_ids = collection.insert_many(
+            [{'event_id': 'baz', 'text': str(i)} for i in range(5)]
+        ).inserted_ids[::-1]
+        seen = []
+        url = '/v1/by_event/baz?limit=2'
+        while url is not None:
+            result = self.client.get(url)
+            self.assertEqual(result.status_code, 200)
+            data = json_util.loads(result.data)
+            self.assertLessEqual(data['num_posts'], 2)
+            seen.extend(post['_id'] for post in data['posts'])
+            url = data['next'] and (
+                f'/v1/by_event/baz?limit=2&before={data["next"]}')
+        self.assertEqual(seen, post_ids)
+
+    def test_feed_cache(self):
+        """Feeds are cached, and kept up to date by writes."""
+        collection = app.config['COLLECTION']
+        self.client.get('/v1/by_event/foo')
+        self.assertEqual(FEED_CACHE.stats()['misses'], 1)
+        with mock.patch.object(collection, 'find') as mock_find:
+            data = json_util.loads(self.client.get('/v1/by_event/foo').data)
+            mock_find.assert_not_called()
+        self.assertEqual(FEED_CACHE.stats()['hits'], 1)
+        self.assertEqual(data['num_posts'], 2)
+        old_ids = [post['_id'] for post in data['posts']]
+
+        post_id = ObjectId(self.client.post('/v1/add', data={
+            'event_id': 'foo', 'author_id': 'ray_bradbury',
+            'text': 'Hello'}).data.decode())
+        self.client.delete(f'/v1/{data["posts"][0]["_id"]}',
+                           data={'author_id': data['posts'][0]['author_id']})
+        with mock.patch.object(collection, 'find') as mock_find:
+            data = json_util.loads(self.client.get('/v1/by_event/foo').data)
+            mock_find.assert_not_called()
+        self.assertEqual([post['_id'] for post in data['posts']],
+                         [post_id, old_ids[1]])
+        self.assertEqual(data['posts'][0]['text'], 'Hello')
+
+    def test_feed_cache_other_process(self):
+        """Cached feeds aren't used after other processes write."""
+        collection = app.config['COLLECTION']
+        self.client.get('/v1/by_event/foo')
+        collection.insert_one({'event_id': 'foo', 'text': 'Hi'})
+        bump_version(collection, 'foo')
+        data = json_util.loads(self.client.get('/v1/by_event/foo').data)
+        self.assertEqual(data['num_posts'], 3)
+        self.assertEqual(FEED_CACHE.stats()['hits'], 0)
+
+    def test_cache_stats(self):
+        """The cache's hits and misses are reported."""
+        self.client.get('/v1/by_event/foo')
+        self.client.get('/v1/by_event/foo')
+        stats = json_util.loads(self.client.get('/v1/cache_stats').data)
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_invalid_page(self):
+        """Invalid page parameters are rejected."""
+        for query in ('limit=0', 'limit=many', 'before=not-an-id'):
+            result = self.client.get(f'/v1/by_event/foo?{query}')
+            self.assertEqual(result.status_code, 400)
+            result = self.client.get(f'/v1/?{query}')
+            self.assertEqual(result.status_code, 400)
+
+
+class TestGetPostsSinceRoute(unittest.TestCase):
+    """Test new posts endpoints GET /v1/since/<post_id> and
+    GET /v1/by_event/<event_id>/since/<post_id>."""
+
+    def setUp(self):
+        """Set up test client and seed mock DB for testing."""
+        app.config['COLLECTION'] = mongomock.MongoClient().db.collection
+        self.post_ids = app.config['COLLECTION'].insert_many(
+            [{'event_id': event_id, 'text': str(i)}
+             for i, event_id in enumerate(['foo', 'bar', 'foo', 'foo'])]
+        ).inserted_ids
+        app.config['TESTING'] = True  # propagate exceptions to test client
+        self.client = app.test_client()
+
+    def test_new_posts(self):
+        """Only posts newer than the given post are returned, oldest first."""
+        result = self.client.get(f'/v1/since/{self.post_ids[1]}')
+        self.assertEqual(result.status_code, 200)
+        data = json_util.loads(result.data)
+        self.assertEqual([post['_id'] for post in data['posts']],
+                         self.post_ids[2:])
+        self.assertEqual(data['num_posts'], 2)
+        self.assertEqual(data['latest'], str(self.post_ids[3]))
+
+    def test_new_posts_for_event(self):
+        """Only the event's new posts are returned, a page at a time."""
+        url = f'/v1/by_event/foo/since/{self.post_ids[0]}?limit=1'
+        data = json_util.loads(self.client.get(url).data)
+        self.assertEqual([post['_id'] for post in data['posts']],
+                         [self.post_ids[2]])
+        url = f'/v1/by_event/foo/since/{data["latest"]}'
+        data = json_util.loads(self.client.get(url).data)
+        self.assertEqual([post['_id'] for post in data['posts']],
+                         [self.post_ids[3]])
+
+    def test_no_new_posts(self):
+        """Polling without new posts gets none, then 304 with the ETag."""
+        url = f'/v1/by_event/foo/since/{self.post_ids[3]}'
+        result = self.client.get(url)
+        data = json_util.loads(result.data)
+        self.assertEqual(data['posts'], [])
+        self.assertEqual(data['latest'], str(self.post_ids[3]))
+        result = self.client.get(
+            url, headers={'If-None-Match': result.headers['ETag']})
+        self.assertEqual(result.status_code, 304)
+
+    def test_truncated_poll(self):
+        """Polling on after a page cut off at limit gets the rest, not 304."""
+        result = self.client.get(f'/v1/since/{self.post_ids[0]}?limit=2')
+        data = json_util.loads(result.data)
+        self.assertEqual(data['num_posts'], 2)
+        result = self.client.get(
+            f'/v1/since/{data["latest"]}?limit=2',
+            headers={'If-None-Match': result.headers['ETag']})
+        self.assertEqual(result.status_code, 200)
+        data = json_util.loads(result.data)
+        self.assertEqual([post['_id'] for post in data['posts']],
+                         self.post_ids[3:])
+
+    def test_invalid_post_id(self):
+        """Invalid post IDs are rejected."""
+        result = self.client.get('/v1/since/not-an-id')
+        self.assertEqual(result.status_code, 400)
+        result = self.client.get('/v1/by_event/foo/since/not-an-id')
+        self.assertEqual(result.status_code, 400)
+
 
 class TestGetPostByPostIDRoute(unittest.TestCase):
     """Test get post by post ID endpoint GET /v1/<post_id>."""
@@ -269,8 +446,9 @@ class TestUploadNewPostRoute(unittest.TestCase):
         app.config['TESTING'] = True  # propagate exceptions to test client
         self.client = app.test_client()
         # mock Google Cloud Storage bucket for file uploading
-        patcher = mock.patch('app.CLOUD_STORAGE_BUCKET')
-        self.mock_bucket = patcher.start()
+        self.mock_bucket = mock.MagicMock()
+        patcher = mock.patch('app.STORAGE', new=GCSBackend(self.mock_bucket))
+        patcher.start()
         self.addCleanup(patcher.stop)
         self.mock_bucket.blob().public_url = MOCK_FILE_URL
 
@@ -319,6 +497,221 @@ class TestUploadNewPostRoute(unittest.TestCase):
         self.assertEqual(result.status_code, 400)
         self.assert_count_in_collection({}, 0)
 
+    def test_large_files_are_spooled_to_disk(self):
+        """Files over UPLOAD_SPOOL_BYTES aren't kept in memory."""
+        streams = {}
+
+        def save(file, name):
+            streams[file.filename] = file.stream
+            return StoredFile(name, MOCK_FILE_URL)
+        request = dict(VALID_REQUEST_TEXT_NO_FILES,
+                       small=(io.BytesIO(b'x' * 10), 'small.jpg'),
+                       large=(io.BytesIO(b'x' * 100), 'large.jpg'))
+        with mock.patch('app.UPLOAD_SPOOL_BYTES', 50), \
+                mock.patch('app.STORAGE.save', side_effect=save):
+            result = self.client.post('/v1/add', data=request,
+                                      content_type='multipart/form-data')
+        self.assertEqual(result.status_code, 201)
+        self.assertFalse(streams['small.jpg']._rolled)
+        self.assertTrue(streams['large.jpg']._rolled)
+
+    def test_upload_too_large(self):
+        """Uploads over MAX_CONTENT_LENGTH are rejected before reading."""
+        request = dict(VALID_REQUEST_TEXT_NO_FILES,
+                       file_1=(io.BytesIO(b'x' * 100), 'file_1.jpg'))
+        with mock.patch.dict(app.config, MAX_CONTENT_LENGTH=10):
+            result = self.client.post('/v1/add', data=request,
+                                      content_type='multipart/form-data')
+        self.assertEqual(result.status_code, 413)
+        self.assert_count_in_collection({}, 0)
+
+
+class TestAsyncUploadRoute(unittest.TestCase):
+    """Test adding posts in the background with POST /v1/add?async=true."""
+
+    def setUp(self):
+        """Set up test client and a local storage backend."""
+        app.config['COLLECTION'] = mongomock.MongoClient().db.collection
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        patcher = mock.patch(
+            'app.STORAGE', new=LocalBackend(media_dir.name, '/v1/media/'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('app.INGEST_QUEUE')
+        self.mock_queue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self):
+        """Adds a post with a file in the background."""
+        request = dict(VALID_REQUEST_FILES_NO_TEXT, file_1=(
+            io.BytesIO(b'file contents'), 'file_1.jpg'))
+        return self.client.post('/v1/add?async=true', data=request,
+                                content_type='multipart/form-data')
+
+    def get_status(self, result):
+        """Returns the status of the post added by a response."""
+        return json_util.loads(
+            self.client.get(result.headers['Location']).data)
+
+    def test_post_is_added_later(self):
+        """A post is pending and hidden from reads until added."""
+        result = self.post()
+        self.assertEqual(result.status_code, 202)
+        self.assertEqual(self.get_status(result)['status'], 'pending')
+        self.assertEqual(app.config['COLLECTION'].count_documents({}), 0)
+
+        # run the job queued by the request, after the request ended
+        function, *args = self.mock_queue.submit.call_args[0]
+        function(*args)
+        status = self.get_status(result)
+        self.assertEqual(status['status'], 'published')
+        post = app.config['COLLECTION'].find_one({})
+        self.assertEqual(status['post_id'], str(post['_id']))
+        self.assertEqual(self.client.get(post['files'][0]).data,
+                         b'file contents')
+
+    def test_failed_post(self):
+        """Posts whose files can't be stored are marked failed."""
+        result = self.post()
+        function, *args = self.mock_queue.submit.call_args[0]
+        with mock.patch('app.STORAGE.save', side_effect=OSError('disk full')):
+            function(*args)
+        status = self.get_status(result)
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['error'], 'disk full')
+        self.assertEqual(app.config['COLLECTION'].count_documents({}), 0)
+
+    def test_queue_full(self):
+        """Posts are refused while the queue is full."""
+        self.mock_queue.submit.side_effect = JobQueueFullError
+        result = self.post()
+        self.assertEqual(result.status_code, 503)
+        self.assertIn('Retry-After', result.headers)
+
+    def test_invalid_post(self):
+        """Invalid posts are rejected before they are queued."""
+        result = self.client.post('/v1/add?async=true',
+                                  data=INVALID_REQUEST_NO_TEXT_NOR_FILES,
+                                  content_type='multipart/form-data')
+        self.assertEqual(result.status_code, 400)
+        self.mock_queue.submit.assert_not_called()
+
+    def test_unknown_job(self):
+        """Statuses of unknown jobs are not found."""
+        for job_id in (ObjectId(), 'not-an-id'):
+            result = self.client.get(f'/v1/status/{job_id}')
+            self.assertEqual(result.status_code, 404)
+
+
+class TestBulkDeletionRoutes(unittest.TestCase):
+    """Test deleting posts with DELETE /v1/by_event/<event_id> and
+    DELETE /v1/by_author/<author_id>."""
+
+    def setUp(self):
+        """Set up test client and seed mock DB for testing."""
+        app.config['COLLECTION'] = mongomock.MongoClient().db.collection
+        app.config['COLLECTION'].insert_many([
+            {'event_id': 'foo', 'author_id': 'mukobi'},
+            {'event_id': 'foo', 'author_id': 'cmei4444'},
+            {'event_id': 'bar', 'author_id': 'mukobi'}])
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+    def test_delete_by_event(self):
+        """Posts of an event are deleted in the background."""
+        result = self.client.delete('/v1/by_event/foo')
+        self.assertEqual(result.status_code, 202)
+        status_url = json_util.loads(result.data)['status_url']
+        self.assertEqual(result.headers['Location'], status_url)
+        for _ in range(100):
+            status = json_util.loads(self.client.get(status_url).data)
+            if status['status'] not in ('pending', 'running'):
+                break
+            time.sleep(0.01)
+        self.assertEqual((status['status'], status['deleted']), ('done', 2))
+        self.assertEqual(app.config['COLLECTION'].count_documents({}), 1)
+
+    def test_delete_by_author(self):
+        """Posts of an author are deleted in the background."""
+        with mock.patch('app.DELETION_QUEUE') as mock_queue:
+            result = self.client.delete('/v1/by_author/mukobi')
+        self.assertEqual(result.status_code, 202)
+        self.assertEqual(mock_queue.submit.call_args[0][2],
+                         {'author_id': 'mukobi'})
+
+    def test_queue_full(self):
+        """Deletions are refused while the queue is full."""
+        with mock.patch('app.DELETION_QUEUE') as mock_queue:
+            mock_queue.submit.side_effect = JobQueueFullError
+            result = self.client.delete('/v1/by_event/foo')
+        self.assertEqual(result.status_code, 503)
+        self.assertEqual(app.config['COLLECTION'].count_documents({}), 3)
+
+    def test_failed_deletion_is_resumed(self):
+        """Deleting the same posts again resumes a failed deletion."""
+        deletion_jobs = get_deletion_jobs(app.config['COLLECTION'])
+        job_id = deletion_jobs.insert_one({
+            'status': 'failed', 'error': 'index is down',
+            'query': {'event_id': 'foo'}}).inserted_id
+        with mock.patch('app.DELETION_QUEUE') as mock_queue:
+            result = self.client.delete('/v1/by_event/foo')
+        self.assertEqual(result.status_code, 202)
+        self.assertEqual(json_util.loads(result.data)['job_id'], str(job_id))
+        self.assertEqual(mock_queue.submit.call_args[0][1], job_id)
+
+    def test_unknown_job(self):
+        """Progress of unknown deletions is not found."""
+        for job_id in (ObjectId(), 'not-an-id'):
+            result = self.client.get(f'/v1/deletions/{job_id}')
+            self.assertEqual(result.status_code, 404)
+
+
+class TestMediaFileRoute(unittest.TestCase):
+    """Test serving local media files with GET /v1/media/<name>."""
+
+    def setUp(self):
+        """Set up test client and a local storage backend."""
+        app.config['COLLECTION'] = mongomock.MongoClient().db.collection
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        patcher = mock.patch(
+            'app.STORAGE', new=LocalBackend(media_dir.name, '/v1/media/'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_uploaded_file_is_served(self):
+        """Files of a new post can be downloaded from their URL."""
+        request = dict(VALID_REQUEST_FILES_NO_TEXT, file_1=(
+            io.BytesIO(b'first file contents'), 'file_1.jpg'))
+        result = self.client.post('/v1/add', data=request,
+                                  content_type='multipart/form-data')
+        self.assertEqual(result.status_code, 201)
+        post = app.config['COLLECTION'].find_one({})
+        url = post['files'][0]
+        self.assertTrue(url.startswith('/v1/media/'))
+        result = self.client.get(url)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.data, b'first file contents')
+        self.assertEqual(result.mimetype, 'image/jpeg')
+        result.close()
+
+    def test_missing_file(self):
+        """Files that weren't stored are not found."""
+        for name in ('nothing.jpg', '..', '.tmp-abc'):
+            result = self.client.get('/v1/media/' + name)
+            self.assertEqual(result.status_code, 404)
+
+    def test_gcs_files_are_not_served(self):
+        """Files stored in GCS are served by GCS, not by the app."""
+        with mock.patch('app.STORAGE', new=GCSBackend(mock.MagicMock())):
+            result = self.client.get('/v1/media/file.jpg')
+        self.assertEqual(result.status_code, 404)
+
 
 if __name__ == '__main__':  # pragma: no cover
     unittest.main()
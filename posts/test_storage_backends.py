@@ -0,0 +1,126 @@
+"""Unit tests for storage backends."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from storage_backends import (GCS_CHUNK_SIZE, GCSBackend, LocalBackend,
+                              StorageBackend, StoredFile)
+
+
+class FailingFile(io.BytesIO):
+    """File whose contents can't be read after the first chunk."""
+
+    def read(self, *args):
+        if self.tell():
+            raise IOError('connection reset')
+        return super().read(4)
+
+
+class TestLocalBackend(unittest.TestCase):
+    """Test storage_backends.LocalBackend."""
+
+    def setUp(self):
+        """Create a backend in a temporary directory."""
+        media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.root = media_dir.name
+        self.backend = LocalBackend(self.root, 'http://posts/v1/media/')
+
+    def test_save_and_delete(self):
+        """Saved files can be found by name until they are deleted."""
+        stored = self.backend.save(io.BytesIO(b'contents'), 'a.jpg')
+        self.assertEqual(
+            stored, StoredFile('a.jpg', 'http://posts/v1/media/a.jpg'))
+        with open(self.backend.path('a.jpg'), 'rb') as file:
+            self.assertEqual(file.read(), b'contents')
+        self.backend.delete('a.jpg')
+        with self.assertRaises(FileNotFoundError):
+            self.backend.path('a.jpg')
+
+    def test_unsafe_names(self):
+        """Names can't escape the storage directory."""
+        stored = self.backend.save(io.BytesIO(b'x'), '../../etc/passwd')
+        self.assertEqual(stored.name, 'etc_passwd')
+        self.assertEqual(os.listdir(self.root), ['etc_passwd'])
+        for name in ('../etc_passwd', '', '.tmp-x'):
+            with self.assertRaises(FileNotFoundError):
+                self.backend.path(name)
+
+    def test_failed_save_leaves_no_file(self):
+        """A save that fails part way through writes nothing."""
+        with self.assertRaises(IOError):
+            self.backend.save(FailingFile(b'contents'), 'a.jpg')
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_save_replaces_atomically(self):
+        """A file being saved over stays readable until it is replaced."""
+        self.backend.save(io.BytesIO(b'old'), 'a.jpg')
+        with open(self.backend.path('a.jpg'), 'rb') as old_file:
+            self.backend.save(io.BytesIO(b'new'), 'a.jpg')
+            self.assertEqual(old_file.read(), b'old')
+        with open(self.backend.path('a.jpg'), 'rb') as new_file:
+            self.assertEqual(new_file.read(), b'new')
+
+    def test_name_from_url(self):
+        """Names are found from the URLs of saved files only."""
+        stored = self.backend.save(io.BytesIO(b'x'), 'a.jpg')
+        self.assertEqual(self.backend.name_from_url(stored.url), 'a.jpg')
+        self.assertIsNone(
+            self.backend.name_from_url('http://elsewhere/v1/media/a.jpg'))
+
+
+class TestGCSBackend(unittest.TestCase):
+    """Test storage_backends.GCSBackend."""
+
+    def test_save_and_delete(self):
+        """Files are uploaded to and deleted from blobs in the bucket."""
+        bucket = mock.MagicMock()
+        bucket.blob().public_url = 'https://storage/a.jpg'
+        file = io.BytesIO(b'contents')
+        backend = GCSBackend(bucket)
+        self.assertEqual(backend.save(file, 'a.jpg'),
+                         StoredFile('a.jpg', 'https://storage/a.jpg'))
+        bucket.blob.assert_called_with('a.jpg', chunk_size=GCS_CHUNK_SIZE)
+        bucket.blob().upload_from_file.assert_called_with(file)
+        backend.delete('a.jpg')
+        bucket.blob().delete.assert_called_once()
+
+    def test_name_from_url(self):
+        """Names are found from public URLs, including their slashes."""
+        bucket = mock.MagicMock()
+        bucket.name = 'bucket'
+        backend = GCSBackend(bucket)
+        url = 'https://storage.googleapis.com/bucket/photos/my%20cat.jpg'
+        self.assertEqual(backend.name_from_url(url), 'photos/my cat.jpg')
+        self.assertIsNone(
+            backend.name_from_url(url.replace('/bucket/', '/other/')))
+
+
+class TestStorageBackend(unittest.TestCase):
+    def test_incomplete_backend(self):
+        """Backends missing a method can't be created."""
+        class SaveOnlyBackend(StorageBackend):
+            def save(self, file, name):
+                return StoredFile(name, name)
+        with self.assertRaises(TypeError):
+            SaveOnlyBackend()
+
+
+if __name__ == '__main__':
+    unittest.main()
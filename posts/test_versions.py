@@ -0,0 +1,61 @@
+"""Unit tests for collection version counters."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import mongomock
+from versions import bump_version, get_etag
+
+
+class TestVersions(unittest.TestCase):
+    def setUp(self):
+        database = mongomock.MongoClient().db
+        self.collection = database.events
+        self.other_collection = database.other
+
+    def test_etag_changes_on_bump(self):
+        etag = get_etag(self.collection)
+        self.assertEqual(get_etag(self.collection), etag)
+        bump_version(self.collection)
+        bumped_etag = get_etag(self.collection)
+        self.assertNotEqual(bumped_etag, etag)
+        bump_version(self.collection)
+        self.assertNotIn(get_etag(self.collection), (etag, bumped_etag))
+
+    def test_collections_are_versioned_separately(self):
+        etag = get_etag(self.other_collection)
+        bump_version(self.collection)
+        self.assertEqual(get_etag(self.other_collection), etag)
+        self.assertNotEqual(get_etag(self.collection), etag)
+
+    def test_bump_returns_etags(self):
+        """Bumping returns the ETags just before and after it."""
+        for _ in range(2):
+            etag = get_etag(self.collection)
+            self.assertEqual(bump_version(self.collection),
+                             (etag, get_etag(self.collection)))
+
+    def test_scopes_are_versioned_separately(self):
+        etag = get_etag(self.collection)
+        scope_etag = get_etag(self.collection, 'scope')
+        bump_version(self.collection, 'scope')
+        self.assertEqual(get_etag(self.collection), etag)
+        self.assertNotEqual(get_etag(self.collection, 'scope'), scope_etag)
+        self.assertNotEqual(get_etag(self.collection, 'scope'),
+                            get_etag(self.collection))
+
+
+if __name__ == '__main__':
+    unittest.main()
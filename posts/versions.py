@@ -0,0 +1,69 @@
+"""Version counters of collections, used as ETags of list responses.
+
+Each counter is a document {_id: collection name, version, epoch} in the
+`collection_versions` collection of the same DB. Writers bump the counter
+*after* changing the collection, and readers read it *before* reading the
+collection, so a response is never tagged with a version newer than its
+contents. The epoch is set when the counter is created, so ETags don't repeat
+if the counter is deleted and starts over.
+
+A collection can also have counters scoped to a subset of its documents,
+e.g. the posts of one event, which only change when that subset does.
+"""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import uuid
+from pymongo import ReturnDocument
+
+VERSIONS_COLLECTION = 'collection_versions'
+
+
+def counter_id(collection, scope=None):
+    """Returns the _id of the counter of collection, or of a scope of it."""
+    return collection.name if scope is None else f'{collection.name}/{scope}'
+
+
+def get_etag(collection, scope=None):
+    """Returns the current ETag of collection's contents, without quotes.
+
+    If scope is given, returns the ETag of that scope of the collection.
+    """
+    key = counter_id(collection, scope)
+    counter = collection.database[VERSIONS_COLLECTION].find_one({'_id': key})
+    if counter is None:     # never written since versioning was added
+        return f'{key}-0'
+    return f'{key}-{counter["epoch"]}-{counter["version"]}'
+
+
+def bump_version(collection, scope=None):
+    """Records that collection, or a scope of it, changed.
+
+    Call after every write.
+
+    Returns:
+        tuple: The ETags just before and just after this change, so callers
+            can tell whether anything else changed in between.
+    """
+    key = counter_id(collection, scope)
+    counter = collection.database[VERSIONS_COLLECTION].find_one_and_update(
+        {'_id': key},
+        {'$inc': {'version': 1},
+         '$setOnInsert': {'epoch': uuid.uuid4().hex[:8]}},
+        upsert=True, return_document=ReturnDocument.AFTER)
+    version = counter['version']
+    previous = (f'{key}-0' if version == 1
+                else f'{key}-{counter["epoch"]}-{version - 1}')
+    return previous, f'{key}-{counter["epoch"]}-{version}'
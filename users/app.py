@@ -26,8 +26,11 @@ import pymongo
 from werkzeug.exceptions import BadRequestKeyError
 from google.oauth2 import id_token
 from google.auth.transport import requests
+from indexes import ensure_indexes
+import metrics
 
 app = Flask(__name__)  # pylint: disable=invalid-name
+metrics.init_app(app)
 
 app.config['GAUTH_CLIENT_ID'] = os.environ.get('GAUTH_CLIENT_ID')
 
@@ -198,7 +201,12 @@ def connect_to_mongodb():  # pragma: no cover
     mongodb_uri = os.environ.get('MONGODB_URI')
     if mongodb_uri is None:
         return Thrower()  # not able to find db config var
-    return pymongo.MongoClient(mongodb_uri).users_db.users_collection
+    client = pymongo.MongoClient(
+        mongodb_uri, event_listeners=[metrics.CommandTimer(),
+                                      metrics.SlowCommandLogger()])
+    collection = client.users_db.users_collection
+    ensure_indexes(collection)
+    return collection
 
 
 app.config['COLLECTION'] = connect_to_mongodb()
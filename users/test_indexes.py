@@ -0,0 +1,51 @@
+"""Unit tests for users collection index management."""
+
+# Copyright 2019 The Knative Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import mongomock
+import indexes
+
+DECLARED_INDEX_NAMES = sorted(
+    index.document['name'] for index in indexes.USER_INDEXES)
+
+
+class TestEnsureIndexes(unittest.TestCase):
+    def setUp(self):
+        self.coll = mongomock.MongoClient().users_db.users_collection
+
+    def test_builds_all_indexes(self):
+        """All declared indexes exist after ensure_indexes."""
+        self.assertEqual(indexes.find_missing_indexes(self.coll),
+                         DECLARED_INDEX_NAMES)
+        indexes.ensure_indexes(self.coll)
+        self.assertEqual(indexes.find_missing_indexes(self.coll), [])
+
+    def test_ensure_is_idempotent(self):
+        """Building indexes that already exist doesn't fail."""
+        indexes.ensure_indexes(self.coll)
+        indexes.ensure_indexes(self.coll)
+        self.assertEqual(indexes.find_missing_indexes(self.coll), [])
+
+    def test_verify_missing_index(self):
+        """Verification fails when a declared index is missing."""
+        indexes.ensure_indexes(self.coll)
+        self.coll.drop_index('user_id_1')
+        with self.assertRaises(indexes.IndexesNotBuiltError):
+            indexes.verify_indexes(self.coll)
+
+
+if __name__ == '__main__':
+    unittest.main()